@@ -99,6 +99,8 @@ class UserTicks(BaseModel):
         db.Index('idx_user_ticks_username', 'username'),
         db.Index('idx_user_ticks_tick_date', 'tick_date'),
         db.Index('idx_user_ticks_lookup', 'username', 'route_name', 'tick_date'),
+        db.Index('idx_user_ticks_fingerprint', 'username', 'tick_fingerprint'),
+        db.Index('idx_user_ticks_discipline_code', 'username', 'discipline', 'binned_code'),
     )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     route_name = db.Column(db.String(255))
@@ -122,4 +124,54 @@ class UserTicks(BaseModel):
     username = db.Column(db.String(255))
     route_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
-    notes = db.Column(db.Text) 
\ No newline at end of file
+    notes = db.Column(db.Text) 
+    tick_fingerprint = db.Column(db.BigInteger)
+
+class RouteAttributes(BaseModel):
+    """Crowd-sourced style and characteristic votes per route, summed over every pyramid"""
+    __tablename__ = 'route_attributes'
+    __table_args__ = (
+        db.UniqueConstraint('route_name', 'location', name='uq_route_attributes_route'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    route_name = db.Column(db.String(255), nullable=False)
+    location = db.Column(db.String(255), nullable=False)
+    slab_votes = db.Column(db.Integer, nullable=False, default=0)
+    vertical_votes = db.Column(db.Integer, nullable=False, default=0)
+    overhang_votes = db.Column(db.Integer, nullable=False, default=0)
+    roof_votes = db.Column(db.Integer, nullable=False, default=0)
+    power_votes = db.Column(db.Integer, nullable=False, default=0)
+    power_endurance_votes = db.Column(db.Integer, nullable=False, default=0)
+    endurance_votes = db.Column(db.Integer, nullable=False, default=0)
+
+class IngestionJob(BaseModel):
+    __tablename__ = 'ingestion_jobs'
+    __table_args__ = (
+        db.Index('idx_ingestion_jobs_status_created', 'status', 'created_at'),
+        db.Index('idx_ingestion_jobs_username', 'username'),
+        # At most one queued or running job per user
+        db.Index('uq_ingestion_jobs_active_username', 'username', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'running')"),
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    username = db.Column(db.String(255), nullable=False)
+    profile_url = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    worker_id = db.Column(db.String(255))
+    export_hash = db.Column(db.String(64))  # Export the latest attempt downloaded, reused by retries
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class TickExport(BaseModel):
+    __tablename__ = 'tick_exports'
+    username = db.Column(db.String(255), primary_key=True)
+    profile_url = db.Column(db.String(255))
+    content_hash = db.Column(db.String(64))
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(255))
+    refresh_requested = db.Column(db.Boolean, nullable=False, default=False)
+    fetched_at = db.Column(db.DateTime)
@@ -1,13 +1,14 @@
 from flask import render_template, request, redirect, url_for, jsonify, flash, make_response
 from app import app, db, cache
 from app.models import BinnedCodeDict, UserTicks
-from app.services import DataProcessor
 from app.services.database_service import DatabaseService
+from app.services.job_queue import JobQueue
 from app.services.analytics_service import AnalyticsService
 from datetime import date
 import json
 from app.services.grade_processor import GradeProcessor
 from app.services.pyramid_update_service import PyramidUpdateService
+from app.services.tick_service import TickService
 import psutil
 import os
 from sqlalchemy.sql import text
@@ -57,39 +58,27 @@ def index():
             # Extract username from URL
             username = first_input.split('/')[-1]
 
-            # Check if user data exists
+            # Check if user data exists and is not waiting on a refresh
             existing_ticks = UserTicks.query.filter_by(username=username).first()
-            if existing_ticks:
+            tick_export = DatabaseService.get_tick_export(username)
+            refresh_requested = tick_export is not None and tick_export.refresh_requested
+            if existing_ticks and not refresh_requested:
                 app.logger.info(f"Found existing data for user: {username}")
                 response = make_response(redirect(url_for('userviz', username=username)))
                 # Add header to set username (optional if handled client-side)
                 response.headers['X-Set-User'] = username
                 return response
 
-            # If no existing data, process the profile
-            processor = DataProcessor(db.session)
-            sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks, username = processor.process_profile(first_input)
-
-            # Log memory usage before database operations
-            current_memory = process.memory_info().rss / 1024 / 1024
-            app.logger.info(f"Memory usage before DB ops: {current_memory:.2f} MB (Change: {current_memory - start_memory:.2f} MB)")
-
-            # Clear existing data for this username
-            DatabaseService.clear_user_data(username)
-
-            # Update the calculated data using DatabaseService
-            DatabaseService.save_calculated_data({
-                'sport_pyramid': sport_pyramid,
-                'trad_pyramid': trad_pyramid,
-                'boulder_pyramid': boulder_pyramid,
-                'user_ticks': user_ticks
-            })
-            
-            # Log final memory usage
-            end_memory = process.memory_info().rss / 1024 / 1024
-            app.logger.info(f"Final memory usage: {end_memory:.2f} MB (Total change: {end_memory - start_memory:.2f} MB)")
+            # Otherwise queue the profile for the ingestion worker, which skips
+            # the rebuild when the export has not changed
+            job = JobQueue.enqueue(username, first_input)
+            app.logger.info(f"Queued ingestion job {job.id} for user: {username}")
             
-            return redirect(url_for('userviz', username=username))
+            return jsonify({
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': url_for('job_status', job_id=job.id)
+            }), 202
             
         except Exception as e:
             app.logger.error(f"Error processing request: {str(e)}")
@@ -103,6 +92,26 @@ def index():
    
     return render_template('index.html')
 
+@app.route("/api/jobs/<int:job_id>")
+def job_status(job_id):
+    """Ingestion job status, polled by the loading screen"""
+    job = JobQueue.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    payload = {
+        'job_id': job.id,
+        'username': job.username,
+        'status': job.status,
+        'attempts': job.attempts
+    }
+    if job.status == JobQueue.DONE:
+        payload['redirect_url'] = url_for('userviz', username=job.username)
+    elif job.status == JobQueue.FAILED:
+        payload['error'] = 'An error occurred while processing your data. Please try again.'
+    
+    return jsonify(payload)
+
 @app.route("/terms-privacy")
 @cache.cached(timeout=86400) 
 def terms_and_privacy():
@@ -315,10 +324,30 @@ def performance_characteristics():
                          boulder_pyramid=boulder_pyramid_data,
                          binned_code_dict=binned_code_dict_data)
 
+def pyramid_payload(username):
+    """A user's stored pyramids as JSON-ready dicts, keyed by discipline"""
+    pyramids = DatabaseService.get_pyramids_by_username(username)
+    pyramid_data = {
+        'sport': [r.as_dict() for r in pyramids['sport']],
+        'trad': [r.as_dict() for r in pyramids['trad']],
+        'boulder': [r.as_dict() for r in pyramids['boulder']]
+    }
+    
+    # Log pyramid data sizes
+    app.logger.info(f"Returning pyramid data - Sport: {len(pyramid_data['sport'])}, Trad: {len(pyramid_data['trad'])}, Boulder: {len(pyramid_data['boulder'])}")
+    
+    # Convert dates to strings
+    for discipline in pyramid_data.values():
+        for item in discipline:
+            if 'tick_date' in item:
+                item['tick_date'] = item['tick_date'].strftime('%Y-%m-%d')
+    
+    return pyramid_data
+
 @app.route("/delete-tick/<int:tick_id>", methods=['DELETE'])
 def delete_tick(tick_id):
     try:
-        # Get username before deletion for pyramid rebuild
+        # Get username before deletion for the pyramid payload
         user_tick = UserTicks.query.get(tick_id)
         if not user_tick:
             return jsonify({
@@ -329,30 +358,13 @@ def delete_tick(tick_id):
         username = user_tick.username
         app.logger.info(f"Deleting tick {tick_id} for user {username}")
         
-        # Delete the tick and rebuild pyramids
+        # Delete the tick and update its pyramid
         success = DatabaseService.delete_user_tick(tick_id)
         
         if success:
-            # Get the fresh pyramid data to return
-            pyramids = DatabaseService.get_pyramids_by_username(username)
-            pyramid_data = {
-                'sport': [r.as_dict() for r in pyramids['sport']],
-                'trad': [r.as_dict() for r in pyramids['trad']],
-                'boulder': [r.as_dict() for r in pyramids['boulder']]
-            }
-            
-            # Log pyramid data sizes
-            app.logger.info(f"Returning pyramid data - Sport: {len(pyramid_data['sport'])}, Trad: {len(pyramid_data['trad'])}, Boulder: {len(pyramid_data['boulder'])}")
-            
-            # Convert dates to strings
-            for discipline in pyramid_data.values():
-                for item in discipline:
-                    if 'tick_date' in item:
-                        item['tick_date'] = item['tick_date'].strftime('%Y-%m-%d')
-            
             return jsonify({
                 'success': True,
-                'pyramids': pyramid_data
+                'pyramids': pyramid_payload(username)
             })
         else:
             app.logger.error(f"Failed to delete tick {tick_id}")
@@ -368,10 +380,128 @@ def delete_tick(tick_id):
             'error': 'Server error while deleting tick'
         }), 500
 
+@app.route("/delete-ticks", methods=['POST'])
+def delete_ticks():
+    """Delete a batch of one user's ticks, recomputing each affected pyramid once"""
+    data = request.get_json(silent=True) or {}
+    tick_ids = data.get('tick_ids')
+    if not isinstance(tick_ids, list) or not tick_ids:
+        return jsonify({
+            'success': False,
+            'error': 'tick_ids must be a non-empty list'
+        }), 400
+    try:
+        tick_ids = [int(tick_id) for tick_id in tick_ids]
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'tick_ids must be integers'
+        }), 400
+    
+    try:
+        usernames = [row[0] for row in db.session.query(UserTicks.username)
+                     .filter(UserTicks.id.in_(tick_ids)).distinct()]
+        if not usernames:
+            return jsonify({
+                'success': False,
+                'error': 'Ticks not found'
+            }), 404
+        if len(usernames) > 1:
+            return jsonify({
+                'success': False,
+                'error': 'Ticks belong to more than one user'
+            }), 400
+        
+        username = usernames[0]
+        app.logger.info(f"Deleting {len(tick_ids)} ticks for user {username}")
+        deleted = DatabaseService.delete_user_ticks(username, tick_ids)
+        
+        return jsonify({
+            'success': True,
+            'deleted': deleted,
+            'pyramids': pyramid_payload(username)
+        })
+        
+    except Exception as e:
+        app.logger.error(f"Error deleting ticks {tick_ids}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Server error while deleting ticks'
+        }), 500
+
+def tick_payload(user_tick):
+    """A stored tick as a JSON-ready dict"""
+    tick = user_tick.as_dict()
+    tick['tick_date'] = tick['tick_date'].strftime('%Y-%m-%d')
+    tick.pop('created_at', None)
+    return tick
+
+@app.route("/add-tick", methods=['POST'])
+def add_tick():
+    """Add one tick, given by its export fields, and refresh the pyramid it lands in"""
+    data = request.get_json(silent=True) or {}
+    username = data.get('username')
+    if not username or not data.get('tick_date') or not data.get('route_name'):
+        return jsonify({
+            'success': False,
+            'error': 'username, tick_date and route_name are required'
+        }), 400
+    
+    try:
+        user_tick = TickService.add_tick(username, data)
+        app.logger.info(f"Added tick {user_tick.id} for user {username}")
+        return jsonify({
+            'success': True,
+            'tick': tick_payload(user_tick),
+            'pyramids': pyramid_payload(username)
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        app.logger.error(f"Error adding tick for {username}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Server error while adding tick'
+        }), 500
+
+@app.route("/edit-tick/<int:tick_id>", methods=['PATCH'])
+def edit_tick(tick_id):
+    """Edit one tick's export fields and refresh the pyramids it affects"""
+    data = request.get_json(silent=True) or {}
+    try:
+        user_tick = TickService.edit_tick(tick_id, data)
+        if not user_tick:
+            return jsonify({
+                'success': False,
+                'error': 'Tick not found'
+            }), 404
+        
+        app.logger.info(f"Edited tick {tick_id} for user {user_tick.username}")
+        return jsonify({
+            'success': True,
+            'tick': tick_payload(user_tick),
+            'pyramids': pyramid_payload(user_tick.username)
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        app.logger.error(f"Error editing tick {tick_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Server error while editing tick'
+        }), 500
+
 @app.route("/refresh-data/<username>", methods=['POST'])
 def refresh_data(username):
     try:
-        DatabaseService.clear_user_data(username)
+        # Keep the current data until the worker knows whether the export changed
+        DatabaseService.request_refresh(username)
         
         # Prepare redirect response with header to clear localStorage
         response = make_response(redirect(url_for('index')))
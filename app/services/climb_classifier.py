@@ -1,8 +1,108 @@
+import re
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Any
 from datetime import datetime
 
+# Classification results kept per process, across requests
+SIGNATURE_CACHE_SIZE = 20000
+
+class SignatureCache:
+    """Thread-safe, bounded LRU cache of classification results"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+    
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Any]]:
+        """Cached result for each key, or None when missing"""
+        with self._lock:
+            results = []
+            for key in keys:
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                results.append(result)
+            return results
+    
+    def put_many(self, keys: Sequence[Hashable], results: Sequence[Any]) -> None:
+        """Store results, evicting the least recently used beyond max_size"""
+        with self._lock:
+            for key, result in zip(keys, results):
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Forget every cached result (e.g. after changing the rules)"""
+        with self._lock:
+            self._entries.clear()
+
+_signature_cache = SignatureCache(SIGNATURE_CACHE_SIZE)
+
+# Bit flags for the features detected in tick notes (note_flags column, uint8)
+NOTE_MULTIPITCH = 1
+NOTE_SLAB = 2
+NOTE_VERTICAL = 4
+NOTE_OVERHANG = 8
+NOTE_ROOF = 16
+NOTE_POWER = 32
+NOTE_POWER_ENDURANCE = 64
+NOTE_ENDURANCE = 128
+
+# Lower-case keywords that set each flag when found anywhere in the notes
+NOTE_KEYWORDS = {
+    NOTE_MULTIPITCH: (
+        'p1', 'p2', 'p3', 'p4', 'p5',
+        'swapped leads', 'swung leads', 'simul',
+        'simulclimb', 'simul climb', 'simul-climb',
+        'linked pitches', 'multi-pitch', 'multipitch',
+        'pitches'
+    ),
+    NOTE_SLAB: ('slab', 'low angle'),
+    NOTE_VERTICAL: ('vertical', 'vertical face', 'vert'),
+    NOTE_OVERHANG: ('overhang', 'steep' 'overhanging'),
+    NOTE_ROOF: ('roof', 'horizontal', 'ceiling'),
+    NOTE_POWER: ('powerful', 'dynamic', 'boulder', 'bouldery', 'power'),
+    NOTE_POWER_ENDURANCE: ('resistance', 'sustained', 'power endurance'),
+    NOTE_ENDURANCE: ('endurance', 'continuous', 'no rest')
+}
+
+# Route styles and characteristics inferred from notes, in priority order
+NOTE_STYLES = (('Slab', NOTE_SLAB), ('Vertical', NOTE_VERTICAL),
+               ('Overhang', NOTE_OVERHANG), ('Roof', NOTE_ROOF))
+NOTE_CHARACTERISTICS = (('Power', NOTE_POWER), ('Power Endurance', NOTE_POWER_ENDURANCE),
+                        ('Endurance', NOTE_ENDURANCE))
+
+def _build_note_matcher() -> Tuple[re.Pattern, Dict[str, int]]:
+    """One regex over every keyword, plus the flags each matched keyword implies.
+    
+    The pattern is a lookahead, so it reports the longest keyword starting at
+    every position. A keyword also carries the flags of every shorter keyword
+    inside it (e.g. "power endurance" implies power and endurance), so
+    overlapping keywords are never missed.
+    """
+    keywords = {keyword for words in NOTE_KEYWORDS.values() for keyword in words}
+    keyword_flags = {
+        keyword: sum(flag for flag, words in NOTE_KEYWORDS.items() if any(word in keyword for word in words))
+        for keyword in keywords
+    }
+    alternatives = '|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+    return re.compile(f'(?=({alternatives}))'), keyword_flags
+
+NOTE_PATTERN, NOTE_KEYWORD_FLAGS = _build_note_matcher()
+
+def note_flags_for(notes: str) -> int:
+    """Feature flags of a single note"""
+    flags = 0
+    for keyword in NOTE_PATTERN.findall(notes.lower()):
+        flags |= NOTE_KEYWORD_FLAGS[keyword]
+    return flags
+
 class ClimbClassifier:
     """Handles classification of climbs into different types and categories"""
     
@@ -24,7 +124,148 @@ class ClimbClassifier:
         self.follow_indicators = ['Follow', 'TR', 'Second', 'Top Rope', 'Following']
     
     def classify_discipline(self, df: pd.DataFrame) -> pd.Series:
-        """Classify climbs into disciplines (sport, trad, boulder, etc.)"""
+        """Classify climbs into disciplines (sport, trad, boulder, etc.)
+        
+        Vectorized equivalent of _classify_discipline_rowwise: each rule becomes
+        a boolean mask and np.select applies them in the same precedence.
+        """
+        notes_gear, notes_bolts = self._notes_indicator_flags(df['notes'])
+        return self._discipline_from_signature(
+            df['route_type'], df['style'], df['lead_style'],
+            self._boulder_grade(df['binned_code']), notes_gear, notes_bolts
+        )
+    
+    def classify_by_signature(self, df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+        """Classify discipline and send status once per distinct row signature.
+        
+        Both only depend on route type, style, lead style, whether the grade is
+        a boulder grade and the notes indicator flags. Rows are factorized by
+        that signature, unseen signatures are classified together, and the
+        results are broadcast back. Results are kept in a process-wide LRU
+        cache, so repeat signatures across users are never classified again.
+        """
+        notes_gear, notes_bolts = self._notes_indicator_flags(df['notes'])
+        signature = pd.DataFrame({
+            'route_type': self._optional_text(df['route_type']),
+            'style': self._optional_text(df['style']),
+            'lead_style': self._optional_text(df['lead_style']),
+            'boulder_grade': self._boulder_grade(df['binned_code']),
+            'notes_gear': notes_gear,
+            'notes_bolts': notes_bolts
+        }, index=df.index)
+        
+        row_signature = signature.groupby(list(signature.columns), dropna=False, sort=False).ngroup().to_numpy()
+        unique_signatures = signature.drop_duplicates()
+        keys = list(unique_signatures.itertuples(index=False, name=None))
+        
+        results = _signature_cache.get_many(keys)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            unseen = unique_signatures.iloc[missing]
+            disciplines = self._discipline_from_signature(
+                unseen['route_type'], unseen['style'], unseen['lead_style'],
+                unseen['boulder_grade'].to_numpy(), unseen['notes_gear'].to_numpy(),
+                unseen['notes_bolts'].to_numpy()
+            )
+            sends = self.classify_sends(unseen.assign(discipline=disciplines))
+            for i, discipline, send in zip(missing, disciplines, sends):
+                results[i] = (discipline, bool(send))
+            _signature_cache.put_many([keys[i] for i in missing], [results[i] for i in missing])
+        
+        discipline_by_signature = np.array([result[0] for result in results], dtype=object)
+        send_by_signature = np.array([result[1] for result in results], dtype=bool)
+        return (pd.Series(discipline_by_signature[row_signature], index=df.index),
+                pd.Series(send_by_signature[row_signature], index=df.index))
+    
+    def _notes_indicator_flags(self, notes: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Gear and sport indicator flags of each note, computed once per distinct note"""
+        labels, unique_notes = pd.factorize(self._text_column(notes))
+        unique_lower = pd.Series(unique_notes, dtype=object).str.lower()
+        # Matched against lower-cased text exactly as the row-wise rules do
+        gear = self._contains_any(unique_lower, self.gear_indicators)
+        bolts = self._contains_any(unique_lower, self.sport_indicators)
+        return gear[labels], bolts[labels]
+    
+    @staticmethod
+    def _boulder_grade(binned_code: pd.Series) -> np.ndarray:
+        """Whether each binned code is in the boulder grade range"""
+        codes = pd.to_numeric(binned_code, errors='coerce').to_numpy(dtype=float)
+        return (codes >= 100) & (codes < 200)
+    
+    def _discipline_from_signature(self, route_type_values: pd.Series, style_values: pd.Series,
+                                   lead_style_values: pd.Series, boulder_grade: np.ndarray,
+                                   notes_gear: np.ndarray, notes_bolts: np.ndarray) -> pd.Series:
+        """Apply the discipline rules as boolean masks, resolved by np.select in rule order"""
+        route_type = self._text_column(route_type_values)
+        style = self._text_column(style_values)
+        lead_style = self._text_column(lead_style_values)
+        
+        has_type = route_type_values.notna().to_numpy()
+        single_type = ~route_type.str.contains(',', regex=False).to_numpy()
+        only_type = route_type.str.strip()
+        has = {t: route_type.str.contains(rf'(?:^|,)\s*{re.escape(t)}\s*(?:,|$)', regex=True).to_numpy()
+               for t in ('Sport', 'Trad', 'TR', 'Boulder', 'Alpine')}
+        
+        follow = (self._contains_any(style, self.follow_indicators)
+                  | self._contains_any(lead_style, self.follow_indicators))
+        led = (self._contains_any(lead_style, self.lead_indicators)
+               | style.str.contains('Lead', regex=False).to_numpy())
+        # Matched against lower-cased text exactly as the row-wise rules do
+        style_lower = style.str.lower()
+        gear = self._contains_any(style_lower, self.gear_indicators) | notes_gear
+        bolts = self._contains_any(style_lower, self.sport_indicators) | notes_bolts
+        
+        sport_tr = has['Sport'] & has['TR']
+        trad_tr = has['Trad'] & has['TR']
+        trad_sport = has['Trad'] & has['Sport']
+        
+        labels = np.array([None, 'sport', 'trad', 'boulder', 'tr'], dtype=object)
+        none, sport, trad, boulder, tr = range(len(labels))
+        conditions = [
+            (~has_type, none),
+            (follow, tr),
+            (boulder_grade, boulder),
+            (single_type & (only_type == 'Sport').to_numpy(), sport),
+            (single_type & (only_type == 'Trad').to_numpy(), trad),
+            (single_type & (only_type == 'Boulder').to_numpy(), boulder),
+            (single_type & (only_type == 'TR').to_numpy(), tr),
+            (single_type, none),
+            (sport_tr & led, sport),
+            (sport_tr, tr),
+            (trad_tr & led, trad),
+            (trad_tr, tr),
+            (trad_sport & gear, trad),
+            (trad_sport & bolts, sport),
+            (trad_sport, none),
+            (has['Alpine'] & has['Trad'], trad),
+            (has['Sport'], sport),
+            (has['Trad'], trad),
+            (has['Boulder'], boulder),
+        ]
+        choice = np.select([mask for mask, _ in conditions], [label for _, label in conditions], default=none)
+        
+        return pd.Series(labels[choice], index=route_type_values.index)
+    
+    @staticmethod
+    def _optional_text(values: pd.Series) -> pd.Series:
+        """Column as plain strings, with missing values as None"""
+        values = values.astype(object)
+        return values.where(values.notna(), None)
+    
+    @staticmethod
+    def _text_column(values: pd.Series) -> pd.Series:
+        """Column as plain strings, with missing values as empty strings"""
+        values = values.astype(object)
+        return values.where(values.notna(), '').astype(str)
+    
+    @staticmethod
+    def _contains_any(values: pd.Series, substrings: List[str]) -> np.ndarray:
+        """Whether each value contains any of the substrings"""
+        pattern = '|'.join(re.escape(substring) for substring in substrings)
+        return values.str.contains(pattern, regex=True).to_numpy()
+    
+    def _classify_discipline_rowwise(self, df: pd.DataFrame) -> pd.Series:
+        """Row-by-row discipline rules; the reference for classify_discipline"""
         
         def determine_discipline(row):
             # Handle missing route type
@@ -121,25 +362,23 @@ class ClimbClassifier:
         # Combine all conditions
         return (boulder_sends | roped_sends & ~boulder_attempts).fillna(False)
     
-    def _is_multipitch_from_notes(self, notes: str) -> bool:
-        """Check if route is multipitch based on note content"""
-        if pd.isna(notes):
-            return False
-            
-        notes = notes.lower()
-        multipitch_indicators = [
-            'p1', 'p2', 'p3', 'p4', 'p5',
-            'swapped leads', 'swung leads', 'simul', 
-            'simulclimb', 'simul climb', 'simul-climb',
-            'linked pitches', 'multi-pitch', 'multipitch', 
-            'pitches'
-        ]
-        return any(indicator in notes for indicator in multipitch_indicators)
+    def classify_note_flags(self, notes: pd.Series) -> pd.Series:
+        """Detect multipitch, style and characteristic keywords in notes as uint8 bit flags.
+        
+        The combined keyword regex runs once per distinct note.
+        """
+        labels, unique_notes = pd.factorize(notes)
+        unique_flags = np.fromiter((note_flags_for(str(note)) for note in unique_notes),
+                                   dtype=np.uint8, count=len(unique_notes))
+        # Missing notes (label -1) have no flags
+        flags = np.append(unique_flags, np.uint8(0))[labels]
+        return pd.Series(flags, index=notes.index, name='note_flags')
     
     def classify_length(self, df: pd.DataFrame) -> pd.Series:
         """Classify routes by length"""
         # First try to identify multipitch from notes
-        is_multipitch = df['notes'].apply(self._is_multipitch_from_notes)
+        note_flags = df['note_flags'] if 'note_flags' in df.columns else self.classify_note_flags(df['notes'])
+        is_multipitch = (note_flags.to_numpy() & NOTE_MULTIPITCH) != 0
         
         # Then do standard length classification
         length_categories = pd.cut(df['length'], 
@@ -153,30 +392,49 @@ class ClimbClassifier:
         return length_categories
     
     def classify_season(self, df: pd.DataFrame) -> pd.Series:
-        """Classify climbs by season"""
-        def season_mapping(row: pd.Series) -> str:
-            month, year = row['tick_month'], row['tick_year']
-            for months, season in self.season_categories.items():
-                if month in months:
-                    if season == "Winter":
-                        # Handle December differently for winter
-                        if month == 12:
-                            return f"{season}, {year}-{year+1}"
-                        # Handle Jan & Feb differently for winter
-                        elif month in [1, 2]:
-                            return f"{season}, {year-1}-{year}"
-                    return f"{season}, {year}"
-            return f'Unknown, {year}'
-        
-        # Extract month and year
-        df = df.copy()
-        df['tick_month'] = pd.to_datetime(df['tick_date']).dt.month
-        df['tick_year'] = pd.to_datetime(df['tick_date']).dt.year
-        
-        # Apply season mapping
-        seasons = df[['tick_month', 'tick_year']].apply(season_mapping, axis=1)
-        
-        # Clean up temporary columns
-        df.drop(['tick_month', 'tick_year'], axis=1, inplace=True)
-        
-        return seasons
\ No newline at end of file
+        """Classify climbs by season, e.g. "Summer, 2023" or "Winter, 2023-2024".
+        
+        Seasons are computed as array arithmetic on month and year, with each
+        label built once per distinct (season, year) pair. Returns a categorical.
+        """
+        dates = pd.to_datetime(df['tick_date'])
+        valid = dates.notna().to_numpy()
+        months = dates.dt.month.to_numpy(dtype=float)
+        years = dates.dt.year.to_numpy(dtype=float)
+        
+        season_of_month, season_names = self._season_lookup()
+        seasons = season_of_month[np.where(valid, months, 0).astype(int)]
+        # Jan & Feb belong to the winter that started the previous December
+        late_winter = np.isin(months, (1, 2)) & (season_names[seasons] == 'Winter')
+        season_years = np.where(valid, years, 0).astype(int) - late_winter
+        
+        keys = seasons * 100000 + season_years
+        unique_keys, codes = np.unique(keys[valid], return_inverse=True)
+        labels = [self._season_label(season_names[key // 100000], key % 100000) for key in unique_keys]
+        
+        all_codes = np.full(len(df), -1, dtype=int)
+        all_codes[valid] = codes
+        return pd.Series(pd.Categorical.from_codes(all_codes, categories=labels), index=df.index)
+    
+    def season_for_date(self, tick_date: Any) -> str:
+        """Season label of a single date"""
+        tick_date = pd.Timestamp(tick_date)
+        season_of_month, season_names = self._season_lookup()
+        season = season_names[season_of_month[tick_date.month]]
+        year = tick_date.year - 1 if season == 'Winter' and tick_date.month in (1, 2) else tick_date.year
+        return self._season_label(season, year)
+    
+    def _season_lookup(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Season index of each month (1-12), and the season names it indexes"""
+        season_names = np.array(list(self.season_categories.values()) + ['Unknown'], dtype=object)
+        season_of_month = np.full(13, len(season_names) - 1, dtype=int)
+        for i, months in enumerate(self.season_categories):
+            season_of_month[list(months)] = i
+        return season_of_month, season_names
+    
+    @staticmethod
+    def _season_label(season: str, year: int) -> str:
+        """Label for a season; winters span the year they start in and the next"""
+        if season == 'Winter':
+            return f"{season}, {year}-{year + 1}"
+        return f"{season}, {year}"
\ No newline at end of file
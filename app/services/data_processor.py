@@ -1,187 +1,676 @@
 import pandas as pd
-import requests
-from io import StringIO
-from typing import Tuple, Dict
+import numpy as np
+import hashlib
+from tempfile import SpooledTemporaryFile
+from collections import Counter
+from typing import Tuple, Dict, List, Iterator, Optional, Any, BinaryIO
+from flask import current_app
 from .grade_processor import GradeProcessor
 from .climb_classifier import ClimbClassifier
 from .pyramid_builder import PyramidBuilder
+from .profile_fetcher import ProfileFetcher, get_shared_fetcher
+from .export_cache import ExportCache
+from .pipeline import Pipeline, Stage, StageStore
+
+# Column names used by the Mountain Project tick export
+CSV_COLUMN_RENAMES = {
+    'Date': 'tick_date',
+    'Route': 'route_name',
+    'Rating': 'route_grade',
+    'Your Rating': 'user_grade',
+    'Notes': 'notes',
+    'URL': 'route_url',
+    'Pitches': 'pitches',
+    'Location': 'location',
+    'Style': 'style',
+    'Lead Style': 'lead_style',
+    'Route Type': 'route_type',
+    'Length': 'length',
+    'Rating Code': 'binned_code',
+    'Avg Stars': 'route_stars',
+    'Your Stars': 'user_stars'
+}
+
+# Columns we never store; dropped early when streaming to keep chunks small
+UNUSED_COLUMNS = ['route_stars', 'user_stars']
+
+# Raw columns only the row stages read (classification); nothing downstream
+# reads or stores them, so chunked ingestion drops them from each chunk
+ROW_STAGE_ONLY_COLUMNS = ['style', 'route_type']
+
+# Free-text columns; pinned to str so every export (and every chunk) parses alike
+CSV_TEXT_COLUMNS = [
+    'Route', 'Rating', 'Your Rating', 'Notes', 'URL',
+    'Location', 'Style', 'Lead Style', 'Route Type'
+]
+
+# Raw export fields that identify a tick; any change to them means the tick changed
+FINGERPRINT_TEXT_COLUMNS = [
+    'tick_date', 'route_name', 'route_grade', 'user_grade', 'notes', 'route_url',
+    'location', 'style', 'lead_style', 'route_type'
+]
+FINGERPRINT_NUMERIC_COLUMNS = ['pitches', 'length']
+
+# Running max grade column kept for each discipline
+MAX_GRADE_COLUMNS = {
+    'sport': 'cur_max_rp_sport',
+    'trad': 'cur_max_rp_trad',
+    'boulder': 'cur_max_boulder'
+}
+
+# Downloads larger than this spill from memory to a temporary file
+EXPORT_SPOOL_MAX_BYTES = 1024 * 1024
+
+# Mountain Project export date format
+TICK_DATE_FORMAT = '%Y-%m-%d'
+
+# Typed parse: only the columns the pipeline reads, in compact dtypes. Rating
+# Code is recomputed from the grade and the star columns are never stored.
+TYPED_CSV_DTYPES = {
+    'Date': str,
+    'Route': str,
+    'Rating': str,
+    'Your Rating': str,
+    'Notes': str,
+    'URL': str,
+    'Pitches': 'Int16',
+    'Location': str,
+    'Style': 'category',
+    'Lead Style': 'category',
+    'Route Type': 'category',
+    'Length': 'float32'
+}
+
+# Slices of the ingestion pipeline: row-local stages can run chunk by chunk,
+# history stages need every tick of the user at once
+ROW_STAGES = ('fingerprint', 'locations')
+HISTORY_STAGES = ('max grades', 'pyramids')
+
+# Largest value each numeric tick field may hold: pitches in its Int16 parse
+# dtype, length in the integer column it is stored in
+TICK_INTEGER_LIMITS = {
+    'pitches': np.iinfo(np.int16).max,
+    'length': np.iinfo(np.int32).max
+}
+
+CSV_READ_OPTIONS = {
+    'sep': ',',  # Explicitly set separator
+    'quotechar': '"',  # Handle quoted fields
+    'escapechar': '\\',  # Handle escaped characters
+    'on_bad_lines': 'skip'  # Skip problematic lines
+}
 
 class DataProcessor:
     """Main class that orchestrates the processing of climbing data"""
     
-    def __init__(self, db_session):
+    def __init__(self, db_session, fetcher: Optional[ProfileFetcher] = None,
+                 typed_parse: bool = True, csv_engine: str = 'c',
+                 export_cache: Optional[ExportCache] = None,
+                 signature_classification: bool = True,
+                 stage_store: Optional[StageStore] = None):
         self.grade_processor = GradeProcessor()
         self.classifier = ClimbClassifier()
         self.db_session = db_session
+        self.fetcher = fetcher or get_shared_fetcher()
+        # typed_parse=False keeps the original infer-everything parse;
+        # csv_engine='pyarrow' speeds up whole-file parses
+        self.typed_parse = typed_parse
+        self.csv_engine = csv_engine
+        # Every successful download is kept here when set
+        self.export_cache = export_cache
+        # Classify once per distinct signature and reuse results across users
+        self.signature_classification = signature_classification
+        # Every ingestion path runs (slices of) the memoized stage graph; stage
+        # outputs are shared process-wide once the memo is enabled and, with a
+        # stage store, kept on disk
+        self.stage_store = stage_store
+        self.pipeline = self.build_pipeline()
     
-    def process_profile(self, profile_url: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str]:
-        """Process a Mountain Project profile URL and return the processed data."""
+    def build_pipeline(self) -> Pipeline:
+        """Stage graph for ingesting an export, from raw CSV to pyramids.
+        
+        Whole exports run every stage; chunked, incremental and single-tick
+        ingestion run the ROW_STAGES and HISTORY_STAGES slices of it.
+        """
+        max_grade_columns = list(MAX_GRADE_COLUMNS.values())
+        typed_columns = [
+            'route_name', 'route_grade', 'pitches', 'lead_style', 'length', 'binned_code',
+            *max_grade_columns, 'length_category', 'season_category', 'discipline', 'notes'
+        ]
+        
+        def build_pyramids(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+            sport_pyramid, trad_pyramid, boulder_pyramid = PyramidBuilder().build_all_pyramids(df, self.db_session)
+            return {'sport_pyramid': sport_pyramid, 'trad_pyramid': trad_pyramid, 'boulder_pyramid': boulder_pyramid}
+        
+        return Pipeline([
+            Stage('parse', self.parse_csv, source=True, outputs=list(CSV_COLUMN_RENAMES.values()),
+                  settings={'typed_parse': self.typed_parse, 'csv_engine': self.csv_engine}),
+            Stage('fingerprint', lambda df: df.assign(tick_fingerprint=self.fingerprint_ticks(df)),
+                  inputs=FINGERPRINT_TEXT_COLUMNS + FINGERPRINT_NUMERIC_COLUMNS, outputs=['tick_fingerprint']),
+            Stage('grades', self.add_grades, inputs=['route_grade'], outputs=['binned_code', 'binned_grade']),
+            Stage('classify', self.add_classifications,
+                  inputs=['route_type', 'style', 'lead_style', 'notes', 'binned_code'],
+                  outputs=['discipline', 'send_bool']),
+            Stage('dates', self.parse_tick_dates, inputs=['tick_date'], outputs=['tick_date'], changes_rows=True),
+            Stage('notes', self.add_note_flags, inputs=['notes'], outputs=['note_flags']),
+            Stage('lengths', self.add_lengths, inputs=['length', 'note_flags'], outputs=['length', 'length_category']),
+            Stage('seasons', self.add_seasons, inputs=['tick_date'], outputs=['season_category']),
+            Stage('locations', self.add_locations, inputs=['location'], outputs=['location', 'location_raw']),
+            Stage('max grades',
+                  lambda df, initial_max: self.calculate_max_grades(df, initial_max=initial_max),
+                  inputs=['tick_date', 'discipline', 'send_bool', 'binned_code'], outputs=max_grade_columns,
+                  params=['initial_max'], changes_rows=True),
+            Stage('tiers', lambda df: df.assign(difficulty_category=self.calculate_difficulty_category(df)),
+                  inputs=['discipline', 'binned_code', *max_grade_columns], outputs=['difficulty_category']),
+            Stage('types', lambda df, username: self.set_data_types(df.assign(username=username)),
+                  inputs=typed_columns, outputs=typed_columns + ['username'], params=['username']),
+            # Predictions read the pyramids already stored, so only memoize without a db session
+            Stage('pyramids', build_pyramids, inputs=None,
+                  tables=['sport_pyramid', 'trad_pyramid', 'boulder_pyramid'],
+                  memoize=self.db_session is None)
+        ], store=self.stage_store)
+    
+    def process_profile(self, profile_url: str, chunk_size: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str]:
+        """Process a Mountain Project profile URL and return the processed data.
+
+        When chunk_size is given the export is parsed and its row stages run
+        in chunks, so only one raw chunk is held at a time.
+        """
         # Extract username from URL
         username = profile_url.split('/')[-1]
         
-        # Download and parse CSV data
-        df = self.download_and_parse_csv(profile_url)
+        # Download the CSV export
+        export = self.fetch_export(profile_url)
         
-        # Process raw climbing data
-        processed_df = self.process_raw_data(df, username)
+        try:
+            sport_pyramid, trad_pyramid, boulder_pyramid, processed_df = self.process_export(
+                export['content'], username, chunk_size=chunk_size, content_hash=export['content_hash']
+            )
+        finally:
+            export['content'].close()
         
-        # Calculate max grades
-        self.calculate_max_grades(processed_df)
+        return sport_pyramid, trad_pyramid, boulder_pyramid, processed_df, username
+    
+    def process_profiles(self, profile_urls: List[str], chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """Process many profiles, downloading their exports in parallel.
         
-        # Build pyramids with db_session for initial predictions
-        pyramid_builder = PyramidBuilder()
-        sport_pyramid, trad_pyramid, boulder_pyramid = pyramid_builder.build_all_pyramids(processed_df, self.db_session)
+        Downloads run concurrently under the fetcher's per-host limits; each
+        export is processed here as soon as it arrives, since processing is
+        CPU bound and shares this processor's db session. Returns the
+        process_profile result for each URL, or the exception that stopped it.
+        """
+        results = {}
+        for profile_url, export, error in self.fetcher.fetch_many(profile_urls, self.fetch_export):
+            if error is not None:
+                results[profile_url] = error
+                continue
+            
+            username = profile_url.split('/')[-1]
+            try:
+                sport_pyramid, trad_pyramid, boulder_pyramid, processed_df = self.process_export(
+                    export['content'], username, chunk_size=chunk_size, content_hash=export['content_hash']
+                )
+                results[profile_url] = (sport_pyramid, trad_pyramid, boulder_pyramid, processed_df, username)
+            except Exception as e:
+                results[profile_url] = e
+            finally:
+                export['content'].close()
         
-        return sport_pyramid, trad_pyramid, boulder_pyramid, processed_df, username
+        return results
     
-    def download_and_parse_csv(self, profile_url: str) -> pd.DataFrame:
-        """Download and parse the CSV data"""
+    def process_export(self, data: BinaryIO, username: str, chunk_size: Optional[int] = None,
+                       content_hash: Optional[str] = None,
+                       with_pyramids: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Process a downloaded tick export into pyramids and user ticks.
+        
+        Everything runs through the stage pipeline; content_hash lets it reuse
+        the parse of an export it has already seen. With chunk_size set the row
+        stages run chunk by chunk and the history stages once over the result.
+        With with_pyramids unset only the user ticks are built and the
+        pyramids come back as None.
+        """
+        skip = () if with_pyramids else ('pyramids',)
+        if chunk_size:
+            row_df = self.process_chunks_row_stages(self.parse_csv_chunks(data, chunk_size))
+            processed_df, pyramids = self.pipeline.run(row_df, skip=skip, start=HISTORY_STAGES[0],
+                                                       username=username)
+        else:
+            processed_df, pyramids = self.pipeline.run(data, source_key=content_hash, skip=skip, username=username)
+        return pyramids.get('sport_pyramid'), pyramids.get('trad_pyramid'), pyramids.get('boulder_pyramid'), processed_df
+    
+    def fetch_export(self, profile_url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+        """Download the CSV export, hashing it as it streams in.
+        
+        Pass the validators from a previous download to make the request
+        conditional; an unchanged export then comes back with not_modified set
+        and no content. The body is spooled to a temporary file so large
+        exports never sit in memory whole.
+        """
         # Construct CSV URL
         csv_url = f"{profile_url}/tick-export"
         
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
         # Download CSV
-        response = requests.get(csv_url, stream=False)
-        if response.status_code != 200:
-            raise ValueError(f"Failed to download CSV from {csv_url}")
+        with self.fetcher.stream(csv_url, headers=headers) as response:
+            if response.status_code == 304:
+                return {
+                    'not_modified': True,
+                    'content': None,
+                    'content_hash': None,
+                    'etag': etag,
+                    'last_modified': last_modified
+                }
+            if response.status_code != 200:
+                raise ValueError(f"Failed to download CSV from {csv_url}")
+            
+            content = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+            digest = hashlib.sha256()
+            try:
+                for block in response.iter_content(chunk_size=64 * 1024):
+                    digest.update(block)
+                    content.write(block)
+            except BaseException:
+                # A connection reset or read timeout mid-stream; don't leak the spool
+                content.close()
+                raise
+            content.seek(0)
+            
+            export = {
+                'not_modified': False,
+                'content': content,
+                'content_hash': digest.hexdigest(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+        
+        if self.export_cache is not None:
+            try:
+                self.export_cache.put(
+                    profile_url.split('/')[-1], content, export['content_hash'],
+                    export['etag'], export['last_modified']
+                )
+            except OSError as e:
+                # The cache only saves refetches; never fail a download over it
+                current_app.logger.warning(f"Failed to cache export for {profile_url}: {e}")
+        
+        return export
+    
+    def download_and_parse_csv(self, profile_url: str) -> pd.DataFrame:
+        """Download and parse the CSV data"""
+        export = self.fetch_export(profile_url)
+        with export['content'] as data:
+            return self.parse_csv(data)
+    
+    def stream_and_parse_csv(self, profile_url: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Download the CSV data and yield it in parsed row chunks"""
+        export = self.fetch_export(profile_url)
+        with export['content'] as data:
+            yield from self.parse_csv_chunks(data, chunk_size)
+    
+    def parse_csv(self, data: BinaryIO) -> pd.DataFrame:
+        """Parse a tick export file"""
+        if self.typed_parse:
+            return self.parse_csv_typed(data)
         
         # Parse CSV with proper encoding and error handling
         try:
-            data = StringIO(response.content.decode('utf-8'))
             df = pd.read_csv(data, 
-                            sep=',',  # Explicitly set separator
-                            quotechar='"',  # Handle quoted fields
-                            escapechar='\\',  # Handle escaped characters
-                            on_bad_lines='skip'  # Skip problematic lines
-                            )
+                            encoding='utf-8',
+                            dtype={column: str for column in CSV_TEXT_COLUMNS},
+                            **CSV_READ_OPTIONS)
             
             # Rename columns
-            df = df.rename(columns={
-                'Date': 'tick_date',
-                'Route': 'route_name',
-                'Rating': 'route_grade',
-                'Your Rating': 'user_grade',
-                'Notes': 'notes',
-                'URL': 'route_url',
-                'Pitches': 'pitches',
-                'Location': 'location',
-                'Style': 'style',
-                'Lead Style': 'lead_style',
-                'Route Type': 'route_type',
-                'Length': 'length',
-                'Rating Code': 'binned_code',
-                'Avg Stars': 'route_stars',
-                'Your Stars': 'user_stars'
-            })
+            df = df.rename(columns=CSV_COLUMN_RENAMES)
             
             return df
             
         except Exception as e:
             raise ValueError(f"Error parsing CSV data: {str(e)}")
     
+    def parse_csv_typed(self, data: BinaryIO) -> pd.DataFrame:
+        """Parse only the needed columns of a tick export, in compact dtypes"""
+        try:
+            if self.csv_engine == 'pyarrow':
+                # pyarrow turns nulls into 'None' under dtype=str, so read text
+                # as nullable strings and hand it on as object with NaN
+                df = pd.read_csv(data,
+                                 engine='pyarrow',
+                                 encoding='utf-8',
+                                 usecols=list(TYPED_CSV_DTYPES),
+                                 dtype={column: 'string' if dtype is str else dtype
+                                        for column, dtype in TYPED_CSV_DTYPES.items()})
+                for column, dtype in TYPED_CSV_DTYPES.items():
+                    if dtype is str:
+                        df[column] = df[column].astype(object).where(df[column].notna(), np.nan)
+            else:
+                df = pd.read_csv(data,
+                                 encoding='utf-8',
+                                 usecols=list(TYPED_CSV_DTYPES),
+                                 dtype=TYPED_CSV_DTYPES,
+                                 **CSV_READ_OPTIONS)
+            
+            return self._finish_typed_chunk(df)
+            
+        except Exception as e:
+            raise ValueError(f"Error parsing CSV data: {str(e)}")
+    
+    def parse_csv_chunks(self, data: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Parse a tick export file in row chunks"""
+        if self.typed_parse:
+            read_options = {
+                'usecols': list(TYPED_CSV_DTYPES),
+                'dtype': TYPED_CSV_DTYPES
+            }
+        else:
+            read_options = {'dtype': {column: str for column in CSV_TEXT_COLUMNS}}
+        
+        try:
+            reader = pd.read_csv(data, 
+                                encoding='utf-8',
+                                chunksize=chunk_size,
+                                **read_options,
+                                **CSV_READ_OPTIONS)
+            
+            with reader:
+                for chunk in reader:
+                    if self.typed_parse:
+                        yield self._finish_typed_chunk(chunk)
+                    else:
+                        chunk = chunk.rename(columns=CSV_COLUMN_RENAMES)
+                        yield chunk.drop(columns=UNUSED_COLUMNS, errors='ignore')
+        
+        except Exception as e:
+            raise ValueError(f"Error parsing CSV data: {str(e)}")
+    
+    def _finish_typed_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rename typed columns and parse dates with the fixed export format"""
+        df = df.rename(columns=CSV_COLUMN_RENAMES)
+        df['tick_date'] = pd.to_datetime(df['tick_date'], format=TICK_DATE_FORMAT, errors='coerce')
+        return df
+    
     def process_raw_data(self, df: pd.DataFrame, username: str) -> pd.DataFrame:
         """Process the raw climbing data"""
-        # Convert grades to codes
-        df['binned_code'] = self.grade_processor.convert_grades_to_codes(df['route_grade'])
-        
-        # Add binned grades
-        df['binned_grade'] = df['binned_code'].map(self.grade_processor.get_grade_from_code)
+        df = self.process_raw_chunk(df)
+        return self.finalize_processed_data(df, username)
+    
+    def process_raw_chunks(self, chunks: Iterator[pd.DataFrame], username: str) -> pd.DataFrame:
+        """Process raw climbing data arriving in chunks.
         
-        # Classify climbs
-        df['discipline'] = self.classifier.classify_discipline(df)
-        df['send_bool'] = self.classifier.classify_sends(df)
+        Row-local stages run per chunk so only one raw chunk is held at a time;
+        stages that need the whole history (running max grades) run once at the end.
+        """
+        return self.finalize_processed_data(self.process_chunks_row_stages(chunks), username)
+    
+    def process_chunks_row_stages(self, chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+        """Run the row-local stages over each raw chunk and join the results.
         
-        # Process dates
-        df['tick_date'] = pd.to_datetime(df['tick_date'], errors='coerce')
-        df = df.dropna(subset=['tick_date'])
+        Each processed chunk is cut to the columns later stages or storage use
+        before it is kept. The joined frame still holds every tick, since the
+        running max grades and pyramids need the whole history; stream_tick_chunks
+        avoids it when the ticks go straight to the database.
+        """
+        processed_chunks = [self.process_raw_chunk(chunk).drop(columns=ROW_STAGE_ONLY_COLUMNS, errors='ignore')
+                            for chunk in chunks]
+        if not processed_chunks:
+            raise ValueError("No tick data found in CSV export")
         
-        # Process lengths
-        df['length'] = df['length'].replace(0, pd.NA)
-        df['length_category'] = self.classifier.classify_length(df)
+        return pd.concat(processed_chunks)
+    
+    def stream_tick_chunks(self, data: BinaryIO, username: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Yield an export's user ticks chunk by chunk, ready to store.
         
-        # Process seasons
-        df['season_category'] = self.classifier.classify_season(df)
+        Each chunk runs the row stages and the types stage only, so no more
+        than one chunk is held at a time. Running max grades need the whole
+        history and come out as 0, and the tiers of tracked disciplines as
+        None; DatabaseService.replace_user_ticks_streaming fills both in once
+        every chunk is stored.
+        """
+        for chunk in self.parse_csv_chunks(data, chunk_size):
+            df = self.process_raw_chunk(chunk).drop(columns=ROW_STAGE_ONLY_COLUMNS, errors='ignore')
+            if df.empty:
+                continue
+            for column in MAX_GRADE_COLUMNS.values():
+                df[column] = 0
+            df['difficulty_category'] = np.where(df['discipline'].isin(list(MAX_GRADE_COLUMNS)), None, 'Other')
+            df, _ = self.pipeline.run(df, start='types', stop='types', username=username)
+            yield df
+    
+    def process_tick(self, fields: Dict[str, Any], username: str) -> Dict[str, Any]:
+        """Run the row-local processing steps over one tick given by its export fields.
         
-        # Process locations
-        df['location'] = df['location'].astype(str)
-        df['location_raw'] = df['location']
-        df['location'] = df['location'].apply(lambda x: x.split('>')).apply(lambda x: x[:3])
-        df['location'] = df['location'].apply(lambda x: f"{x[-1]}, {x[0]}")
+        Returns the tick's column values. Running max grades and the difficulty
+        tier depend on the rest of the history and are left to the caller.
+        Raises ValueError for a pitches or length value that is not a whole
+        number within TICK_INTEGER_LIMITS.
+        """
+        raw = pd.DataFrame([{column: fields.get(column) for column in CSV_COLUMN_RENAMES.values()}])
+        # Numeric fields in the dtypes a typed parse gives them
+        for column, dtype in TYPED_CSV_DTYPES.items():
+            if dtype is not str and pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype)):
+                name = CSV_COLUMN_RENAMES[column]
+                raw[name] = pd.Series([self._tick_integer(name, fields.get(name))], dtype=dtype)
+        df = self.process_raw_chunk(raw)
+        if df.empty:
+            raise ValueError(f"Invalid tick date: {fields.get('tick_date')}")
         
-        # Add username
         df['username'] = username
+        tick = df.astype(object).where(df.notna(), None).iloc[0].to_dict()
+        tick['tick_date'] = tick['tick_date'].date()
+        return tick
+    
+    @staticmethod
+    def _tick_integer(name: str, value: Any) -> Optional[int]:
+        """A numeric tick field as an int, None when it is left empty"""
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {name}: {value!r} is not a number")
+        if np.isnan(number):
+            return None
+        if not number.is_integer():
+            raise ValueError(f"Invalid {name}: {value!r} is not a whole number")
+        if not 0 <= number <= TICK_INTEGER_LIMITS[name]:
+            raise ValueError(f"Invalid {name}: {value!r} must be between 0 and {TICK_INTEGER_LIMITS[name]}")
+        return int(number)
+    
+    def process_new_ticks(self, new_raw: pd.DataFrame, username: str, stored_window: pd.DataFrame,
+                          initial_max: Dict[str, int]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Process newly exported ticks on top of the ticks already stored.
+        
+        stored_window holds the stored ticks dated on or after the earliest
+        change (id, tick_date, discipline, send_bool, binned_code). Their running
+        max grades are recomputed together with the new ticks, starting from
+        initial_max rather than from the first tick. Returns the processed new
+        ticks and the stored window with its refreshed max grades and tiers.
+        """
+        window = stored_window.copy()
+        window['tick_date'] = pd.to_datetime(window['tick_date'])
+        window['send_bool'] = window['send_bool'].fillna(False).astype(bool)
+        frames = [window.assign(is_new=False)]
+        
+        if not new_raw.empty:
+            new_df = self.process_raw_chunk(new_raw)
+            new_df['username'] = username
+            # Nullable so the fingerprints survive the concat with the window as exact integers
+            new_df['tick_fingerprint'] = new_df['tick_fingerprint'].astype('Int64')
+            frames.append(new_df.assign(is_new=True))
+        
+        combined = pd.concat(frames, ignore_index=True)
+        if combined.empty:
+            return pd.DataFrame(), pd.DataFrame()
         
-        # Calculate max grades
-        df = self.calculate_max_grades(df)
+        # Same-day ticks count in id order with new ticks last; the max grades
+        # stage keeps the order of ticks sharing a date
+        combined = combined.sort_values(['tick_date', 'id'], kind='stable', na_position='last')
+        combined, _ = self.pipeline.run(combined, start=HISTORY_STAGES[0], stop='tiers', initial_max=initial_max)
         
-        # Calculate difficulty categories
-        df['difficulty_category'] = self.calculate_difficulty_category(df)
+        is_new = combined['is_new'].astype(bool)
+        new_df = combined[is_new].drop(columns=['is_new', 'id'])
+        if not new_df.empty:
+            new_df, _ = self.pipeline.run(new_df, start='types', stop='types', username=username)
         
-        # Set data types
-        df = self.set_data_types(df)
+        window = combined.loc[~is_new, ['id', *MAX_GRADE_COLUMNS.values(), 'difficulty_category']]
+        window = window.astype({'id': int, **{column: int for column in MAX_GRADE_COLUMNS.values()}})
         
+        return new_df, window
+    
+    def fingerprint_ticks(self, df: pd.DataFrame) -> pd.Series:
+        """Stable 64-bit fingerprint of each raw export row"""
+        normalized = pd.DataFrame(index=df.index)
+        for column in FINGERPRINT_TEXT_COLUMNS:
+            values = df[column] if column in df.columns else pd.Series('', index=df.index)
+            if pd.api.types.is_datetime64_any_dtype(values):
+                # Typed parses hold dates already parsed; hash them as exported
+                values = values.dt.strftime(TICK_DATE_FORMAT)
+            values = values.astype(object)
+            normalized[column] = values.where(values.notna(), '').astype(str)
+        for column in FINGERPRINT_NUMERIC_COLUMNS:
+            # Go through float so 1 and 1.0 (int vs NaN-bearing columns) hash alike
+            values = df[column] if column in df.columns else pd.Series(None, index=df.index)
+            normalized[column] = pd.to_numeric(values, errors='coerce').astype('float64').astype(str)
+        
+        hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+        return pd.Series(hashes.view('int64'), index=df.index, name='tick_fingerprint')
+    
+    def split_new_ticks(self, chunks: Iterator[pd.DataFrame], stored: pd.DataFrame) -> Tuple[pd.DataFrame, List[int]]:
+        """Diff a raw export against stored (id, tick_fingerprint) rows.
+        
+        Returns the raw export rows that are not stored yet and the ids of
+        stored ticks that no longer appear in the export. A changed tick shows
+        up in both. Identical ticks (same route logged twice on a day) share a
+        fingerprint, so rows are matched on (fingerprint, occurrence number).
+        """
+        stored_occurrence = stored.groupby('tick_fingerprint').cumcount()
+        unmatched = dict(zip(zip(stored['tick_fingerprint'], stored_occurrence), stored['id']))
+        
+        seen = Counter()
+        new_chunks = []
+        for chunk in chunks:
+            fingerprints = self.fingerprint_ticks(chunk)
+            offsets = fingerprints.map(lambda fp: seen[fp])
+            occurrence = fingerprints.groupby(fingerprints).cumcount() + offsets
+            seen.update(fingerprints.tolist())
+            
+            is_new = [unmatched.pop(key, None) is None for key in zip(fingerprints, occurrence)]
+            chunk['tick_fingerprint'] = fingerprints
+            new_chunks.append(chunk[is_new])
+        
+        new_raw = pd.concat(new_chunks) if new_chunks else pd.DataFrame()
+        return new_raw, list(unmatched.values())
+    
+    def process_raw_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Run the row-local pipeline stages over raw climbing data"""
+        # Rows fingerprinted while diffing an export keep their fingerprints
+        skip = ('fingerprint',) if 'tick_fingerprint' in df.columns else ()
+        df, _ = self.pipeline.run(df, skip=skip, start=ROW_STAGES[0], stop=ROW_STAGES[1])
         return df
     
-    def calculate_max_grades(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate maximum grades for each discipline over time"""
-        df = df.sort_values('tick_date')
+    def add_grades(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add binned grade codes and their grades"""
+        df['binned_code'] = self.grade_processor.convert_grades_to_codes(df['route_grade'])
+        df['binned_grade'] = self.grade_processor.convert_codes_to_grades(df['binned_code'])
+        return df
+    
+    def add_classifications(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add discipline and send status"""
+        if self.signature_classification:
+            df['discipline'], df['send_bool'] = self.classifier.classify_by_signature(df)
+        else:
+            df['discipline'] = self.classifier.classify_discipline(df)
+            df['send_bool'] = self.classifier.classify_sends(df)
+        return df
+    
+    def parse_tick_dates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Parse tick dates, dropping ticks without a valid date"""
+        df['tick_date'] = pd.to_datetime(df['tick_date'], format=TICK_DATE_FORMAT, errors='coerce')
+        return df.dropna(subset=['tick_date'])
+    
+    def add_note_flags(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Detect note keywords once; length and pyramid stages reuse the flags"""
+        df['note_flags'] = self.classifier.classify_note_flags(df['notes'])
+        return df
+    
+    def add_lengths(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean lengths and add length categories"""
+        df['length'] = df['length'].replace(0, pd.NA)
+        df['length_category'] = self.classifier.classify_length(df)
+        return df
+    
+    def add_seasons(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add season categories"""
+        df['season_category'] = self.classifier.classify_season(df)
+        return df
+    
+    def add_locations(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Shorten location paths for display, keeping the full path in location_raw"""
+        df['location'] = df['location'].astype(str)
+        df['location_raw'] = df['location']
+        df['location'] = df['location'].apply(lambda x: x.split('>')).apply(lambda x: x[:3])
+        df['location'] = df['location'].apply(lambda x: f"{x[-1]}, {x[0]}")
+        return df
+    
+    def finalize_processed_data(self, df: pd.DataFrame, username: str) -> pd.DataFrame:
+        """Run the history stages that build user ticks (max grades, tiers, types)"""
+        df, _ = self.pipeline.run(df, skip=('pyramids',), start=HISTORY_STAGES[0], username=username)
+        return df
+    
+    def calculate_max_grades(self, df: pd.DataFrame, initial_max: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+        """Calculate maximum grades for each discipline over time.
+        
+        initial_max resumes the running maxima from previously stored values,
+        keyed by max grade column. Ticks on the same day run in id order, with
+        ticks not yet stored (no id) after them in frame order, matching
+        DatabaseService.repair_running_max.
+        """
+        sort_keys = ['tick_date', 'id'] if 'id' in df.columns else ['tick_date']
+        df = df.sort_values(sort_keys, kind='stable', na_position='last')
         
-        # Sport
-        sport_mask = (df['discipline'] == 'sport') & (df['send_bool'])
-        df.loc[sport_mask, 'cur_max_rp_sport'] = df.loc[sport_mask, 'binned_code'].cummax()
-        df['cur_max_rp_sport'] = df['cur_max_rp_sport'].ffill().fillna(0)
+        # One grouped cummax over the sends of every tracked discipline
+        disciplines = list(MAX_GRADE_COLUMNS)
+        discipline_index = pd.Categorical(df['discipline'], categories=disciplines).codes
+        sent = (discipline_index >= 0) & df['send_bool'].fillna(False).astype(bool).to_numpy()
+        sent_codes = pd.Series(df['binned_code'].to_numpy(dtype=float)[sent])
+        running = sent_codes.groupby(discipline_index[sent]).cummax().to_numpy()
         
-        # Trad
-        trad_mask = (df['discipline'] == 'trad') & (df['send_bool'])
-        df.loc[trad_mask, 'cur_max_rp_trad'] = df.loc[trad_mask, 'binned_code'].cummax()
-        df['cur_max_rp_trad'] = df['cur_max_rp_trad'].ffill().fillna(0)
+        # Scatter into one column per discipline, then carry each max forward
+        max_grades = np.full((len(df), len(disciplines)), np.nan)
+        max_grades[np.flatnonzero(sent), discipline_index[sent]] = running
+        max_grades = pd.DataFrame(max_grades).ffill().fillna(0).to_numpy()
+        for i, column in enumerate(MAX_GRADE_COLUMNS.values()):
+            df[column] = max_grades[:, i]
         
-        # Boulder
-        boulder_mask = (df['discipline'] == 'boulder') & (df['send_bool'])
-        df.loc[boulder_mask, 'cur_max_boulder'] = df.loc[boulder_mask, 'binned_code'].cummax()
-        df['cur_max_boulder'] = df['cur_max_boulder'].ffill().fillna(0)
+        # Resume from where the stored ticks left off
+        if initial_max:
+            for column in MAX_GRADE_COLUMNS.values():
+                df[column] = df[column].clip(lower=initial_max.get(column) or 0)
         
         return df
     
     def calculate_difficulty_category(self, df: pd.DataFrame) -> pd.Series:
         """Calculate difficulty category based on max grades"""
-        def difficulty_bins(row):
-            discipline = row['discipline']
-            binned_code = row['binned_code']
-            
-            if discipline == 'sport':
-                cur_max = row['cur_max_rp_sport']
-                conditions = [
-                    (binned_code >= cur_max),
-                    (binned_code == cur_max - 1),
-                    (binned_code == cur_max - 2),
-                    (binned_code == cur_max - 3)
-                ]
-            elif discipline == 'trad':
-                cur_max = row['cur_max_rp_trad']
-                conditions = [
-                    (binned_code >= cur_max),
-                    (binned_code == cur_max - 1),
-                    (binned_code == cur_max - 2),
-                    (binned_code == cur_max - 3)
-                ]
-            elif discipline == 'boulder':
-                cur_max = row['cur_max_boulder']
-                conditions = [
-                    (binned_code >= cur_max),
-                    (binned_code == cur_max - 1),
-                    (binned_code == cur_max - 2),
-                    (binned_code == cur_max - 3)
-                ]
-            else:
-                return 'Other'
-                
-            choices = ['Project', 'Tier 2', 'Tier 3', 'Tier 4']
-            for condition, choice in zip(conditions, choices):
-                if condition:
-                    return choice
-            return 'Base Volume'
-        
-        return df.apply(difficulty_bins, axis=1)
+        # Each row's running max for its own discipline
+        disciplines = list(MAX_GRADE_COLUMNS)
+        discipline_index = pd.Categorical(df['discipline'], categories=disciplines).codes
+        max_grades = df[list(MAX_GRADE_COLUMNS.values())].to_numpy(dtype=float)
+        cur_max = max_grades[np.arange(len(df)), np.maximum(discipline_index, 0)]
+        binned_code = df['binned_code'].to_numpy(dtype=float)
+        
+        conditions = [
+            discipline_index < 0,
+            binned_code >= cur_max,
+            binned_code == cur_max - 1,
+            binned_code == cur_max - 2,
+            binned_code == cur_max - 3
+        ]
+        choices = ['Other', 'Project', 'Tier 2', 'Tier 3', 'Tier 4']
+        return pd.Series(np.select(conditions, choices, default='Base Volume'), index=df.index, dtype=object)
     
     def set_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Set appropriate data types for columns"""
@@ -1,13 +1,16 @@
 from app.models import (
     db, BinnedCodeDict, BoulderPyramid, SportPyramid, 
-    TradPyramid, UserTicks
+    TradPyramid, UserTicks, TickExport
 )
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 import pandas as pd
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Iterator, List, Optional, Any, Union
 from datetime import date
-from app.services.pyramid_builder import PyramidBuilder
-from sqlalchemy import text
+from app.services.pyramid_builder import PyramidBuilder, PYRAMID_GRADE_BAND
+from app.services.data_processor import MAX_GRADE_COLUMNS
+from app.services.route_attributes_service import RouteAttributesService
+from app.services.sql_pyramid_builder import SqlPyramidBuilder
+from sqlalchemy import text, select, update, case, and_, or_
 import os
 from functools import wraps
 import time
@@ -34,13 +37,38 @@ def retry_on_db_error(max_retries=3, delay=1):
         return wrapper
     return decorator
 
+# Tables written from calculated DataFrames
+TABLE_MODELS = {
+    'user_ticks': UserTicks,
+    'sport_pyramid': SportPyramid,
+    'trad_pyramid': TradPyramid,
+    'boulder_pyramid': BoulderPyramid
+}
+
+# Pyramid table of each discipline
+DISCIPLINE_PYRAMIDS = {
+    'sport': SportPyramid,
+    'trad': TradPyramid,
+    'boulder': BoulderPyramid
+}
+
+# Tick columns copied onto the pyramid row standing for the tick's route
+PYRAMID_TICK_COLUMNS = [
+    'route_name', 'tick_date', 'route_grade', 'binned_grade', 'binned_code', 'length', 'pitches',
+    'location', 'lead_style', 'discipline', 'length_category', 'season_category', 'route_url'
+]
+
 class DatabaseService:
     """Handles all database CRUD operations"""
 
     @staticmethod
     @retry_on_db_error()
     def save_calculated_data(calculated_data: Dict[str, pd.DataFrame]) -> None:
-        """Save calculated pyramid and tick data to database"""
+        """Replace a user's stored data with calculated pyramid and tick data.
+        
+        The old data is cleared and the new data inserted in one transaction,
+        so a failed save leaves the previous data in place.
+        """
         # Get username from any of the dataframes
         username = None
         for df in calculated_data.values():
@@ -48,14 +76,19 @@ class DatabaseService:
                 username = df.iloc[0]['username']
                 break
         
-        if username:
-            # Clear existing data first
-            DatabaseService.clear_user_data(username)
-        
-        # Batch insert new data
-        for table_name, df in calculated_data.items():
-            if not df.empty:
-                DatabaseService._batch_save_dataframe(df, table_name)
+        try:
+            if username:
+                # Clear existing data first
+                DatabaseService._delete_user_rows(username)
+            
+            # Batch insert new data
+            for table_name, df in calculated_data.items():
+                if not df.empty:
+                    DatabaseService._batch_save_dataframe(df, table_name, commit=False)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
         
         # Reset sequences if using PostgreSQL
         if 'postgresql' in os.environ.get('DATABASE_URL', ''):
@@ -76,14 +109,9 @@ class DatabaseService:
                 db.session.rollback()
 
     @staticmethod
-    def _batch_save_dataframe(df: pd.DataFrame, table_name: str) -> None:
+    def _batch_save_dataframe(df: pd.DataFrame, table_name: str, commit: bool = True) -> None:
         """Batch save a dataframe to the appropriate database table"""
-        model_class = {
-            'sport_pyramid': SportPyramid,
-            'trad_pyramid': TradPyramid,
-            'boulder_pyramid': BoulderPyramid,
-            'user_ticks': UserTicks
-        }.get(table_name)
+        model_class = TABLE_MODELS.get(table_name)
         
         if not model_class:
             raise ValueError(f"No model found for table name: {table_name}")
@@ -123,7 +151,111 @@ class DatabaseService:
         # Bulk insert all records
         if records_to_insert:
             db.session.bulk_save_objects(records_to_insert)
+            if table_name != 'user_ticks':
+                RouteAttributesService.apply_votes(added=df)
+            if commit:
+                db.session.commit()
+
+    @staticmethod
+    def bulk_insert_dataframe(df: pd.DataFrame, table_name: str, batch_size: int = 1000) -> int:
+        """Insert a dataframe with multi-row INSERTs of batch_size rows.
+        
+        Skips the ORM objects and tick_id lookups of _batch_save_dataframe, so
+        pyramid rows must already carry their tick_id. Runs in the caller's
+        transaction; committing is left to the caller. Returns the rows written.
+        """
+        model_class = TABLE_MODELS.get(table_name)
+        if not model_class:
+            raise ValueError(f"No model found for table name: {table_name}")
+        
+        model_columns = [c.name for c in model_class.__table__.columns if c.name != 'id']
+        df = df[[c for c in df.columns if c in model_columns]]
+        if 'tick_date' in df.columns:
+            df = df.assign(tick_date=pd.to_datetime(df['tick_date']).dt.date)
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+        
+        table = model_class.__table__
+        for start in range(0, len(records), batch_size):
+            db.session.execute(table.insert(), records[start:start + batch_size])
+            if table_name != 'user_ticks':
+                RouteAttributesService.apply_votes(added=df.iloc[start:start + batch_size])
+        
+        return len(records)
+
+    @staticmethod
+    def replace_users_data(results: Dict[str, Dict[str, pd.DataFrame]], batch_size: int = 1000,
+                           commit: bool = True) -> int:
+        """Replace the ticks and pyramids of several users with bulk inserts.
+        
+        results maps username to {table name: dataframe}. Every user is cleared
+        and rewritten in one transaction, so a failed write leaves all of them
+        as they were. With commit set the whole batch is retried on connection
+        errors. With commit unset the writes stay in the caller's transaction,
+        to be committed with whatever else it writes, and retrying is left to
+        the caller, since a rollback would discard that too. Returns the rows
+        written.
+        """
+        if commit:
+            return DatabaseService._replace_users_data_committed(results, batch_size)
+        return DatabaseService._replace_users_rows(results, batch_size)
+
+    @staticmethod
+    @retry_on_db_error()
+    def _replace_users_data_committed(results: Dict[str, Dict[str, pd.DataFrame]], batch_size: int) -> int:
+        """Replace several users' rows in a transaction of their own, retried as a whole"""
+        written = DatabaseService._replace_users_rows(results, batch_size)
+        db.session.commit()
+        return written
+
+    @staticmethod
+    def _replace_users_rows(results: Dict[str, Dict[str, pd.DataFrame]], batch_size: int) -> int:
+        """Clear and rewrite several users' rows in the current transaction, rolling it back on failure"""
+        try:
+            for username in results:
+                DatabaseService._delete_user_rows(username)
+            
+            written = 0
+            for table_name in TABLE_MODELS:
+                frames = [tables[table_name] for tables in results.values()
+                          if table_name in tables and not tables[table_name].empty]
+                if frames:
+                    written += DatabaseService.bulk_insert_dataframe(
+                        pd.concat(frames, ignore_index=True), table_name, batch_size
+                    )
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+        return written
+
+    @staticmethod
+    def replace_user_ticks_streaming(username: str, chunks: Iterator[pd.DataFrame], batch_size: int = 1000) -> int:
+        """Replace a user's ticks and pyramids from tick chunks, holding one chunk at a time.
+        
+        chunks come from DataProcessor.stream_tick_chunks; each is inserted as
+        it arrives. The running max grades and tiers are then computed by
+        repair_running_max and the pyramids by SqlPyramidBuilder, both inside
+        the database, and everything commits in one transaction. Not retried,
+        as the chunks cannot be read twice. Returns the ticks written.
+        """
+        try:
+            DatabaseService._delete_user_rows(username)
+            
+            written = 0
+            first_date = None
+            for chunk in chunks:
+                written += DatabaseService.bulk_insert_dataframe(chunk, 'user_ticks', batch_size)
+                chunk_first = pd.to_datetime(chunk['tick_date']).min().date()
+                first_date = chunk_first if first_date is None else min(first_date, chunk_first)
+            if not written:
+                raise ValueError("No tick data found in CSV export")
+            
+            DatabaseService.repair_running_max(username, list(MAX_GRADE_COLUMNS), first_date)
+            SqlPyramidBuilder.rebuild_pyramids(username)
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return written
 
     @staticmethod
     def init_binned_code_dict(binned_code_dict: Dict[int, List[str]]) -> None:
@@ -158,41 +290,486 @@ class DatabaseService:
             db.session.rollback()
             raise e
 
+    @staticmethod
+    def save_user_tick(tick: Dict[str, Any], tick_id: Optional[int] = None) -> Optional[UserTicks]:
+        """Insert a processed tick, or overwrite a stored one, and repair what depends on it.
+        
+        tick holds the row-local columns (DataProcessor.process_tick). The
+        running max grades and tiers are repaired from the earliest date the
+        change touches, and only the pyramids of the disciplines involved are
+        refreshed, all in one transaction. Returns None for an unknown tick_id.
+        """
+        try:
+            if tick_id is None:
+                user_tick = UserTicks()
+                old_discipline, old_date = None, tick['tick_date']
+            else:
+                user_tick = UserTicks.query.get(tick_id)
+                if not user_tick:
+                    return None
+                old_discipline, old_date = user_tick.discipline, user_tick.tick_date
+            
+            username = tick.get('username') or user_tick.username
+            involved = {old_discipline, tick['discipline']}
+            disciplines = [discipline for discipline in DISCIPLINE_PYRAMIDS if discipline in involved]
+            attempts_before = {
+                discipline: DatabaseService._route_attempt_counts(username, discipline)
+                for discipline in disciplines
+            }
+            
+            model_columns = {c.name for c in UserTicks.__table__.columns} - {'id', 'created_at'}
+            for column, value in tick.items():
+                if column in model_columns:
+                    setattr(user_tick, column, value)
+            user_tick.username = username
+            if tick['discipline'] not in MAX_GRADE_COLUMNS:
+                user_tick.difficulty_category = 'Other'
+            
+            db.session.add(user_tick)
+            db.session.flush()
+            
+            # Max grades of the other disciplines as of the ticks before it; its own are repaired below
+            for column, value in DatabaseService.get_max_grades_before(
+                    username, tick['tick_date'], before_id=user_tick.id).items():
+                setattr(user_tick, column, value)
+            db.session.flush()
+            
+            DatabaseService.repair_running_max(username, disciplines, min(old_date, tick['tick_date']))
+            for discipline in disciplines:
+                DatabaseService._refresh_pyramid(username, discipline, attempts_before[discipline])
+            db.session.commit()
+            
+            return user_tick
+            
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def repair_running_max(username: str, disciplines: List[str], from_date: date) -> None:
+        """Recompute the running max grades and tiers of ticks from a date on, in one UPDATE.
+        
+        A discipline's max column is carried on every tick, so it is rewritten
+        on all ticks from from_date on; tiers are only rewritten on ticks of the
+        given disciplines. Ticks on the same day count in id order, as
+        DataProcessor.calculate_max_grades runs them. Committing is left to the caller.
+        """
+        columns = {discipline: MAX_GRADE_COLUMNS[discipline]
+                   for discipline in disciplines if discipline in MAX_GRADE_COLUMNS}
+        if not columns:
+            return
+        initial_max = DatabaseService.get_max_grades_before(username, from_date)
+        
+        sent = UserTicks.send_bool.is_(True)
+        running = select(UserTicks.id, *[
+            db.func.max(case((and_(UserTicks.discipline == discipline, sent), UserTicks.binned_code)))
+            .over(order_by=(UserTicks.tick_date, UserTicks.id), rows=(None, 0)).label(column)
+            for discipline, column in columns.items()
+        ]).where(
+            UserTicks.username == username,
+            UserTicks.tick_date >= from_date
+        ).subquery()
+        
+        values = {}
+        tiers = []
+        for discipline, column in columns.items():
+            cur_max = case((running.c[column] > initial_max[column], running.c[column]), else_=initial_max[column])
+            values[column] = cur_max
+            tiers.append((UserTicks.discipline == discipline, case(
+                (UserTicks.binned_code >= cur_max, 'Project'),
+                (UserTicks.binned_code == cur_max - 1, 'Tier 2'),
+                (UserTicks.binned_code == cur_max - 2, 'Tier 3'),
+                (UserTicks.binned_code == cur_max - 3, 'Tier 4'),
+                else_='Base Volume'
+            )))
+        values['difficulty_category'] = case(*tiers, else_=UserTicks.difficulty_category)
+        
+        db.session.execute(
+            update(UserTicks).where(UserTicks.id == running.c.id).values(values)
+            .execution_options(synchronize_session=False)
+        )
+
     @staticmethod
     def delete_user_tick(tick_id: int) -> bool:
-        """Delete a tick and its associated pyramid entries"""
+        """Delete a tick and update the pyramid rows it affects"""
         try:
             # Get the tick to find its details
             user_tick = UserTicks.query.get(tick_id)
             if not user_tick:
                 return False
                 
-            username = user_tick.username
+            tick = user_tick.as_dict()
             
-            # Delete the user tick
+            # Delete the user tick, then bring its pyramid in step in the same transaction
             db.session.delete(user_tick)
+            db.session.flush()
+            DatabaseService._remove_tick_from_pyramid(tick)
+            db.session.commit()
+            
+            return True
+            
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def delete_user_ticks(username: str, tick_ids: List[int]) -> int:
+        """Delete several of a user's ticks in one statement and recompute each affected pyramid once.
+        
+        Returns the number of ticks deleted.
+        """
+        try:
+            ticks = db.session.query(UserTicks.id, UserTicks.discipline).filter(
+                UserTicks.username == username,
+                UserTicks.id.in_(tick_ids)
+            ).all()
+            if not ticks:
+                return 0
+            
+            affected = {discipline for _, discipline in ticks}
+            disciplines = [discipline for discipline in DISCIPLINE_PYRAMIDS if discipline in affected]
+            attempts_before = {
+                discipline: DatabaseService._route_attempt_counts(username, discipline)
+                for discipline in disciplines
+            }
+            
+            deleted = UserTicks.query.filter(
+                UserTicks.username == username,
+                UserTicks.id.in_([tick_id for tick_id, _ in ticks])
+            ).delete(synchronize_session=False)
+            
+            for discipline in disciplines:
+                DatabaseService._refresh_pyramid(username, discipline, attempts_before[discipline])
             db.session.commit()
             
-            # Get remaining ticks for pyramid rebuild
-            remaining_ticks = DatabaseService.get_user_ticks(username)
+            return deleted
+            
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def _route_attempt_counts(username: str, discipline: str) -> Dict[tuple, tuple]:
+        """Entries and pitches logged per (route_name, location) of a discipline"""
+        rows = db.session.query(
+            UserTicks.route_name, UserTicks.location,
+            db.func.count(UserTicks.id), db.func.coalesce(db.func.sum(UserTicks.pitches), 0)
+        ).filter(
+            UserTicks.username == username,
+            UserTicks.discipline == discipline
+        ).group_by(UserTicks.route_name, UserTicks.location).all()
+        return {(route_name, location): (entries, pitches) for route_name, location, entries, pitches in rows}
+
+    @staticmethod
+    def _refresh_pyramid(username: str, discipline: str, attempts_before: Dict[tuple, tuple]) -> None:
+        """Rebuild one discipline's pyramid from the stored ticks and apply it to the stored rows in place.
+        
+        Rows of routes still in the pyramid are updated, keeping their style,
+        characteristic and any hand-edited attempt count (one that no longer
+        matched attempts_before). Routes that dropped out are removed, new ones
+        inserted, and rows added by hand, with no ticks behind them, are left
+        alone. Committing is left to the caller.
+        """
+        model = DISCIPLINE_PYRAMIDS[discipline]
+        remaining = UserTicks.query.filter_by(username=username, discipline=discipline).all()
+        pyramid = pd.DataFrame()
+        if remaining:
+            pyramid = PyramidBuilder().build_pyramid(
+                pd.DataFrame([t.as_dict() for t in remaining]), discipline, db.session
+            )
+        built = {}
+        if not pyramid.empty:
+            records = pyramid.astype(object).where(pyramid.notna(), None).to_dict('records')
+            built = {(record['route_name'], record['location']): record for record in records}
+        
+        matched = set()
+        removed = []
+        for row in model.query.filter_by(username=username).all():
+            key = (row.route_name, row.location)
+            if key not in attempts_before:
+                continue
+            record = built.get(key)
+            if record is None:
+                removed.append(row)
+                continue
+            matched.add(key)
+            entries, pitches = attempts_before[key]
+            derived_attempts = row.num_attempts == (entries if row.length_category == 'multipitch' else pitches)
+            for column in PYRAMID_TICK_COLUMNS + ['tick_id']:
+                setattr(row, column, record[column])
+            if derived_attempts:
+                row.num_attempts = record['num_attempts']
+        
+        if removed:
+            RouteAttributesService.apply_votes(removed=RouteAttributesService.entry_votes(removed))
+            for row in removed:
+                db.session.delete(row)
+        
+        if built:
+            keys = pd.Series(list(zip(pyramid['route_name'], pyramid['location'])), index=pyramid.index)
+            added = pyramid[~keys.isin(matched)]
+            if not added.empty:
+                DatabaseService._batch_save_dataframe(added, model.__tablename__, commit=False)
+
+    @staticmethod
+    def _remove_tick_from_pyramid(tick: Dict[str, Any]) -> None:
+        """Update a deleted tick's pyramid in place, touching only the rows it affects.
+        
+        Only the tick's own route changes unless the tick was the last send at
+        the top grade; then the band shifts down and the routes of the newly
+        covered grades come in. Styles, characteristics and hand-edited attempt
+        counts are kept. Committing is left to the caller.
+        """
+        discipline = tick['discipline']
+        model = DISCIPLINE_PYRAMIDS.get(discipline)
+        if model is None:
+            return
+        username = tick['username']
+        same_route = [
+            UserTicks.username == username,
+            UserTicks.discipline == discipline,
+            UserTicks.route_name == tick['route_name'],
+            UserTicks.location == tick['location']
+        ]
+        
+        # Entries and pitches logged on the route, after and before the deletion
+        entries, pitches = db.session.query(
+            db.func.count(UserTicks.id), db.func.coalesce(db.func.sum(UserTicks.pitches), 0)
+        ).filter(*same_route).one()
+        after = (entries, pitches)
+        before = (entries + 1, pitches + (tick['pitches'] or 0))
+        
+        def num_attempts(length_category: Optional[str], counts: tuple) -> int:
+            # Multipitch routes count entries, single pitches count pitches
+            return counts[0] if length_category == 'multipitch' else counts[1]
+        
+        rows = model.query.filter_by(
+            username=username, route_name=tick['route_name'], location=tick['location']
+        ).all()
+        
+        replaced = first_send = None
+        top_code = band_low = None
+        if tick['send_bool']:
+            top_code = db.session.query(db.func.max(UserTicks.binned_code)).filter(
+                UserTicks.username == username,
+                UserTicks.discipline == discipline,
+                UserTicks.send_bool.is_(True)
+            ).scalar()
+            if top_code is not None:
+                band_low = top_code - PYRAMID_GRADE_BAND + 1
+            
+            # A route's row stands for its oldest send; find it if that was the deleted tick
+            first_send = UserTicks.query.filter(*same_route, UserTicks.send_bool.is_(True)).order_by(
+                UserTicks.tick_date, UserTicks.id
+            ).first()
+            replaced = next((row for row in rows if row.tick_id == tick['id']), None)
+            if replaced is None and (first_send is None or first_send.tick_date > tick['tick_date']):
+                replaced = next((row for row in rows if row.tick_date == tick['tick_date']), None)
+        
+        removed = []
+        for row in rows:
+            derived_attempts = row.num_attempts == num_attempts(row.length_category, before)
+            if row is replaced:
+                if first_send is None or band_low is None or first_send.binned_code < band_low:
+                    removed.append(row)
+                    continue
+                # The next oldest send takes over the row
+                for column in PYRAMID_TICK_COLUMNS:
+                    setattr(row, column, getattr(first_send, column))
+                row.tick_id = first_send.id
+            if derived_attempts:
+                row.num_attempts = num_attempts(row.length_category, after)
+        
+        if removed:
+            RouteAttributesService.apply_votes(removed=RouteAttributesService.entry_votes(removed))
+            for row in removed:
+                db.session.delete(row)
+        
+        # The last send at the top grade is gone: bring in the grades the band now covers
+        if top_code is None or tick['binned_code'] is None or top_code >= tick['binned_code']:
+            return
+        entering_high = tick['binned_code'] - PYRAMID_GRADE_BAND
+        if entering_high < band_low:
+            return
+        entering_routes = db.session.query(UserTicks.route_name, UserTicks.location).filter(
+            UserTicks.username == username,
+            UserTicks.discipline == discipline,
+            UserTicks.send_bool.is_(True),
+            UserTicks.binned_code.between(band_low, entering_high)
+        ).distinct()
+        route_ticks = UserTicks.query.filter(
+            UserTicks.username == username,
+            UserTicks.discipline == discipline,
+            db.tuple_(UserTicks.route_name, UserTicks.location).in_(entering_routes)
+        ).all()
+        if not route_ticks:
+            return
+        
+        pyramid = PyramidBuilder().build_pyramid(
+            pd.DataFrame([t.as_dict() for t in route_ticks]), discipline, db.session
+        )
+        if pyramid.empty:
+            return
+        present = set(db.session.query(model.route_name, model.location).filter_by(username=username).all())
+        route_keys = pd.Series(list(zip(pyramid['route_name'], pyramid['location'])), index=pyramid.index)
+        pyramid = pyramid[pyramid['binned_code'].between(band_low, entering_high) & ~route_keys.isin(present)]
+        if not pyramid.empty:
+            DatabaseService._batch_save_dataframe(pyramid, model.__tablename__, commit=False)
+
+    @staticmethod
+    def get_tick_fingerprints(username: str) -> pd.DataFrame:
+        """Get id, date and fingerprint of every stored tick, in insertion order"""
+        rows = db.session.query(
+            UserTicks.id, UserTicks.tick_date, UserTicks.tick_fingerprint
+        ).filter_by(username=username).order_by(UserTicks.id).all()
+        return pd.DataFrame(rows, columns=['id', 'tick_date', 'tick_fingerprint'])
+
+    @staticmethod
+    def get_max_grades_before(username: str, before_date: date, exclude_ids: Optional[List[int]] = None,
+                              before_id: Optional[int] = None) -> Dict[str, int]:
+        """Get the running max grades stored for a user's ticks before a date.
+        
+        With before_id, ticks on before_date itself count too when their id is
+        lower, the order running maxima follow within a day.
+        """
+        before = UserTicks.tick_date < before_date
+        if before_id is not None:
+            before = or_(before, and_(UserTicks.tick_date == before_date, UserTicks.id < before_id))
+        # The running maxima never decrease, so their MAX is the last stored value
+        query = db.session.query(
+            db.func.max(UserTicks.cur_max_rp_sport),
+            db.func.max(UserTicks.cur_max_rp_trad),
+            db.func.max(UserTicks.cur_max_boulder)
+        ).filter(
+            UserTicks.username == username,
+            before
+        )
+        if exclude_ids:
+            query = query.filter(UserTicks.id.notin_(exclude_ids))
+        row = query.one()
+        return {
+            'cur_max_rp_sport': row[0] or 0,
+            'cur_max_rp_trad': row[1] or 0,
+            'cur_max_boulder': row[2] or 0
+        }
+
+    @staticmethod
+    def get_ticks_since(username: str, from_date: date, exclude_ids: List[int]) -> pd.DataFrame:
+        """Get the columns needed to recompute running max grades for ticks on or after a date"""
+        query = db.session.query(
+            UserTicks.id, UserTicks.tick_date, UserTicks.discipline,
+            UserTicks.send_bool, UserTicks.binned_code
+        ).filter(
+            UserTicks.username == username,
+            UserTicks.tick_date >= from_date
+        )
+        if exclude_ids:
+            query = query.filter(UserTicks.id.notin_(exclude_ids))
+        return pd.DataFrame(
+            query.all(),
+            columns=['id', 'tick_date', 'discipline', 'send_bool', 'binned_code']
+        )
+
+    @staticmethod
+    def apply_tick_changes(new_ticks: pd.DataFrame, updated_ticks: pd.DataFrame, removed_ids: List[int],
+                           commit: bool = True) -> None:
+        """Insert new ticks, update recomputed columns of stored ticks and delete removed ones.
+        
+        With commit unset the changes stay in the caller's transaction, to be
+        committed with the pyramids rebuilt from them.
+        """
+        try:
+            if removed_ids:
+                UserTicks.query.filter(UserTicks.id.in_(removed_ids)).delete(synchronize_session=False)
+            
+            if not updated_ticks.empty:
+                db.session.bulk_update_mappings(UserTicks, updated_ticks.to_dict('records'))
+            
+            if not new_ticks.empty:
+                DatabaseService._batch_save_dataframe(new_ticks, 'user_ticks', commit=False)
+            if commit:
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def rebuild_pyramids(username: str, engine: str = 'pandas', commit: bool = True) -> None:
+        """Rebuild a user's pyramids from their stored ticks.
+        
+        The 'sql' engine builds them inside the database (SqlPyramidBuilder)
+        instead of loading the ticks into pandas. With commit unset the new
+        pyramids stay in the caller's transaction, which may also hold the
+        tick changes they are built from.
+        """
+        try:
+            if engine == 'sql':
+                SqlPyramidBuilder.rebuild_pyramids(username)
+                if commit:
+                    db.session.commit()
+                return
+            
+            # Get remaining ticks for pyramid rebuild; no retry here, as a
+            # rollback would drop tick changes pending in this transaction
+            remaining_ticks = UserTicks.query.filter_by(username=username).all()
             
             # Convert to DataFrame for pyramid building
             df = pd.DataFrame([r.as_dict() for r in remaining_ticks])
             
-            # Build fresh pyramids from remaining ticks - no prediction needed
+            # Build fresh pyramids from stored ticks
             pyramid_builder = PyramidBuilder()
             sport_pyramid, trad_pyramid, boulder_pyramid = pyramid_builder.build_all_pyramids(df, db.session)
             
-            # Clear existing pyramids and save new ones
-            DatabaseService.clear_pyramids(username)
-            DatabaseService.save_calculated_data({
-                'sport_pyramid': sport_pyramid,
-                'trad_pyramid': trad_pyramid,
-                'boulder_pyramid': boulder_pyramid
-            })
-            
-            return True
-            
+            # Replace the pyramids in one transaction, leaving the ticks in place
+            DatabaseService.clear_pyramids(username, commit=False)
+            for table_name, pyramid in (('sport_pyramid', sport_pyramid),
+                                        ('trad_pyramid', trad_pyramid),
+                                        ('boulder_pyramid', boulder_pyramid)):
+                if not pyramid.empty:
+                    DatabaseService._batch_save_dataframe(pyramid, table_name, commit=False)
+            if commit:
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    # Tick Export Operations
+    @staticmethod
+    def get_tick_export(username: str) -> Optional[TickExport]:
+        """Get the stored validators for a user's last downloaded export"""
+        return TickExport.query.get(username)
+
+    @staticmethod
+    def save_tick_export(username: str, profile_url: str, content_hash: Optional[str],
+                         etag: Optional[str], last_modified: Optional[str], commit: bool = True) -> None:
+        """Record the hash and HTTP validators of the export we just fetched.
+        
+        With commit unset the record stays in the caller's transaction.
+        """
+        try:
+            tick_export = TickExport.query.get(username) or TickExport(username=username)
+            tick_export.profile_url = profile_url
+            if content_hash:
+                tick_export.content_hash = content_hash
+            tick_export.etag = etag
+            tick_export.last_modified = last_modified
+            tick_export.refresh_requested = False
+            tick_export.fetched_at = db.func.now()
+            db.session.add(tick_export)
+            if commit:
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def request_refresh(username: str) -> None:
+        """Flag a user so their next profile submission re-fetches the export"""
+        try:
+            tick_export = TickExport.query.get(username) or TickExport(username=username)
+            tick_export.refresh_requested = True
+            db.session.add(tick_export)
+            db.session.commit()
         except SQLAlchemyError as e:
             db.session.rollback()
             raise e
@@ -274,26 +851,33 @@ class DatabaseService:
             raise e
 
     @staticmethod
-    def clear_pyramids(username: str) -> None:
-        """Clear all pyramids for a user"""
+    def clear_pyramids(username: str, commit: bool = True) -> None:
+        """Clear all pyramids for a user.
+        
+        With commit unset the deletions stay in the caller's transaction.
+        """
         try:
+            RouteAttributesService.remove_user_votes(username)
             SportPyramid.query.filter_by(username=username).delete()
             TradPyramid.query.filter_by(username=username).delete()
             BoulderPyramid.query.filter_by(username=username).delete()
-            db.session.commit()
+            if commit:
+                db.session.commit()
         except SQLAlchemyError as e:
             db.session.rollback()
             raise e
 
     @staticmethod
     @retry_on_db_error()
-    def clear_user_data(username: str) -> None:
-        """Clear all data for a user (ticks and pyramids) and reset sequences"""
-        # Delete all related data in correct order
-        BoulderPyramid.query.filter_by(username=username).delete(synchronize_session=False)
-        SportPyramid.query.filter_by(username=username).delete(synchronize_session=False)
-        TradPyramid.query.filter_by(username=username).delete(synchronize_session=False)
-        UserTicks.query.filter_by(username=username).delete(synchronize_session=False)
+    def clear_user_data(username: str, commit: bool = True) -> None:
+        """Clear all data for a user (ticks and pyramids) and reset sequences.
+        
+        With commit unset the deletions stay in the caller's transaction, to be
+        committed with the data replacing them, and sequences are left alone.
+        """
+        DatabaseService._delete_user_rows(username)
+        if not commit:
+            return
         
         # Commit the deletions
         db.session.commit()
@@ -310,4 +894,17 @@ class DatabaseService:
                 COALESCE((SELECT MAX(id) FROM boulder_pyramid), 0) + 1, false);
         """))
         
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+    @staticmethod
+    def _delete_user_rows(username: str) -> None:
+        """Withdraw a user's style votes, then delete their pyramids and ticks.
+        
+        Not retried, so callers can run it inside a larger transaction that a
+        retry's rollback would discard; they retry the transaction as a whole.
+        """
+        RouteAttributesService.remove_user_votes(username)
+        BoulderPyramid.query.filter_by(username=username).delete(synchronize_session=False)
+        SportPyramid.query.filter_by(username=username).delete(synchronize_session=False)
+        TradPyramid.query.filter_by(username=username).delete(synchronize_session=False)
+        UserTicks.query.filter_by(username=username).delete(synchronize_session=False)
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, Optional
+
+# Pointer to the newest blob downloaded for a user, with its HTTP validators
+LATEST_FILE = 'latest.json'
+
+BLOB_SUFFIX = '.csv.gz'
+
+class ExportCache:
+    """Content-addressed, gzip-compressed store of downloaded tick exports.
+
+    Blobs live at <root>/<username>/<sha256>.csv.gz. Reads refresh a blob's
+    mtime, and writes evict the least recently used blobs once the cache
+    grows past max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _user_dir(self, username: str) -> str:
+        # Usernames come from profile URLs; keep them to a single path component
+        return os.path.join(self.root, os.path.basename(username))
+
+    def blob_path(self, username: str, content_hash: str) -> str:
+        """Location of a user's blob for a given content hash"""
+        return os.path.join(self._user_dir(username), f"{content_hash}{BLOB_SUFFIX}")
+
+    def put(self, username: str, content: BinaryIO, content_hash: str,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Store an export and mark it as the user's latest download.
+
+        content is read from its current position and rewound afterwards.
+        """
+        user_dir = self._user_dir(username)
+        os.makedirs(user_dir, exist_ok=True)
+        path = self.blob_path(username, content_hash)
+
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            # Write to a temp file first so readers never see a partial blob
+            start = content.tell()
+            fd, tmp_path = tempfile.mkstemp(dir=user_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as blob:
+                    shutil.copyfileobj(content, blob)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            finally:
+                content.seek(start)
+
+        self._write_latest(username, {
+            'content_hash': content_hash,
+            'etag': etag,
+            'last_modified': last_modified,
+            'cached_at': time.time()
+        })
+        self.evict()
+
+    def get(self, username: str, content_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Open a cached export, or the user's latest one when no hash is given.
+
+        Returns a dict shaped like DataProcessor.fetch_export's, or None on a miss.
+        """
+        latest = self._read_latest(username)
+        if content_hash is None:
+            if latest is None:
+                return None
+            content_hash = latest['content_hash']
+
+        path = self.blob_path(username, content_hash)
+        try:
+            os.utime(path)
+            content = gzip.open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        # Validators are only known for the latest download
+        is_latest = latest is not None and latest['content_hash'] == content_hash
+        return {
+            'not_modified': False,
+            'content': content,
+            'content_hash': content_hash,
+            'etag': latest['etag'] if is_latest else None,
+            'last_modified': latest['last_modified'] if is_latest else None
+        }
+
+    def evict(self) -> int:
+        """Delete least recently used blobs until the cache fits max_bytes, returning the count"""
+        blobs = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(BLOB_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        evicted = 0
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        return evicted
+
+    def _write_latest(self, username: str, latest: Dict[str, Any]) -> None:
+        user_dir = self._user_dir(username)
+        fd, tmp_path = tempfile.mkstemp(dir=user_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(latest, f)
+        os.replace(tmp_path, os.path.join(user_dir, LATEST_FILE))
+
+    def _read_latest(self, username: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self._user_dir(username), LATEST_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
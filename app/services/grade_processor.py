@@ -1,171 +1,312 @@
+import re
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Union
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Tuple, Union
+
+# Grade variants for each binned code; the first variant is the code's display grade
+_BINNED_CODE_DICT = { 
+    1: ("5.0","5.0-","5.0+"), 
+    2: ("5.1","5.1-","5.1+"),
+    3: ("5.2","5.2-","5.2+"), 
+    4: ("5.3","5.3-","5.3+"), 
+    5: ("5.4","5.4-","5.4+"), 
+    6: ("5.5","5.5-","5.5+"), 
+    7: ("5.6","5.6-","5.6+"), 
+    8: ("5.7","5.7-","5.7+"), 
+    9: ("5.8","5.8-","5.8+"), 
+    10: ("5.9","5.9-","5.9+"),
+    11: ("5.10-","5.10a","5.10a/b"),
+    12: ("5.10","5.10b","5.10c","5.10b/c"),
+    13: ("5.10+","5.10c/d", "5.10d"),
+    14: ("5.11-","5.11a","5.11a/b"),
+    15: ("5.11","5.11b","5.11c","5.11b/c"),
+    16: ("5.11+","5.11c/d", "5.11d"),
+    17: ("5.12-","5.12a","5.12a/b"),
+    18: ("5.12","5.12b","5.12c","5.12b/c"),
+    19: ("5.12+","5.12c/d",  "5.12d"),
+    20: ("5.13-","5.13a","5.13a/b"),
+    21: ("5.13","5.13b","5.13c","5.13b/c"),
+    22: ("5.13+", "5.13c/d", "5.13d"),
+    23: ("5.14-","5.14a","5.14a/b"),
+    24: ("5.14","5.14b","5.14c","5.14b/c"),
+    25: ( "5.14+","5.14c/d", "5.14d"),
+    26: ("5.15-","5.15a","5.15a/b"),
+    27: ("5.15","5.15b","5.15c","5.15b/c"),
+    28: ("5.15+","5.15c/d",  "5.15d"),
+    101: ("V-easy",),
+    102: ("V0","V0-","V0+","V0-1"),
+    103: ("V1","V1-","V1+","V1-2"),
+    104: ("V2","V2-","V2+","V2-3"),
+    105: ("V3","V3-","V3+","V3-4"),
+    106: ("V4","V4-","V4+","V4-5"),
+    107: ("V5","V5-","V5+","V5-6"),
+    108: ("V6","V6-","V6+","V6-7"),
+    109: ("V7","V7-","V7+","V7-8"),
+    110: ("V8","V8-","V8+","V8-9"),
+    111: ("V9","V9-","V9+","V9-10"),
+    112: ("V10","V10-","V10+","V10-11"),
+    113: ("V11","V11-","V11+","V11-12"),
+    114: ("V12","V12-","V12+","V12-13"),
+    115: ("V13","V13-","V13+","V13-14"),
+    116: ("V14","V14-","V14+","V14-15"),
+    117: ("V15","V15-","V15+","V15-16"),
+    118: ("V16","V16-","V16+"),
+    119: ("V17","V17-","V17+"),
+    120: ("V18",),
+    201: ("WI1",),
+    202: ("WI2",),
+    203: ("WI3",),
+    204: ("WI4",),
+    205: ("WI5",),
+    206: ("WI6",),
+    207: ("WI7",),
+    208: ("WI8",),
+    301: ("M1",),
+    302: ("M2",),
+    303: ("M3",),
+    304: ("M4",),
+    305: ("M5",),
+    306: ("M6",),
+    307: ("M7",),
+    308: ("M8",),
+    309: ("M9",),
+    310: ("M10",),
+    311: ("M11",),
+    312: ("M12",),
+    313: ("M13",),
+    314: ("M14",),
+    315: ("M15",),
+    316: ("M16",),
+    317: ("M17",),
+    318: ("M18",),
+    319: ("M19",),
+    401: ("A0",),
+    402: ("A1",),
+    403: ("A2",),
+    404: ("A3",),
+    405: ("A4",),
+    501: ("3rd",),
+    502: ("4th",),
+    503: ("5th",),
+    601: ("Snow",),
+    701: ("C0",),
+    702: ("C1",),
+    703: ("C2",),
+    704: ("C3",),
+    705: ("C4",),
+    801: ("AI0",),
+    802: ("AI1",),
+    803: ("AI2",),
+    804: ("AI3",),
+    805: ("AI4",)
+}
+BINNED_CODE_DICT: Mapping[int, Tuple[str, ...]] = MappingProxyType(_BINNED_CODE_DICT)
+
+# Inverted lookup; should a grade ever be listed under two codes, the first code wins
+_GRADE_TO_CODE: Dict[str, int] = {}
+for _code, _grades in _BINNED_CODE_DICT.items():
+    for _grade in _grades:
+        _GRADE_TO_CODE.setdefault(_grade, _code)
+GRADE_TO_CODE: Mapping[str, int] = MappingProxyType(_GRADE_TO_CODE)
+
+_CODE_TO_GRADE: Dict[int, str] = {code: grades[0] for code, grades in _BINNED_CODE_DICT.items()}
+CODE_TO_GRADE: Mapping[int, str] = MappingProxyType(_CODE_TO_GRADE)
+
+# Display order of grades within a pyramid, easiest first
+ROUTES_GRADE_LIST = (
+    "5.0-","5.0","5.0+","5.1-","5.1","5.1+",
+    "5.2-","5.2","5.2+","5.3-","5.3","5.3+",
+    "5.4-","5.4","5.4+","5.5-","5.5","5.5+",
+    "5.6-","5.6","5.6+","5.7-","5.7","5.7+",
+    "5.8-","5.8","5.8+","5.9-","5.9","5.9+",
+    "5.10a","5.10-","5.10a/b","5.10b","5.10", 
+    "5.10b/c", "5.10c","5.10c/d","5.10+", "5.10d",
+    "5.11a","5.11-","5.11a/b","5.11b","5.11", 
+    "5.11b/c", "5.11c","5.11c/d","5.11+", "5.11d",
+    "5.12a","5.12-","5.12a/b","5.12b","5.12", 
+    "5.12b/c", "5.12c","5.12c/d","5.12+", "5.12d",
+    "5.13a","5.13-","5.13a/b","5.13b","5.13", 
+    "5.13b/c", "5.13c","5.13c/d","5.13+", "5.13d",
+    "5.14a","5.14-","5.14a/b","5.14b","5.14", 
+    "5.14b/c", "5.14c","5.14c/d","5.14+", "5.14d",
+    "5.15a","5.15-","5.15a/b","5.15b","5.15", 
+    "5.15b/c", "5.15c","5.15c/d","5.15+", "5.15d"
+)
+
+BOULDERS_GRADE_LIST = (
+    "V-easy", 
+    "V0-","V0","V0+","V0-1",
+    "V1-","V1","V1+","V1-2",
+    "V2-","V2","V2+","V2-3",
+    "V3-","V3","V3+","V3-4",
+    "V4-","V4","V4+","V4-5",
+    "V5-","V5","V5+","V5-6",
+    "V6-","V6","V6+","V6-7",
+    "V7-","V7","V7+","V7-8",
+    "V8-","V8","V8+","V8-9",
+    "V9-","V9","V9+","V9-10",
+    "V10-","V10","V10+","V10-11",
+    "V11-","V11","V11+","V11-12",
+    "V12-","V12","V12+","V12-13",
+    "V13-","V13","V13+","V13-14",
+    "V14-","V14","V14+","V14-15",
+    "V15-","V15","V15+","V15-16",
+    "V16-","V16","V16+",
+    "V17-","V17","V17+",
+)
+
+# Conversion tables for grades Mountain Project exports outside the binned code
+# table; each maps onto a grade that is in it
+FRENCH_TO_YDS = MappingProxyType({
+    '4a': '5.5', '4b': '5.6', '4c': '5.7', '5a': '5.8', '5b': '5.9', '5c': '5.10a',
+    '6a': '5.10b', '6a+': '5.10c', '6b': '5.10d', '6b+': '5.11a', '6c': '5.11b', '6c+': '5.11c',
+    '7a': '5.11d', '7a+': '5.12a', '7b': '5.12b', '7b+': '5.12c', '7c': '5.12d', '7c+': '5.13a',
+    '8a': '5.13b', '8a+': '5.13c', '8b': '5.13d', '8b+': '5.14a', '8c': '5.14b', '8c+': '5.14c',
+    '9a': '5.14d', '9a+': '5.15a', '9b': '5.15b', '9b+': '5.15c', '9c': '5.15d'
+})
+
+FONT_TO_V = MappingProxyType({
+    '3': 'V-easy', '4': 'V0', '4+': 'V0+', '5': 'V1', '5+': 'V2',
+    '6A': 'V3', '6A+': 'V3', '6B': 'V4', '6B+': 'V4', '6C': 'V5', '6C+': 'V5',
+    '7A': 'V6', '7A+': 'V7', '7B': 'V8', '7B+': 'V8', '7C': 'V9', '7C+': 'V10',
+    '8A': 'V11', '8A+': 'V12', '8B': 'V13', '8B+': 'V14', '8C': 'V15', '8C+': 'V16', '9A': 'V17'
+})
+
+UIAA_TO_YDS = MappingProxyType({
+    'II': '5.2', 'III': '5.3', 'IV-': '5.4', 'IV': '5.5', 'IV+': '5.6', 'V-': '5.6', 'V': '5.7',
+    'V+': '5.7', 'VI-': '5.8', 'VI': '5.9', 'VI+': '5.9', 'VII-': '5.10a', 'VII': '5.10b',
+    'VII+': '5.10c', 'VIII-': '5.11a', 'VIII': '5.11c', 'VIII+': '5.11d', 'IX-': '5.12b',
+    'IX': '5.12c', 'IX+': '5.12d', 'X-': '5.13b', 'X': '5.13c', 'X+': '5.13d', 'XI-': '5.14b',
+    'XI': '5.14c', 'XI+': '5.14d', 'XII-': '5.15a', 'XII': '5.15b', 'XII+': '5.15c'
+})
+
+# Protection ratings that trail the grade, e.g. "5.10a PG13"
+PROTECTION_RATINGS = frozenset(['G', 'PG', 'PG13', 'PG-13', 'R', 'X'])
+
+# Tokens announcing that the next token is a Fontainebleau grade
+FONT_PREFIXES = frozenset(['F', 'FB', 'FONT'])
+
+_YDS_PATTERN = re.compile(r'^5\.(\d{1,2})([a-d])?(?:[/-]([a-d]))?([+-])?$', re.IGNORECASE)
+_V_PATTERN = re.compile(r'^V(\d{1,2})([+-])?(?:[/-]V?(\d{1,2}))?$', re.IGNORECASE)
+_V_EASY_PATTERN = re.compile(r'^V-?(?:B|EASY)$', re.IGNORECASE)
+_FRENCH_PATTERN = re.compile(r'^([4-9][a-c]\+?)(?:/\S+)?$')
+_FONT_PATTERN = re.compile(r'^(?:F|FB)?([3-9](?:[A-C]\+?|\+)?)(?:/\S+)?$', re.IGNORECASE)
+_FONT_LETTER_PATTERN = re.compile(r'^([3-9][A-C]\+?)(?:/\S+)?$')
+_UIAA_PATTERN = re.compile(r'^(XII|XI|X|IX|VIII|VII|VI|V|IV|III|II)([+-])?(?:/\S+)?$')
+_TRAILING_PROTECTION = re.compile(r'(?<=[\da-d+-])(?:PG-?13|PG|R|X)$', re.IGNORECASE)
+
+@lru_cache(maxsize=4096)
+def parse_grade(grade: str) -> int:
+    """Resolve a raw grade string to its binned code, or 0 when unrecognised.
+
+    Exact variants resolve straight from GRADE_TO_CODE; anything else is
+    normalised (case, protection ratings, slash grades) and tried as YDS,
+    V-scale, French, Fontainebleau and UIAA in turn, using only the primary
+    (first) grade of the string.
+    """
+    tokens = grade.strip().split()
+    if not tokens:
+        return 0
+    code = _GRADE_TO_CODE.get(tokens[0])
+    if code is not None:
+        return code
+
+    font = False
+    for token in tokens:
+        upper = token.upper()
+        if upper in FONT_PREFIXES:
+            font = True
+            continue
+        if upper in PROTECTION_RATINGS:
+            continue
+        return _parse_primary_grade(token, font)
+    return 0
+
+def _parse_primary_grade(token: str, font: bool) -> int:
+    """Map one normalised grade token through the conversion tables"""
+    if font:
+        match = _FONT_PATTERN.match(token)
+        return _GRADE_TO_CODE.get(FONT_TO_V.get(match.group(1).upper(), ''), 0) if match else 0
+
+    # Protection rating glued to the grade, e.g. "5.9R"
+    token = _TRAILING_PROTECTION.sub('', token)
+
+    match = _YDS_PATTERN.match(token)
+    if match:
+        number, letter, second_letter, sign = match.groups()
+        base = f"5.{int(number)}"
+        if letter:
+            letter = letter.lower()
+            candidates = [f"{base}{letter}/{second_letter.lower()}" if second_letter else None,
+                          f"{base}{letter}"]
+        else:
+            candidates = [f"{base}{sign}" if sign else None, base]
+        for candidate in candidates:
+            if candidate in _GRADE_TO_CODE:
+                return _GRADE_TO_CODE[candidate]
+        return 0
+
+    if _V_EASY_PATTERN.match(token):
+        return _GRADE_TO_CODE['V-easy']
+    match = _V_PATTERN.match(token)
+    if match:
+        low, sign, high = match.groups()
+        for candidate in (f"V{int(low)}-{int(high)}" if high else None,
+                          f"V{int(low)}{sign}" if sign else None,
+                          f"V{int(low)}"):
+            if candidate in _GRADE_TO_CODE:
+                return _GRADE_TO_CODE[candidate]
+        return 0
+
+    upper = token.upper()
+    if upper in _GRADE_TO_CODE:
+        # Case variants of the other systems, e.g. "wi4", "a2"
+        return _GRADE_TO_CODE[upper]
+
+    match = _FRENCH_PATTERN.match(token)
+    if match:
+        return _GRADE_TO_CODE.get(FRENCH_TO_YDS.get(match.group(1), ''), 0)
+    match = _FONT_LETTER_PATTERN.match(token)
+    if match:
+        # Upper-case letter grades like "7A+" are Font; bare digits stay ambiguous
+        return _GRADE_TO_CODE.get(FONT_TO_V.get(match.group(1), ''), 0)
+    match = _UIAA_PATTERN.match(token)
+    if match:
+        return _GRADE_TO_CODE.get(UIAA_TO_YDS.get(match.group(1) + (match.group(2) or ''), ''), 0)
+    return 0
 
 class GradeProcessor:
     """Handles all grade-related processing and conversions"""
     
     def __init__(self):
-        self.binned_code_dict = { 
-            1: ["5.0","5.0-","5.0+"], 
-            2: ["5.1","5.1-","5.1+"],
-            3: ["5.2","5.2-","5.2+"], 
-            4: ["5.3","5.3-","5.3+"], 
-            5: ["5.4","5.4-","5.4+"], 
-            6: ["5.5","5.5-","5.5+"], 
-            7: ["5.6","5.6-","5.6+"], 
-            8: ["5.7","5.7-","5.7+"], 
-            9: ["5.8","5.8-","5.8+"], 
-            10: ["5.9","5.9-","5.9+"],
-            11: ["5.10-","5.10a","5.10a/b"],
-            12: ["5.10","5.10b","5.10c","5.10b/c"],
-            13: ["5.10+","5.10c/d", "5.10d"],
-            14: ["5.11-","5.11a","5.11a/b"],
-            15: ["5.11","5.11b","5.11c","5.11b/c"],
-            16: ["5.11+","5.11c/d", "5.11d"],
-            17: ["5.12-","5.12a","5.12a/b"],
-            18: ["5.12","5.12b","5.12c","5.12b/c"],
-            19: ["5.12+","5.12c/d",  "5.12d"],
-            20: ["5.13-","5.13a","5.13a/b"],
-            21: ["5.13","5.13b","5.13c","5.13b/c"],
-            22: ["5.13+", "5.13c/d", "5.13d"],
-            23: ["5.14-","5.14a","5.14a/b"],
-            24: ["5.14","5.14b","5.14c","5.14b/c"],
-            25: [ "5.14+","5.14c/d", "5.14d"],
-            26: ["5.15-","5.15a","5.15a/b"],
-            27: ["5.15","5.15b","5.15c","5.15b/c"],
-            28: ["5.15+","5.15c/d",  "5.15d"],
-            101: ["V-easy"],
-            102: ["V0","V0-","V0+","V0-1"],
-            103: ["V1","V1-","V1+","V1-2"],
-            104: ["V2","V2-","V2+","V2-3"],
-            105: ["V3","V3-","V3+","V3-4"],
-            106: ["V4","V4-","V4+","V4-5"],
-            107: ["V5","V5-","V5+","V5-6"],
-            108: ["V6","V6-","V6+","V6-7"],
-            109: ["V7","V7-","V7+","V7-8"],
-            110: ["V8","V8-","V8+","V8-9"],
-            111: ["V9","V9-","V9+","V9-10"],
-            112: ["V10","V10-","V10+","V10-11"],
-            113: ["V11","V11-","V11+","V11-12"],
-            114: ["V12","V12-","V12+","V12-13"],
-            115: ["V13","V13-","V13+","V13-14"],
-            116: ["V14","V14-","V14+","V14-15"],
-            117: ["V15","V15-","V15+","V15-16"],
-            118: ["V16","V16-","V16+"],
-            119: ["V17","V17-","V17+"],
-            120: ["V18"],
-            201: ["WI1"],
-            202: ["WI2"],
-            203: ["WI3"],
-            204: ["WI4"],
-            205: ["WI5"],
-            206: ["WI6"],
-            207: ["WI7"],
-            208: ["WI8"],
-            301: ["M1"],
-            302: ["M2"],
-            303: ["M3"],
-            304: ["M4"],
-            305: ["M5"],
-            306: ["M6"],
-            307: ["M7"],
-            308: ["M8"],
-            309: ["M9"],
-            310: ["M10"],
-            311: ["M11"],
-            312: ["M12"],
-            313: ["M13"],
-            314: ["M14"],
-            315: ["M15"],
-            316: ["M16"],
-            317: ["M17"],
-            318: ["M18"],
-            319: ["M19"],
-            401: ["A0"],
-            402: ["A1"],
-            403: ["A2"],
-            404: ["A3"],
-            405: ["A4"],
-            501: ["3rd"],
-            502: ["4th"],
-            503: ["5th"],
-            601: ["Snow"],
-            701: ["C0"],
-            702: ["C1"],
-            703: ["C2"],
-            704: ["C3"],
-            705: ["C4"],
-            801: ["AI0"],
-            802: ["AI1"],
-            803: ["AI2"],
-            804: ["AI3"],
-            805: ["AI4"]
-        }
-        
-        self.routes_grade_list = [
-            "5.0-","5.0","5.0+","5.1-","5.1","5.1+",
-            "5.2-","5.2","5.2+","5.3-","5.3","5.3+",
-            "5.4-","5.4","5.4+","5.5-","5.5","5.5+",
-            "5.6-","5.6","5.6+","5.7-","5.7","5.7+",
-            "5.8-","5.8","5.8+","5.9-","5.9","5.9+",
-            "5.10a","5.10-","5.10a/b","5.10b","5.10", 
-            "5.10b/c", "5.10c","5.10c/d","5.10+", "5.10d",
-            "5.11a","5.11-","5.11a/b","5.11b","5.11", 
-            "5.11b/c", "5.11c","5.11c/d","5.11+", "5.11d",
-            "5.12a","5.12-","5.12a/b","5.12b","5.12", 
-            "5.12b/c", "5.12c","5.12c/d","5.12+", "5.12d",
-            "5.13a","5.13-","5.13a/b","5.13b","5.13", 
-            "5.13b/c", "5.13c","5.13c/d","5.13+", "5.13d",
-            "5.14a","5.14-","5.14a/b","5.14b","5.14", 
-            "5.14b/c", "5.14c","5.14c/d","5.14+", "5.14d",
-            "5.15a","5.15-","5.15a/b","5.15b","5.15", 
-            "5.15b/c", "5.15c","5.15c/d","5.15+", "5.15d"
-        ]
-        
-        self.boulders_grade_list = [
-            "V-easy", 
-            "V0-","V0","V0+","V0-1",
-            "V1-","V1","V1+","V1-2",
-            "V2-","V2","V2+","V2-3",
-            "V3-","V3","V3+","V3-4",
-            "V4-","V4","V4+","V4-5",
-            "V5-","V5","V5+","V5-6",
-            "V6-","V6","V6+","V6-7",
-            "V7-","V7","V7+","V7-8",
-            "V8-","V8","V8+","V8-9",
-            "V9-","V9","V9+","V9-10",
-            "V10-","V10","V10+","V10-11",
-            "V11-","V11","V11+","V11-12",
-            "V12-","V12","V12+","V12-13",
-            "V13-","V13","V13+","V13-14",
-            "V14-","V14","V14+","V14-15",
-            "V15-","V15","V15+","V15-16",
-            "V16-","V16","V16+",
-            "V17-","V17","V17+",
-        ]
+        # Shared registry, so creating a GradeProcessor costs nothing
+        self.binned_code_dict = BINNED_CODE_DICT
+        self.routes_grade_list = ROUTES_GRADE_LIST
+        self.boulders_grade_list = BOULDERS_GRADE_LIST
     
-    def convert_grades_to_codes(self, grades: List[str]) -> List[int]:
-        """Convert climbing grades to numeric codes"""
-        grades = [str(grade) if grade is not None else 'unknown' for grade in grades]
-        
-        binned_code_lst = []
-        for grade in grades:
-            grade_prefix = grade.split(' ')[0]
-            code = 0  # default value
-            
-            for key, values in self.binned_code_dict.items():
-                if any(substring == grade_prefix for substring in values):
-                    code = key
-                    break
-                    
-            binned_code_lst.append(code)
-            
-        return binned_code_lst
+    def convert_grades_to_codes(self, grades: Union[List[str], pd.Series]) -> List[int]:
+        """Convert climbing grades to numeric codes (0 when unrecognised)"""
+        # Look up each distinct grade once, then broadcast back to the rows
+        labels, uniques = pd.factorize(np.asarray(grades, dtype=object), use_na_sentinel=False)
+        unique_codes = np.fromiter(
+            (self.get_code_from_grade(grade) for grade in uniques),
+            dtype=np.int64, count=len(uniques)
+        )
+        return unique_codes[labels].tolist()
+    
+    def get_code_from_grade(self, grade: str) -> int:
+        """Convert a single grade to its numeric code (0 when unrecognised)"""
+        return parse_grade(str(grade))
     
     def get_grade_from_code(self, code: int) -> str:
         """Convert numeric code back to grade"""
-        return self.binned_code_dict.get(code, [''])[0] 
+        return _CODE_TO_GRADE.get(code, '')
+    
+    def convert_codes_to_grades(self, codes: pd.Series) -> pd.Series:
+        """Convert a series of numeric codes back to grades"""
+        return codes.map(_CODE_TO_GRADE).fillna('')
         
     def get_grade_sorting_list(self, discipline: str) -> List[str]:
         """Get the appropriate grade sorting list for a discipline"""
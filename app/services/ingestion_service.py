@@ -0,0 +1,145 @@
+from app.models import db, UserTicks
+from app.services.data_processor import DataProcessor
+from app.services.database_service import DatabaseService
+from app.services.export_cache import ExportCache
+from typing import BinaryIO, Callable, Optional
+import pandas as pd
+
+class IngestionService:
+    """Runs the full profile ingestion pipeline outside of a web request"""
+
+    @staticmethod
+    def ingest_profile(profile_url: str, chunk_size: Optional[int] = None, incremental: bool = True,
+                       export_cache: Optional[ExportCache] = None, cached_hash: Optional[str] = None,
+                       pyramid_engine: str = 'pandas',
+                       on_fetched: Optional[Callable[[str], None]] = None) -> bool:
+        """Download, process and store a profile.
+
+        Returns False when the export is unchanged since the last ingestion, in
+        which case the stored ticks and pyramids are left untouched. With
+        incremental set, a changed export for a known user only processes the
+        rows that differ from the stored ticks. Downloads are kept in
+        export_cache; cached_hash (for retries) reuses the cached export with
+        that content hash instead of fetching it again, and a fresh download
+        is made when it is gone. on_fetched is called with the content hash of
+        every export actually downloaded, before it is processed. pyramid_engine
+        picks how an incremental refresh rebuilds the pyramids (see
+        DatabaseService.rebuild_pyramids). A full rebuild with chunk_size set
+        streams the ticks into the database chunk by chunk and builds the
+        pyramids there, so its memory follows the chunk size.
+        """
+        username = profile_url.split('/')[-1]
+        processor = DataProcessor(db.session, export_cache=export_cache)
+
+        # Validators are only worth sending while we still hold the data they describe
+        tick_export = DatabaseService.get_tick_export(username)
+        has_data = (tick_export is not None
+                    and UserTicks.query.filter_by(username=username).first() is not None)
+
+        export = None
+        if cached_hash and export_cache is not None:
+            export = export_cache.get(username, content_hash=cached_hash)
+        if export is None:
+            export = processor.fetch_export(
+                profile_url,
+                etag=tick_export.etag if has_data else None,
+                last_modified=tick_export.last_modified if has_data else None
+            )
+            if on_fetched is not None and not export['not_modified']:
+                try:
+                    on_fetched(export['content_hash'])
+                except BaseException:
+                    export['content'].close()
+                    raise
+
+        unchanged = export['not_modified'] or (
+            has_data and export['content_hash'] == tick_export.content_hash
+        )
+        if unchanged:
+            if export['content'] is not None:
+                export['content'].close()
+            DatabaseService.save_tick_export(
+                username, profile_url, export['content_hash'],
+                export['etag'], export['last_modified']
+            )
+            return False
+
+        try:
+            if incremental and has_data and IngestionService._ingest_incremental(
+                    processor, export['content'], username, chunk_size, pyramid_engine):
+                DatabaseService.save_tick_export(
+                    username, profile_url, export['content_hash'],
+                    export['etag'], export['last_modified']
+                )
+                return True
+            
+            if chunk_size:
+                # Replace whatever we had stored for this user, in one transaction
+                DatabaseService.replace_user_ticks_streaming(
+                    username, processor.stream_tick_chunks(export['content'], username, chunk_size)
+                )
+            else:
+                sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks = processor.process_export(
+                    export['content'], username, content_hash=export['content_hash']
+                )
+        finally:
+            export['content'].close()
+
+        if not chunk_size:
+            # Replace whatever we had stored for this user, in one transaction
+            DatabaseService.save_calculated_data({
+                'sport_pyramid': sport_pyramid,
+                'trad_pyramid': trad_pyramid,
+                'boulder_pyramid': boulder_pyramid,
+                'user_ticks': user_ticks
+            })
+
+        DatabaseService.save_tick_export(
+            username, profile_url, export['content_hash'],
+            export['etag'], export['last_modified']
+        )
+        return True
+
+    @staticmethod
+    def _ingest_incremental(processor: DataProcessor, data: BinaryIO, username: str,
+                            chunk_size: Optional[int] = None, pyramid_engine: str = 'pandas') -> bool:
+        """Store only the export rows that differ from the stored ticks.
+
+        Returns False without reading the export when the stored ticks predate
+        fingerprinting, so the caller falls back to a full rebuild.
+        """
+        stored = DatabaseService.get_tick_fingerprints(username)
+        if stored.empty or stored['tick_fingerprint'].isna().any():
+            return False
+        
+        chunks = processor.parse_csv_chunks(data, chunk_size) if chunk_size else iter([processor.parse_csv(data)])
+        new_raw, removed_ids = processor.split_new_ticks(chunks, stored)
+        if new_raw.empty and not removed_ids:
+            return True
+        
+        # Running max grades only change from the earliest added or removed tick onwards
+        changed_dates = pd.to_datetime(stored.loc[stored['id'].isin(removed_ids), 'tick_date'])
+        if not new_raw.empty:
+            changed_dates = pd.concat([
+                changed_dates, pd.to_datetime(new_raw['tick_date'], errors='coerce')
+            ])
+        from_date = changed_dates.min()
+        if pd.isna(from_date):
+            # Only undated rows were added, which processing drops anyway
+            return True
+        from_date = from_date.date()
+        
+        initial_max = DatabaseService.get_max_grades_before(username, from_date)
+        window = DatabaseService.get_ticks_since(username, from_date, removed_ids)
+        new_ticks, updated_ticks = processor.process_new_ticks(new_raw, username, window, initial_max)
+        
+        # Ticks and the pyramids built from them commit together, so a failed
+        # rebuild leaves the diff in place for the retry to find
+        try:
+            DatabaseService.apply_tick_changes(new_ticks, updated_ticks, removed_ids, commit=False)
+            DatabaseService.rebuild_pyramids(username, pyramid_engine, commit=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return True
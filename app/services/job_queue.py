@@ -0,0 +1,172 @@
+from app.models import db, IngestionJob
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy import text
+from typing import Optional, Tuple
+
+class JobQueue:
+    """Durable ingestion job queue backed by the ingestion_jobs table"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    @staticmethod
+    def enqueue(username: str, profile_url: str) -> IngestionJob:
+        """Queue a profile for ingestion, reusing any job still pending for the user.
+
+        The unique index on a user's active job settles concurrent requests:
+        the one that loses the insert returns the winner's job.
+        """
+        try:
+            pending = JobQueue.get_pending_job(username)
+            if pending:
+                return pending
+
+            job = IngestionJob(
+                username=username,
+                profile_url=profile_url,
+                status=JobQueue.QUEUED,
+                attempts=0
+            )
+            db.session.add(job)
+            db.session.commit()
+            return job
+        except IntegrityError as e:
+            db.session.rollback()
+            pending = JobQueue.get_pending_job(username)
+            if pending is None:
+                raise e
+            return pending
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def get_pending_job(username: str) -> Optional[IngestionJob]:
+        """The user's queued or running job, if any"""
+        return IngestionJob.query.filter(
+            IngestionJob.username == username,
+            IngestionJob.status.in_([JobQueue.QUEUED, JobQueue.RUNNING])
+        ).first()
+
+    @staticmethod
+    def claim_next(worker_id: str) -> Optional[IngestionJob]:
+        """Atomically claim the oldest queued job.
+
+        SKIP LOCKED lets any number of workers poll the table at once without
+        blocking on, or double-claiming, a row another worker is taking.
+        """
+        try:
+            claimed_id = db.session.execute(text("""
+                UPDATE ingestion_jobs
+                SET status = :running,
+                    attempts = attempts + 1,
+                    worker_id = :worker_id,
+                    started_at = now(),
+                    finished_at = NULL
+                WHERE id = (
+                    SELECT id FROM ingestion_jobs
+                    WHERE status = :queued
+                    ORDER BY created_at, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id
+            """), {
+                'running': JobQueue.RUNNING,
+                'queued': JobQueue.QUEUED,
+                'worker_id': worker_id
+            }).scalar()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+        if claimed_id is None:
+            return None
+        return IngestionJob.query.get(claimed_id)
+
+    @staticmethod
+    def complete(job_id: int) -> None:
+        """Mark a job as finished"""
+        try:
+            job = IngestionJob.query.get(job_id)
+            if job:
+                job.status = JobQueue.DONE
+                job.error = None
+                job.finished_at = db.func.now()
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def record_export(job_id: int, content_hash: str) -> None:
+        """Remember the export an attempt downloaded, so a retry can reuse it from the cache"""
+        try:
+            job = IngestionJob.query.get(job_id)
+            if job:
+                job.export_hash = content_hash
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def fail(job_id: int, error: str, max_attempts: int = 3) -> None:
+        """Record a failure, putting the job back on the queue until it runs out of attempts"""
+        try:
+            job = IngestionJob.query.get(job_id)
+            if job:
+                job.error = error
+                if job.attempts < max_attempts:
+                    job.status = JobQueue.QUEUED
+                else:
+                    job.status = JobQueue.FAILED
+                    job.finished_at = db.func.now()
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def requeue_stale(stale_after_seconds: int, max_attempts: int = 3) -> Tuple[int, int]:
+        """Return jobs whose worker died mid-run to the queue.
+
+        Jobs that have used up their attempts are failed instead, so one that
+        keeps killing its worker (out of memory, a crash) is not retried
+        forever. Returns the number of jobs requeued and failed.
+        """
+        params = {
+            'queued': JobQueue.QUEUED,
+            'running': JobQueue.RUNNING,
+            'failed': JobQueue.FAILED,
+            'stale_after': stale_after_seconds,
+            'max_attempts': max_attempts
+        }
+        try:
+            failed = db.session.execute(text("""
+                UPDATE ingestion_jobs
+                SET status = :failed, worker_id = NULL, finished_at = now(),
+                    error = 'Worker stopped responding on every attempt'
+                WHERE status = :running
+                AND started_at < now() - make_interval(secs => :stale_after)
+                AND attempts >= :max_attempts
+            """), params).rowcount
+            requeued = db.session.execute(text("""
+                UPDATE ingestion_jobs
+                SET status = :queued, worker_id = NULL
+                WHERE status = :running
+                AND started_at < now() - make_interval(secs => :stale_after)
+            """), params).rowcount
+            db.session.commit()
+            return requeued, failed
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def get_job(job_id: int) -> Optional[IngestionJob]:
+        """Get a job by ID"""
+        return IngestionJob.query.get(job_id)
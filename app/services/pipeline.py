@@ -0,0 +1,348 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import psutil
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bytes of stage outputs remembered in memory per process. Off by default so
+# web and worker processes stay within their memory limit; reprocess.py
+# workers enable it (see StageMemo.resize)
+DEFAULT_MEMO_MAX_BYTES = 0
+
+STORED_OUTPUT_SUFFIX = '.pkl'
+
+class Stage:
+    """One named step of a pipeline over the tick frame.
+
+    func receives a copy of the declared input columns (the whole frame when
+    inputs is None, the pipeline source for a source stage) plus the declared
+    params as keyword arguments. It returns a frame holding the declared
+    output columns; its index may drop or reorder rows, which then applies to
+    the whole tick frame. A stage declaring tables instead returns a dict of
+    those named tables and leaves the tick frame alone. settings holds fixed
+    options of func that change its output (e.g. how a parse infers dtypes);
+    they key memoized outputs like params do.
+
+    Bump version when a stage's rules change so its memoized outputs, and
+    those of every stage downstream of it, are recomputed. Set changes_rows
+    on stages that drop or reorder rows; everything after them is downstream.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], inputs: Optional[Sequence[str]] = (),
+                 outputs: Sequence[str] = (), tables: Sequence[str] = (), params: Sequence[str] = (),
+                 source: bool = False, changes_rows: bool = False, memoize: bool = True, version: int = 1,
+                 settings: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.func = func
+        self.inputs = None if inputs is None else list(inputs)
+        self.outputs = list(outputs)
+        self.tables = list(tables)
+        self.params = list(params)
+        self.source = source
+        self.changes_rows = changes_rows or source
+        self.memoize = memoize
+        self.version = version
+        self.settings = dict(settings or {})
+
+class StageMemo:
+    """Thread-safe LRU of stage outputs by memo key, bounded by their size in bytes.
+
+    Outputs bigger than max_bytes on their own are not kept; max_bytes of 0
+    keeps nothing.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Tuple, result: Any) -> None:
+        size = self.result_bytes(result)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = result
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the byte bound, dropping least recently used outputs to fit it"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def discard(self, stage_names: Iterable[str]) -> None:
+        """Drop every output of the named stages"""
+        stage_names = set(stage_names)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in stage_names]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    @staticmethod
+    def result_bytes(result: Any) -> int:
+        """Memory held by a stage output (a frame, or a dict of table frames)"""
+        frames = result.values() if isinstance(result, dict) else [result]
+        return int(sum(frame.memory_usage(index=True, deep=True).sum() for frame in frames))
+
+    def _remove(self, key: Tuple) -> None:
+        if key in self._entries:
+            del self._entries[key]
+            self._total_bytes -= self._sizes.pop(key)
+
+    def _evict(self) -> None:
+        while self._entries and self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+# One memo for every pipeline in the process, so processors created per export
+# (ingestion jobs, reprocess workers) reuse each other's stage outputs once enabled
+SHARED_MEMO = StageMemo()
+
+class StageStore:
+    """On-disk store of pickled stage outputs, so they outlive the process.
+
+    Outputs live at <root>/<stage>/<sha256 of memo key>.pkl. Reads refresh an
+    output's mtime, and writes evict the least recently used outputs once the
+    store grows past max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _stage_dir(self, stage_name: str) -> str:
+        return os.path.join(self.root, stage_name.replace(' ', '_'))
+
+    def output_path(self, key: Tuple) -> str:
+        """Location of the output stored under a memo key"""
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self._stage_dir(key[0]), f"{digest}{STORED_OUTPUT_SUFFIX}")
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        path = self.output_path(key)
+        try:
+            os.utime(path)
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: Tuple, result: Any) -> None:
+        stage_dir = self._stage_dir(key[0])
+        os.makedirs(stage_dir, exist_ok=True)
+        # Write to a temp file first so readers never see a partial output
+        fd, tmp_path = tempfile.mkstemp(dir=stage_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.output_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def discard(self, stage_names: Iterable[str]) -> int:
+        """Delete every stored output of the named stages, returning the count"""
+        removed = 0
+        for stage_name in stage_names:
+            stage_dir = self._stage_dir(stage_name)
+            if not os.path.isdir(stage_dir):
+                continue
+            for filename in os.listdir(stage_dir):
+                if filename.endswith(STORED_OUTPUT_SUFFIX):
+                    try:
+                        os.remove(os.path.join(stage_dir, filename))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def evict(self) -> int:
+        """Delete least recently used outputs until the store fits max_bytes, returning the count"""
+        outputs = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(STORED_OUTPUT_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                outputs.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        evicted = 0
+        for _, size, path in sorted(outputs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        return evicted
+
+class Pipeline:
+    """Runs stages in order, memoizing each stage's outputs by a hash of its inputs.
+
+    Outputs are remembered in memo, the process-wide SHARED_MEMO by default,
+    and when a store is given also on disk, where later processes find them.
+    """
+
+    def __init__(self, stages: List[Stage], memo: Optional[StageMemo] = None,
+                 store: Optional[StageStore] = None):
+        self.stages = stages
+        self.memo = memo if memo is not None else SHARED_MEMO
+        self.store = store
+        self.stats = {}
+
+    def stage(self, name: str) -> Stage:
+        """Look up a stage by name"""
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(f"Unknown pipeline stage: {name}")
+
+    def downstream_of(self, *names: str) -> List[str]:
+        """The named stages and every stage that reads what they produce, in run order"""
+        affected = set(names)
+        changed = set()
+        rows_changed = False
+        for stage in self.stages:
+            reads_changed = bool(changed) and (stage.inputs is None or bool(changed & set(stage.inputs)))
+            if stage.name in affected or reads_changed or rows_changed:
+                affected.add(stage.name)
+                changed |= set(stage.outputs)
+                rows_changed = rows_changed or stage.changes_rows
+        return [stage.name for stage in self.stages if stage.name in affected]
+
+    def invalidate(self, *names: str) -> List[str]:
+        """Forget memoized and stored outputs of the named stages and everything downstream.
+
+        Returns the stages that will run again.
+        """
+        stale = self.downstream_of(*names)
+        self.memo.discard(stale)
+        if self.store is not None:
+            self.store.discard(stale)
+        return stale
+
+    def stages_between(self, start: Optional[str] = None, stop: Optional[str] = None) -> List[Stage]:
+        """The stages from start through stop, in run order (all of them by default)"""
+        names = [stage.name for stage in self.stages]
+        first = names.index(self.stage(start).name) if start else 0
+        last = names.index(self.stage(stop).name) if stop else len(names) - 1
+        return self.stages[first:last + 1]
+
+    def run(self, source: Any, source_key: Optional[str] = None, skip: Sequence[str] = (),
+            start: Optional[str] = None, stop: Optional[str] = None,
+            **params: Any) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        """Run the stages over source, returning the tick frame and any tables.
+
+        source_key identifies the source (e.g. the export's content hash) so
+        the source stage can be memoized; without it the source stage always
+        runs. Stages named in skip are left out; only skip stages whose
+        outputs no later stage reads, such as table stages. start and stop
+        run only that slice of the stages; when it begins after the source
+        stage, source is the tick frame entering start and may be modified.
+        Params a stage declares but the call leaves out are passed as None.
+        """
+        process = psutil.Process(os.getpid())
+        stages = self.stages_between(start, stop)
+        df = None if stages[0].source else source
+        tables = {}
+        for stage in stages:
+            if stage.name in skip:
+                continue
+            stage_params = {name: params.get(name) for name in stage.params}
+            if stage.source:
+                stage_input = source
+            else:
+                stage_input = df if stage.inputs is None else df[stage.inputs]
+            key = None
+            if stage.memoize:
+                input_key = source_key if stage.source else self._hash_frame(stage_input)
+                if input_key is not None:
+                    key = (stage.name, stage.version, input_key,
+                           repr(sorted(stage_params.items())), repr(sorted(stage.settings.items())))
+
+            stats = self.stats.setdefault(stage.name, {'runs': 0, 'memo_hits': 0, 'store_hits': 0,
+                                                       'seconds': 0.0, 'rss_delta_bytes': 0})
+            result = None
+            if key is not None:
+                result = self.memo.get(key)
+                if result is not None:
+                    stats['memo_hits'] += 1
+                elif self.store is not None:
+                    result = self.store.get(key)
+                    if result is not None:
+                        stats['store_hits'] += 1
+                        self.memo.put(key, result)
+            if result is None:
+                if not stage.source:
+                    stage_input = stage_input.copy()
+                rss_before = process.memory_info().rss
+                start_time = time.perf_counter()
+                result = stage.func(stage_input, **stage_params)
+                stats['seconds'] += time.perf_counter() - start_time
+                stats['rss_delta_bytes'] += process.memory_info().rss - rss_before
+                stats['runs'] += 1
+                if key is not None:
+                    self.memo.put(key, result)
+                    if self.store is not None:
+                        self.store.put(key, result)
+
+            if stage.tables:
+                tables.update({name: table.copy() for name, table in result.items()})
+            elif stage.source:
+                df = result.copy()
+            else:
+                df = self._merge(df, result, stage.outputs)
+        # Memoized stage outputs back the frame; hand out an independent copy
+        return df.copy(), tables
+
+    def reset_stats(self) -> None:
+        """Clear the per-stage counters"""
+        self.stats = {}
+
+    @staticmethod
+    def _merge(df: pd.DataFrame, result: pd.DataFrame, outputs: List[str]) -> pd.DataFrame:
+        """Apply a stage's row selection and output columns to the tick frame"""
+        if not result.index.equals(df.index):
+            df = df.loc[result.index]
+        for column in outputs:
+            df[column] = result[column]
+        return df
+
+    @staticmethod
+    def _hash_frame(df: pd.DataFrame) -> str:
+        """Content hash of a frame's columns, dtypes, index and values"""
+        digest = hashlib.sha256()
+        digest.update(repr([(column, str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
@@ -0,0 +1,125 @@
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Any
+
+# Parallel downloads across all hosts
+DEFAULT_MAX_WORKERS = 8
+
+# Mountain Project is a single host, so this is the effective concurrency there
+DEFAULT_PER_HOST_LIMIT = 4
+
+# Minimum seconds between request starts against the same host
+DEFAULT_PER_HOST_INTERVAL = 0.1
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+# Transient failures worth retrying with exponential backoff
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class HostRateLimiter:
+    """Caps concurrent requests and request rate per host"""
+
+    def __init__(self, max_concurrent: int, min_interval: float):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def acquire(self, host: str) -> None:
+        """Block until a request to host may start"""
+        with self._lock:
+            slots = self._slots.setdefault(host, threading.BoundedSemaphore(self.max_concurrent))
+        slots.acquire()
+
+        # Reserve the next start time for this host, then sleep outside the lock
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host: str) -> None:
+        """Free the host slot taken by acquire"""
+        self._slots[host].release()
+
+class ProfileFetcher:
+    """Downloads tick exports over one pooled, retrying HTTP session"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+                 per_host_interval: float = DEFAULT_PER_HOST_INTERVAL,
+                 retries: int = 3, backoff_factor: float = 0.5,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(per_host_limit, per_host_interval)
+        self.session = self._build_session(max_workers, retries, backoff_factor)
+
+    @staticmethod
+    def _build_session(pool_size: int, retries: int, backoff_factor: float) -> requests.Session:
+        """Create a keep-alive session that retries transient failures"""
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        # requests decodes the body transparently, so hashes stay over the plain CSV
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        return session
+
+    @contextmanager
+    def stream(self, url: str, headers: Optional[Dict[str, str]] = None) -> Iterator[requests.Response]:
+        """Streaming GET that holds one of the host's slots until the body is read"""
+        host = urlsplit(url).netloc
+        self.limiter.acquire(host)
+        try:
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            try:
+                yield response
+            finally:
+                response.close()
+        finally:
+            self.limiter.release(host)
+
+    def fetch_many(self, urls: Iterable[str], fetch: Callable[[str], Any]) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+        """Run fetch for every URL in parallel, yielding (url, result, error) as each finishes"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result(), None
+                except Exception as e:
+                    yield url, None, e
+
+    def close(self) -> None:
+        """Close the pooled connections"""
+        self.session.close()
+
+_shared_fetcher = None
+_shared_fetcher_lock = threading.Lock()
+
+def get_shared_fetcher() -> ProfileFetcher:
+    """Process-wide fetcher, so every DataProcessor reuses the same connection pool"""
+    global _shared_fetcher
+    with _shared_fetcher_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = ProfileFetcher()
+        return _shared_fetcher
@@ -1,229 +1,182 @@
 import pandas as pd
-from typing import Tuple, Dict
-from .grade_processor import GradeProcessor
+import numpy as np
+from typing import Tuple, Dict, List
+from .grade_processor import GradeProcessor, ROUTES_GRADE_LIST, BOULDERS_GRADE_LIST
 import time
-from sqlalchemy import func, or_, text
-from sqlalchemy.orm import aliased
-from sqlalchemy.sql import or_
-from app.models import SportPyramid, TradPyramid, BoulderPyramid
+from .route_attributes_service import RouteAttributesService, STYLE_VOTE_COLUMNS, CHARACTERISTIC_VOTE_COLUMNS
+from .climb_classifier import ClimbClassifier, NOTE_STYLES, NOTE_CHARACTERISTICS
+
+# Disciplines the pyramid engine builds, each with the grade order ranking
+# sends within a binned code. Each has a pyramid table of its own; tr ticks and
+# the ice, mixed and aid ticks the classifier leaves unlabelled get no pyramid.
+PYRAMID_DISCIPLINES = {
+    'sport': {'grades': ROUTES_GRADE_LIST},
+    'trad': {'grades': ROUTES_GRADE_LIST},
+    'boulder': {'grades': BOULDERS_GRADE_LIST}
+}
+
+# Integer rank of each grade within its discipline, computed once
+GRADE_RANKS = {
+    discipline: {grade: rank for rank, grade in enumerate(config['grades'])}
+    for discipline, config in PYRAMID_DISCIPLINES.items()
+}
+
+# Number of binned codes, counting down from the top send, a pyramid covers
+PYRAMID_GRADE_BAND = 4
+
+# Pyramids with a table of their own, in the order build_all_pyramids returns them
+STORED_PYRAMIDS = tuple(PYRAMID_DISCIPLINES)
 
 class PyramidBuilder:
     """Handles the creation of climbing pyramids for different disciplines"""
     
     def __init__(self):
-        self.custom_routes_grade_list = [
-            "5.0-","5.0","5.0+","5.1-","5.1","5.1+",
-            "5.2-","5.2","5.2+","5.3-","5.3","5.3+",
-            "5.4-","5.4","5.4+","5.5-","5.5","5.5+",
-            "5.6-","5.6","5.6+","5.7-","5.7","5.7+",
-            "5.8-","5.8","5.8+","5.9-","5.9","5.9+",
-            "5.10a","5.10-","5.10a/b","5.10b","5.10", 
-            "5.10b/c", "5.10c","5.10c/d","5.10+", "5.10d",
-            "5.11a","5.11-","5.11a/b","5.11b","5.11", 
-            "5.11b/c", "5.11c","5.11c/d","5.11+", "5.11d",
-            "5.12a","5.12-","5.12a/b","5.12b","5.12", 
-            "5.12b/c", "5.12c","5.12c/d","5.12+", "5.12d",
-            "5.13a","5.13-","5.13a/b","5.13b","5.13", 
-            "5.13b/c", "5.13c","5.13c/d","5.13+", "5.13d",
-            "5.14a","5.14-","5.14a/b","5.14b","5.14", 
-            "5.14b/c", "5.14c","5.14c/d","5.14+", "5.14d",
-            "5.15a","5.15-","5.15a/b","5.15b","5.15", 
-            "5.15b/c", "5.15c","5.15c/d","5.15+", "5.15d"
-        ]
-        self.custom_boulders_grade_list = [
-            "V-easy", 
-            "V0-","V0","V0+","V0-1",
-            "V1-","V1","V1+","V1-2",
-            "V2-","V2","V2+","V2-3",
-            "V3-","V3","V3+","V3-4",
-            "V4-","V4","V4+","V4-5",
-            "V5-","V5","V5+","V5-6",
-            "V6-","V6","V6+","V6-7",
-            "V7-","V7","V7+","V7-8",
-            "V8-","V8","V8+","V8-9",
-            "V9-","V9","V9+","V9-10",
-            "V10-","V10","V10+","V10-11",
-            "V11-","V11","V11+","V11-12",
-            "V12-","V12","V12+","V12-13",
-            "V13-","V13","V13+","V13-14",
-            "V14-","V14","V14+","V14-15",
-            "V15-","V15","V15+","V15-16",
-            "V16-","V16","V16+",
-            "V17-","V17","V17+",
-        ]
+        # Shared, read-only grade ranks of each configured discipline
+        self.grade_ranks = GRADE_RANKS
         
-        # Add style and characteristic keywords
-        self.style_keywords = {
-            'Slab': ['slab', 'low angle'],
-            'Vertical': ['vertical', 'vertical face','vert'],
-            'Overhang': ['overhang', 'steep' 'overhanging'],
-            'Roof': ['roof', 'horizontal', 'ceiling']
-        }
+        # Styles and characteristics inferred from the note_flags bits
+        self.style_flags = NOTE_STYLES
+        self.characteristic_flags = NOTE_CHARACTERISTICS
+        self.classifier = ClimbClassifier()
+
+    def predict_styles_characteristics(self, pyramids: List[pd.DataFrame], db_session) -> List[pd.DataFrame]:
+        """Fill route style and characteristic from the crowd-sourced votes, then from note keywords.
         
-        self.characteristic_keywords = {
-            'Power': ['powerful', 'dynamic', 'boulder', 'bouldery', 'power'],
-            'Power Endurance': ['resistance', 'sustained', 'power endurance'],
-            'Endurance': ['endurance', 'continuous', 'no rest']
+        Every route across the pyramids is looked up in route_attributes in one
+        query. The most voted style and characteristic win, ties going to the
+        first in vote column order. Routes without votes fall back to the
+        keywords detected in their notes.
+        """
+        pyramids = [df.copy() for df in pyramids]
+        route_keys = {
+            key for df in pyramids if not df.empty
+            for key in df[['route_name', 'location']].dropna().itertuples(index=False, name=None)
         }
-
-    def predict_style_characteristic(self, row, db_session):
-        """Predict route style and characteristic based on evidence with optimized DB queries."""
-        route_name = row['route_name']
-        location = row['location']
-        notes = row.get('notes', '').lower() if pd.notna(row.get('notes')) else ''
-        
-        style = None
-        characteristic = None
-        
-        # Query existing pyramid data
-        for table in [SportPyramid, TradPyramid, BoulderPyramid]:
-            if style and characteristic:
-                break
-            
-            existing_data = (db_session.query(
-                table.route_style,
-                table.route_characteristic,
-                func.count(table.route_style).label('style_count'),
-                func.count(table.route_characteristic).label('char_count')
-            )
-            .filter(
-                table.route_name == route_name,
-                table.location == location,
-                or_(
-                    table.route_style.isnot(None),
-                    table.route_characteristic.isnot(None)
-                )
-            )
-            .group_by(table.route_style, table.route_characteristic)
-            .order_by(text('style_count DESC, char_count DESC'))
-            .limit(1)
-            .first())
+        attributes = RouteAttributesService.get_route_attributes(sorted(route_keys), db_session)
+        attributes = attributes.set_index(['route_name', 'location'])
+        
+        predictions = pd.DataFrame(index=attributes.index)
+        for column, vote_columns in (('route_style', STYLE_VOTE_COLUMNS),
+                                     ('route_characteristic', CHARACTERISTIC_VOTE_COLUMNS)):
+            counts = attributes[list(vote_columns.values())].to_numpy(dtype=int)
+            labels = np.array(list(vote_columns), dtype=object)[counts.argmax(axis=1)]
+            predictions[column] = np.where(counts.max(axis=1, initial=0) > 0, labels, None)
+        
+        for df in pyramids:
+            if df.empty:
+                continue
+            # Ticks loaded back from the database carry notes but not their flags
+            if 'note_flags' not in df.columns:
+                df['note_flags'] = self.classifier.classify_note_flags(df['notes'])
             
-            if existing_data:
-                style = style or existing_data.route_style
-                characteristic = characteristic or existing_data.route_characteristic
-        
-        # Check notes for keywords if still not found
-        if not style and notes:
-            for s, keywords in self.style_keywords.items():
-                if any(keyword in notes for keyword in keywords):
-                    style = s
-                    break
-        
-        if not characteristic and notes:
-            for c, keywords in self.characteristic_keywords.items():
-                if any(keyword in notes for keyword in keywords):
-                    characteristic = c
-                    break
-        
-        # Return None if we couldn't determine style/characteristic
-        return style, characteristic
+            route_keys = pd.MultiIndex.from_frame(df[['route_name', 'location']])
+            predicted = predictions.reindex(route_keys)
+            note_flags = df['note_flags'].to_numpy().astype(int)
+            for column, flags in (('route_style', self.style_flags),
+                                  ('route_characteristic', self.characteristic_flags)):
+                from_notes = np.select([(note_flags & flag) != 0 for _, flag in flags],
+                                       [label for label, _ in flags], default='')
+                from_notes = pd.Series(from_notes, index=df.index, dtype=object)
+                from_notes = from_notes.where(from_notes != '', None)
+                stored = pd.Series(predicted[column].to_numpy(), index=df.index, dtype=object)
+                df[column] = df[column].fillna(stored.fillna(from_notes))
+        
+        return pyramids
 
     def build_pyramid(self, df, discipline, db_session):
         """Build a pyramid with optimized style/characteristic prediction."""
-        # Store the full dataset before filtering for sends, but filter by discipline
-        all_attempts_df = df[df['discipline'] == discipline].copy()
+        return self.build_pyramids(df, [discipline], db_session)[discipline]
+
+    def build_pyramids(self, df, disciplines=None, db_session=None) -> Dict[str, pd.DataFrame]:
+        """Build the pyramid of every configured discipline, or of those named, in one pass.
+        
+        One prediction query covers all of them.
+        """
+        pyramids = self._build_pyramid_rows(df, list(disciplines or PYRAMID_DISCIPLINES))
+        if db_session is not None:
+            pyramids = dict(zip(pyramids, self.predict_styles_characteristics(list(pyramids.values()), db_session)))
+        return {discipline: pyramid.drop(columns=['note_flags'], errors='ignore')
+                for discipline, pyramid in pyramids.items()}
+
+    def _build_pyramid_rows(self, df, disciplines) -> Dict[str, pd.DataFrame]:
+        """Select and annotate each discipline's pyramid rows, without predictions.
         
-        # Continue with send filtering for the pyramid
-        df = df.dropna(how='all')
-        df = df[df['send_bool'] == True]
-        df = df[df['discipline'] == discipline]
+        The frame is partitioned by discipline once; the candidate sends of every
+        discipline are then deduplicated, cut to their top four binned codes and
+        ordered together.
+        """
+        # Position of each tick's discipline among those requested, -1 for the rest
+        pyramid_index = pd.Categorical(df['discipline'], categories=disciplines).codes
+        in_pyramid = pyramid_index >= 0
+        candidate = in_pyramid & (df['send_bool'] == True).to_numpy()
         
-        if df.empty:
-            return df
+        # Attempts come from every tick of the discipline: one aggregation per route
+        attempts = (df[in_pyramid].assign(_pyramid=pyramid_index[in_pyramid])
+                    .groupby(['_pyramid', 'route_name', 'location'], observed=True)['pitches'].agg(['size', 'sum']))
         
-        # Initialize route_style and route_characteristic as None
-        df['route_style'] = None
-        df['route_characteristic'] = None
+        sends = df[candidate].assign(_pyramid=pyramid_index[candidate])
         
         # Remove duplicates based on route_name and location, keep oldest tick_date
-        df = df.sort_values('tick_date')
-        df = df.drop_duplicates(subset=['route_name', 'location'], keep='first')
-
-        # Get top 4 binned codes
-        top_binned_code = df['binned_code'].max()
-        top4_binned_codes = list(range(top_binned_code, top_binned_code - 4, -1))
-        df = df[df['binned_code'].isin(top4_binned_codes)]
-
-        # Add custom sorting grade
-        df['custom_sorting_grade'] = df['route_grade'].str.split(' ').str[0]
-        
-        # Apply custom grade sorting
-        if discipline in ['sport', 'trad']:
-            df['custom_sorting_grade'] = pd.Categorical(
-                df['custom_sorting_grade'], 
-                categories=self.custom_routes_grade_list, 
-                ordered=True
-            )
-        else:  # boulder
-            df['custom_sorting_grade'] = pd.Categorical(
-                df['custom_sorting_grade'], 
-                categories=self.custom_boulders_grade_list, 
-                ordered=True
-            )
-
-        # Sort by binned_code and grade
-        df = df.sort_values(['binned_code', 'custom_sorting_grade'], ascending=[False, False])
-
-        # New attempt calculation that uses the full dataset
-        def calculate_num_attempts(row):
-            route_entries = all_attempts_df[
-                (all_attempts_df['route_name'] == row['route_name']) & 
-                (all_attempts_df['location'] == row['location'])
-            ]
+        sends = sends.sort_values('tick_date', kind='stable')
+        sends = sends.drop_duplicates(subset=['_pyramid', 'route_name', 'location'], keep='first')
+        
+        # Top 4 binned codes of each discipline
+        top_binned_code = sends.groupby('_pyramid')['binned_code'].transform('max')
+        sends = sends[(top_binned_code - sends['binned_code']).isin(range(PYRAMID_GRADE_BAND))].copy()
+        
+        # Sort by binned_code and grade, through the precomputed grade ranks
+        custom_sorting_grade = sends['route_grade'].str.split(' ').str[0]
+        grade_rank = np.full(len(sends), -1)
+        for code, discipline in enumerate(disciplines):
+            mask = (sends['_pyramid'] == code).to_numpy()
+            if mask.any():
+                grade_rank[mask] = custom_sorting_grade[mask].map(self.grade_ranks[discipline]).fillna(-1).to_numpy()
+        sends['_grade_rank'] = grade_rank
+        sends = sends.sort_values(['_pyramid', 'binned_code', '_grade_rank'], ascending=[True, False, False],
+                                  kind='stable')
+        
+        route_keys = pd.MultiIndex.from_frame(sends[['_pyramid', 'route_name', 'location']])
+        # For multipitch: count entries since each entry represents a full attempt
+        entry_counts = attempts['size'].reindex(route_keys, fill_value=0).to_numpy()
+        # For single pitch: sum the pitches across all entries since each pitch represents an attempt
+        pitch_counts = attempts['sum'].reindex(route_keys, fill_value=0).to_numpy()
+        sends['num_attempts'] = np.where(sends['length_category'] == 'multipitch', entry_counts, pitch_counts)
+        
+        # Initialize route_style and route_characteristic as None
+        sends['route_style'] = None
+        sends['route_characteristic'] = None
+        
+        # Drop unnecessary columns
+        columns_to_drop = [
+            'cur_max_rp_sport', 'cur_max_rp_trad', 'cur_max_boulder',
+            'send_bool', 'difficulty_category', 'tick_fingerprint', '_grade_rank',
+            'id'  # Drop id after preserving it as tick_id
+        ]
+        
+        pyramids = {}
+        for code, discipline in enumerate(disciplines):
+            pyramid = sends[sends['_pyramid'] == code].drop(columns=['_pyramid'])
+            if pyramid.empty:
+                pyramids[discipline] = df.iloc[:0]
+                continue
             
-            if row['length_category'] == 'multipitch':
-                # For multipitch: count unique entries since each entry represents a full attempt
-                return len(route_entries)
+            # Handle tick_id assignment - preserve UserTicks id
+            if 'id' in pyramid.columns:
+                pyramid['tick_id'] = pyramid['id']  # Set tick_id from UserTicks id
             else:
-                # For single pitch: sum the pitches across all entries since each pitch represents an attempt
-                return route_entries['pitches'].sum()
-        
-        df['num_attempts'] = df.apply(calculate_num_attempts, axis=1)
-
-        # Handle tick_id assignment - preserve UserTicks id
-        if 'id' in df.columns:
-            df['tick_id'] = df['id']  # Set tick_id from UserTicks id
-        else:
-            # For any rows without a tick_id, generate new ones with a prefix
-            df['tick_id'] = None
-            null_mask = df['tick_id'].isnull()
-            if null_mask.any():
                 # Generate smaller tick_ids that fit in PostgreSQL integer range (-2147483648 to +2147483647)
                 # Use timestamp modulo 10000 to keep numbers very small
                 timestamp = int(time.time()) % 10000
-                df.loc[null_mask, 'tick_id'] = [
+                pyramid['tick_id'] = [
                     int(f"9{timestamp:04d}{i:03d}")  # Format: 9TTTTNNN where T=timestamp, N=counter
-                    for i in range(len(df[null_mask]))
+                    for i in range(len(pyramid))
                 ]
-
-        # Drop unnecessary columns
-        columns_to_drop = [
-            'cur_max_rp_sport', 'cur_max_rp_trad', 'cur_max_boulder',
-            'send_bool', 'difficulty_category', 'custom_sorting_grade',
-            'id'  # Drop id after preserving it as tick_id
-        ]
-        df = df.drop(columns=columns_to_drop, errors='ignore')
-
-        # Predict styles and characteristics
-        if db_session is not None:
-            predictions = df.apply(
-                lambda row: self.predict_style_characteristic(row, db_session), 
-                axis=1
-            )
-            df['route_style'] = df['route_style'].fillna(
-                pd.Series([p[0] for p in predictions], index=df.index)
-            )
-            df['route_characteristic'] = df['route_characteristic'].fillna(
-                pd.Series([p[1] for p in predictions], index=df.index)
-            )
-
-        return df
+            pyramids[discipline] = pyramid.drop(columns=columns_to_drop, errors='ignore')
+        
+        return pyramids
 
     def build_all_pyramids(self, df, db_session=None):
-        """Build pyramids for all disciplines."""
-        sport_pyramid = self.build_pyramid(df, 'sport', db_session)
-        trad_pyramid = self.build_pyramid(df, 'trad', db_session)
-        boulder_pyramid = self.build_pyramid(df, 'boulder', db_session)
-        
-        return sport_pyramid, trad_pyramid, boulder_pyramid
\ No newline at end of file
+        """Build the sport, trad and boulder pyramids stored per user."""
+        pyramids = self.build_pyramids(df, STORED_PYRAMIDS, db_session)
+        sport_pyramid, trad_pyramid, boulder_pyramid = [pyramids[discipline] for discipline in STORED_PYRAMIDS]
+        return sport_pyramid, trad_pyramid, boulder_pyramid
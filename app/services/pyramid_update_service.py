@@ -2,11 +2,11 @@ from typing import Dict, Any, List
 from app.models import db, SportPyramid, TradPyramid, BoulderPyramid, UserTicks
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
-from app.services.grade_processor import GradeProcessor
+from app.services.grade_processor import GradeProcessor, GRADE_TO_CODE
 
 import time
-import pandas as pd
 from app.services.climb_classifier import ClimbClassifier
+from app.services.route_attributes_service import RouteAttributesService
 
 class PyramidUpdateService:
     def __init__(self):
@@ -56,7 +56,7 @@ class PyramidUpdateService:
 
                     # Check if the route's grade is within the valid range
                     if 'route_grade' in updates:
-                        binned_code = self.grade_processor.convert_grades_to_codes([updates['route_grade']])[0]
+                        binned_code = self.grade_processor.get_code_from_grade(updates['route_grade'])
                         if binned_code < min_valid_code or binned_code > max_valid_code:
                             continue
                         
@@ -81,6 +81,8 @@ class PyramidUpdateService:
                             ).first()
                             
                             if pyramid_entry:
+                                old_votes = RouteAttributesService.entry_votes([pyramid_entry])
+                                
                                 # Debug logging for num_attempts updates
                                 if 'num_attempts' in updates:
                                     print(f"Updating num_attempts for {route_id}: {updates['num_attempts']} (type: {type(updates['num_attempts'])})")
@@ -93,17 +95,21 @@ class PyramidUpdateService:
                                         setattr(pyramid_entry, field, value)
                                         print(f"Updated {field} to {value} for route {route_id}")
                                 
+                                # Move the route's crowd-sourced votes along with the edit
+                                new_votes = RouteAttributesService.entry_votes([pyramid_entry])
+                                if not new_votes.equals(old_votes):
+                                    RouteAttributesService.apply_votes(added=new_votes, removed=old_votes)
+                                
                                 # Update binned grade and code if grade is changed
                                 if 'route_grade' in updates:
-                                    grade_processor = GradeProcessor()
                                     grade = updates['route_grade']
-                                    new_binned_code = grade_processor.convert_grades_to_codes([grade])[0]
+                                    new_binned_code = self.grade_processor.get_code_from_grade(grade)
                                     
                                     # Check for suspicious grade changes (more than 3 grades different)
                                     if abs(new_binned_code - pyramid_entry.binned_code) > 3:
                                         continue
                                         
-                                    binned_grade = grade_processor.get_grade_from_code(new_binned_code)
+                                    binned_grade = self.grade_processor.get_grade_from_code(new_binned_code)
                                     pyramid_entry.binned_grade = binned_grade
                                     pyramid_entry.binned_code = new_binned_code
                                 
@@ -132,10 +138,12 @@ class PyramidUpdateService:
             return
             
         model = PyramidUpdateService._get_model(discipline)
-        model.query.filter(
+        removed = model.query.filter(
             model.username == username,
             model.tick_id.in_(tick_ids)
-        ).delete(synchronize_session=False)
+        )
+        RouteAttributesService.apply_votes(removed=RouteAttributesService.entry_votes(removed.all()))
+        removed.delete(synchronize_session=False)
 
     @staticmethod
     def _update_routes(discipline, username, updates):
@@ -149,9 +157,13 @@ class PyramidUpdateService:
                     ).first()
                     
                     if route:
+                        old_votes = RouteAttributesService.entry_votes([route])
                         for field, value in data.items():
                             if hasattr(route, field):
                                 setattr(route, field, value)
+                        RouteAttributesService.apply_votes(
+                            added=RouteAttributesService.entry_votes([route]), removed=old_votes
+                        )
                 except (ValueError, TypeError):
                     continue
 
@@ -173,6 +185,7 @@ class PyramidUpdateService:
                             tick_id=None  # New routes don't have a tick_id
                         )
                         db.session.add(new_route)
+                        RouteAttributesService.apply_votes(added=RouteAttributesService.entry_votes([new_route]))
                     except (ValueError, TypeError):
                         continue
 
@@ -189,19 +202,14 @@ class PyramidUpdateService:
 
     def _validate_and_bin_grade(self, grade: str, discipline: str) -> tuple[str, int]:
         """Validate grade and return binned grade and code"""
-        # Get valid grades for discipline
-        valid_grades = set()
-        for grades in self.grade_processor.binned_code_dict.values():
-            valid_grades.update(grades)
-
         # Clean grade input
         grade = grade.split(' ')[0] if grade else ''
         
-        if grade not in valid_grades:
+        if grade not in GRADE_TO_CODE:
             raise ValueError(f"Invalid grade: {grade}")
             
         # Get binned code
-        binned_code = self.grade_processor.convert_grades_to_codes([grade])[0]
+        binned_code = GRADE_TO_CODE[grade]
         
         return grade, binned_code
 
@@ -236,10 +244,7 @@ class PyramidUpdateService:
             binned_code = self.grade_processor.get_code_from_grade(route_grade)
 
             # Get season category
-            date_df = pd.DataFrame({
-                'tick_date': [route_data['tick_date']]
-            })
-            season_category = self.classifier.classify_season(date_df).iloc[0]
+            season_category = self.classifier.season_for_date(route_data['tick_date'])
 
             # Create new pyramid entry with user-provided data
             new_entry = model_class(
@@ -265,5 +270,6 @@ class PyramidUpdateService:
             )
 
             db.session.add(new_entry)
+            RouteAttributesService.apply_votes(added=RouteAttributesService.entry_votes([new_entry]))
         except Exception as e:
             raise e
\ No newline at end of file
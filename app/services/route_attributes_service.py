@@ -0,0 +1,114 @@
+import pandas as pd
+from typing import List, Optional, Tuple
+from sqlalchemy import select, tuple_, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, RouteAttributes, SportPyramid, TradPyramid, BoulderPyramid
+
+# Vote column counting each route style and characteristic
+STYLE_VOTE_COLUMNS = {
+    'Slab': 'slab_votes',
+    'Vertical': 'vertical_votes',
+    'Overhang': 'overhang_votes',
+    'Roof': 'roof_votes'
+}
+CHARACTERISTIC_VOTE_COLUMNS = {
+    'Power': 'power_votes',
+    'Power Endurance': 'power_endurance_votes',
+    'Endurance': 'endurance_votes'
+}
+VOTE_COLUMNS = list(STYLE_VOTE_COLUMNS.values()) + list(CHARACTERISTIC_VOTE_COLUMNS.values())
+
+PYRAMID_MODELS = [SportPyramid, TradPyramid, BoulderPyramid]
+
+# Routes per upsert statement, well under the bound parameter limits
+UPSERT_BATCH_SIZE = 1000
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+class RouteAttributesService:
+    """Keeps the route_attributes vote counts in step with the pyramid tables"""
+
+    @staticmethod
+    def vote_deltas(rows: pd.DataFrame, sign: int = 1) -> pd.DataFrame:
+        """Vote count changes per (route_name, location) for pyramid rows added (+1) or removed (-1)"""
+        if rows.empty:
+            return pd.DataFrame(columns=['route_name', 'location', *VOTE_COLUMNS])
+        rows = rows.dropna(subset=['route_name', 'location'])
+        votes = pd.DataFrame({'route_name': rows['route_name'], 'location': rows['location']})
+        for column, vote_columns in (('route_style', STYLE_VOTE_COLUMNS),
+                                     ('route_characteristic', CHARACTERISTIC_VOTE_COLUMNS)):
+            values = rows[column] if column in rows.columns else pd.Series(None, index=rows.index, dtype=object)
+            for label, vote_column in vote_columns.items():
+                votes[vote_column] = (values == label).astype(int) * sign
+        return votes.groupby(['route_name', 'location'], as_index=False)[VOTE_COLUMNS].sum()
+
+    @staticmethod
+    def apply_votes(added: Optional[pd.DataFrame] = None, removed: Optional[pd.DataFrame] = None) -> None:
+        """Upsert the vote changes for added and removed pyramid rows.
+
+        Runs in the caller's transaction; committing is left to the caller.
+        """
+        frames = [RouteAttributesService.vote_deltas(rows, sign)
+                  for rows, sign in ((added, 1), (removed, -1)) if rows is not None]
+        if not frames:
+            return
+        deltas = pd.concat(frames, ignore_index=True)
+        deltas = deltas.groupby(['route_name', 'location'], as_index=False)[VOTE_COLUMNS].sum()
+        deltas = deltas[(deltas[VOTE_COLUMNS] != 0).any(axis=1)]
+        if deltas.empty:
+            return
+
+        table = RouteAttributes.__table__
+        insert = UPSERT_INSERTS[db.session.get_bind().dialect.name]
+        records = deltas.astype({column: int for column in VOTE_COLUMNS}).to_dict('records')
+        for start in range(0, len(records), UPSERT_BATCH_SIZE):
+            statement = insert(table).values(records[start:start + UPSERT_BATCH_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=['route_name', 'location'],
+                set_={column: table.c[column] + statement.excluded[column] for column in VOTE_COLUMNS}
+            )
+            db.session.execute(statement)
+
+    @staticmethod
+    def entry_votes(entries: List) -> pd.DataFrame:
+        """Vote-relevant fields of pyramid model instances (or (route_name, location, style, characteristic) tuples)"""
+        rows = [
+            entry if isinstance(entry, tuple) else
+            (entry.route_name, entry.location, entry.route_style, entry.route_characteristic)
+            for entry in entries
+        ]
+        return pd.DataFrame(rows, columns=['route_name', 'location', 'route_style', 'route_characteristic'])
+
+    @staticmethod
+    def get_user_votes(username: str) -> pd.DataFrame:
+        """Every pyramid row of a user that carries a style or characteristic"""
+        rows = db.session.execute(union_all(*[
+            select(model.route_name, model.location, model.route_style, model.route_characteristic)
+            .where(
+                model.username == username,
+                (model.route_style.isnot(None)) | (model.route_characteristic.isnot(None))
+            )
+            for model in PYRAMID_MODELS
+        ])).all()
+        return pd.DataFrame(rows, columns=['route_name', 'location', 'route_style', 'route_characteristic'])
+
+    @staticmethod
+    def remove_user_votes(username: str) -> None:
+        """Withdraw a user's votes before their pyramids are deleted"""
+        RouteAttributesService.apply_votes(removed=RouteAttributesService.get_user_votes(username))
+
+    @staticmethod
+    def get_route_attributes(route_keys: List[Tuple[str, str]], db_session) -> pd.DataFrame:
+        """Vote counts for the given (route_name, location) pairs, through the unique index"""
+        columns = ['route_name', 'location', *VOTE_COLUMNS]
+        if not route_keys:
+            return pd.DataFrame(columns=columns)
+        rows = db_session.execute(
+            select(*[RouteAttributes.__table__.c[column] for column in columns])
+            .where(tuple_(RouteAttributes.route_name, RouteAttributes.location).in_(route_keys))
+        ).all()
+        return pd.DataFrame(rows, columns=columns)
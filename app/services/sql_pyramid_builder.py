@@ -0,0 +1,167 @@
+from typing import Dict, Tuple
+from sqlalchemy import select, insert, case, and_, or_, func, null
+from sqlalchemy.sql import Select
+from app.models import db, UserTicks, RouteAttributes, SportPyramid, TradPyramid, BoulderPyramid
+from .pyramid_builder import PYRAMID_GRADE_BAND, STORED_PYRAMIDS
+from .climb_classifier import NOTE_KEYWORDS, NOTE_STYLES, NOTE_CHARACTERISTICS
+from .route_attributes_service import (
+    RouteAttributesService, STYLE_VOTE_COLUMNS, CHARACTERISTIC_VOTE_COLUMNS, UPSERT_INSERTS
+)
+
+# Pyramid table of each stored discipline
+PYRAMID_TABLES = {
+    'sport': SportPyramid.__table__,
+    'trad': TradPyramid.__table__,
+    'boulder': BoulderPyramid.__table__
+}
+
+# Tick columns a pyramid row copies from the send it stands for
+TICK_COLUMNS = [
+    'route_name', 'tick_date', 'route_grade', 'binned_grade', 'binned_code', 'length', 'pitches',
+    'location', 'lead_style', 'discipline', 'length_category', 'season_category', 'route_url', 'username'
+]
+
+# Pyramid columns written by INSERT ... SELECT, in the order pyramid_select returns them
+PYRAMID_COLUMNS = ['tick_id', *TICK_COLUMNS, 'num_attempts', 'route_style', 'route_characteristic']
+
+class SqlPyramidBuilder:
+    """Builds pyramids inside the database, so no tick data crosses the wire.
+
+    Follows PyramidBuilder with db-backed predictions: each route's oldest
+    send (ties to the lowest tick id) within the top four binned codes, its
+    attempts over every tick of the discipline, and style and characteristic
+    from the route_attributes votes, then from note keywords. Rows within a
+    binned code are inserted in tick date order rather than grade order.
+    """
+
+    @staticmethod
+    def pyramid_select(username: str, discipline: str, dialect_name: str, predict: bool = True) -> Select:
+        """SELECT of a user's pyramid rows for one discipline, with the PYRAMID_COLUMNS labels.
+
+        Sends are deduplicated with DISTINCT ON in PostgreSQL and with a
+        ROW_NUMBER window elsewhere (SQLite in development).
+        """
+        ticks = UserTicks.__table__
+        in_discipline = [ticks.c.username == username, ticks.c.discipline == discipline]
+
+        candidates = [*in_discipline, ticks.c.send_bool.is_(True)]
+
+        # Oldest candidate send of each route
+        columns = [ticks.c.id, ticks.c.notes, *[ticks.c[column] for column in TICK_COLUMNS]]
+        route = (ticks.c.route_name, ticks.c.location)
+        if dialect_name == 'postgresql':
+            first_sends = (select(*columns).where(*candidates).distinct(*route)
+                           .order_by(*route, ticks.c.tick_date, ticks.c.id).cte('first_sends'))
+        else:
+            ranked = select(*columns, func.row_number().over(
+                partition_by=route, order_by=(ticks.c.tick_date, ticks.c.id)
+            ).label('send_order')).where(*candidates).cte('ranked_sends')
+            first_sends = (select(*[ranked.c[column.name] for column in columns])
+                           .where(ranked.c.send_order == 1).cte('first_sends'))
+
+        # Top binned code over every route's send, for the band cut
+        banded = select(first_sends, func.max(first_sends.c.binned_code).over().label('top_code')).cte('banded')
+
+        # Entries and pitches per route across all of the discipline's ticks
+        attempts = select(
+            ticks.c.route_name, ticks.c.location,
+            func.count().label('entries'),
+            func.coalesce(func.sum(ticks.c.pitches), 0).label('pitch_count')
+        ).where(*in_discipline).group_by(*route).cte('attempts')
+
+        sends = banded.c
+        source = banded.outerjoin(attempts, and_(attempts.c.route_name == sends.route_name,
+                                                 attempts.c.location == sends.location))
+        # Multipitch routes count entries, single pitches count pitches
+        num_attempts = func.coalesce(case(
+            (sends.length_category == 'multipitch', attempts.c.entries), else_=attempts.c.pitch_count
+        ), 0)
+
+        route_style = route_characteristic = null()
+        if predict:
+            votes = RouteAttributes.__table__
+            source = source.outerjoin(votes, and_(votes.c.route_name == sends.route_name,
+                                                  votes.c.location == sends.location))
+            route_style = func.coalesce(SqlPyramidBuilder._most_voted(votes, STYLE_VOTE_COLUMNS),
+                                        SqlPyramidBuilder._from_notes(sends.notes, NOTE_STYLES))
+            route_characteristic = func.coalesce(SqlPyramidBuilder._most_voted(votes, CHARACTERISTIC_VOTE_COLUMNS),
+                                                 SqlPyramidBuilder._from_notes(sends.notes, NOTE_CHARACTERISTICS))
+
+        return select(
+            sends.id.label('tick_id'),
+            *[sends[column] for column in TICK_COLUMNS],
+            num_attempts.label('num_attempts'),
+            route_style.label('route_style'),
+            route_characteristic.label('route_characteristic')
+        ).select_from(source).where(
+            sends.binned_code >= sends.top_code - (PYRAMID_GRADE_BAND - 1)
+        ).order_by(sends.binned_code.desc(), sends.tick_date, sends.id)
+
+    @staticmethod
+    def rebuild_pyramids(username: str) -> None:
+        """Replace a user's stored pyramids with INSERT ... SELECT.
+
+        As in DatabaseService.rebuild_pyramids, every pyramid is predicted with
+        the votes in place, the user's own included; only then are the old
+        rows' votes withdrawn and the new rows' counted. Runs in the caller's
+        transaction; committing is left to the caller.
+        """
+        dialect_name = db.session.get_bind().dialect.name
+        old_votes = RouteAttributesService.get_user_votes(username)
+
+        for discipline in STORED_PYRAMIDS:
+            table = PYRAMID_TABLES[discipline]
+            db.session.execute(table.delete().where(table.c.username == username))
+            db.session.execute(insert(table).from_select(
+                PYRAMID_COLUMNS, SqlPyramidBuilder.pyramid_select(username, discipline, dialect_name)
+            ))
+
+        RouteAttributesService.apply_votes(removed=old_votes)
+        for discipline in STORED_PYRAMIDS:
+            SqlPyramidBuilder._add_votes(PYRAMID_TABLES[discipline], username, dialect_name)
+
+    @staticmethod
+    def _add_votes(table, username: str, dialect_name: str) -> None:
+        """Upsert the style and characteristic votes of a user's pyramid rows into route_attributes"""
+        vote_counts = [
+            func.sum(case((table.c[column] == label, 1), else_=0)).label(vote_column)
+            for column, vote_columns in (('route_style', STYLE_VOTE_COLUMNS),
+                                         ('route_characteristic', CHARACTERISTIC_VOTE_COLUMNS))
+            for label, vote_column in vote_columns.items()
+        ]
+        votes = select(table.c.route_name, table.c.location, *vote_counts).where(
+            table.c.username == username,
+            table.c.route_name.isnot(None),
+            table.c.location.isnot(None),
+            or_(table.c.route_style.isnot(None), table.c.route_characteristic.isnot(None))
+        ).group_by(table.c.route_name, table.c.location)
+
+        attributes = RouteAttributes.__table__
+        vote_columns = [count.name for count in vote_counts]
+        statement = UPSERT_INSERTS[dialect_name](attributes).from_select(
+            ['route_name', 'location', *vote_columns], votes
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['route_name', 'location'],
+            set_={column: attributes.c[column] + statement.excluded[column] for column in vote_columns}
+        )
+        db.session.execute(statement)
+
+    @staticmethod
+    def _most_voted(votes, vote_columns: Dict[str, str]):
+        """The label with the most votes, ties going to the first; NULL without votes"""
+        counts = [votes.c[column] for column in vote_columns.values()]
+        return case(*[
+            (and_(count > 0, *[count > other for other in counts[:i]], *[count >= other for other in counts[i + 1:]]),
+             label)
+            for i, (label, count) in enumerate(zip(vote_columns, counts))
+        ], else_=null())
+
+    @staticmethod
+    def _from_notes(notes, labels: Tuple[Tuple[str, int], ...]):
+        """The first label whose note keywords appear in the notes, as note_flags_for detects them"""
+        lowered = func.lower(notes)
+        return case(*[
+            (or_(*[lowered.contains(keyword, autoescape=True) for keyword in NOTE_KEYWORDS[flag]]), label)
+            for label, flag in labels
+        ], else_=null())
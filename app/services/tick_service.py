@@ -0,0 +1,64 @@
+from typing import Any, Dict, Optional
+import pandas as pd
+from app.models import UserTicks
+from app.services.data_processor import DataProcessor, CSV_COLUMN_RENAMES, TICK_DATE_FORMAT
+from app.services.database_service import DatabaseService
+
+# Export fields a tick can be added or edited with; grade codes are always derived
+TICK_FIELDS = [column for column in CSV_COLUMN_RENAMES.values() if column != 'binned_code']
+
+class TickService:
+    """Adds and edits single ticks, keeping their derived columns and pyramids current"""
+
+    @staticmethod
+    def add_tick(username: str, fields: Dict[str, Any]) -> UserTicks:
+        """Classify and store one tick given by its export fields"""
+        processor = DataProcessor(None)
+        tick = processor.process_tick(TickService._tick_fields(fields), username)
+        return DatabaseService.save_user_tick(tick)
+
+    @staticmethod
+    def edit_tick(tick_id: int, fields: Dict[str, Any]) -> Optional[UserTicks]:
+        """Apply edited export fields to a stored tick and reclassify it.
+        
+        Style and route type are not stored, so without them in the edit the
+        stored discipline is kept and the send status is re-read from the lead
+        style (or kept, for boulders).
+        """
+        stored = UserTicks.query.get(tick_id)
+        if not stored:
+            return None
+        
+        raw = {
+            'tick_date': stored.tick_date.strftime(TICK_DATE_FORMAT),
+            'route_name': stored.route_name,
+            'route_grade': stored.route_grade,
+            'notes': stored.notes,
+            'route_url': stored.route_url,
+            'pitches': stored.pitches,
+            'location': stored.location_raw or stored.location,
+            'lead_style': stored.lead_style,
+            'length': stored.length
+        }
+        raw.update(TickService._tick_fields(fields))
+        
+        processor = DataProcessor(None)
+        tick = processor.process_tick(raw, stored.username)
+        if 'route_type' not in fields:
+            tick['discipline'] = stored.discipline
+            if stored.discipline == 'boulder' and 'style' not in fields:
+                tick['send_bool'] = stored.send_bool
+            else:
+                sends = processor.classifier.classify_sends(pd.DataFrame([{
+                    'discipline': stored.discipline,
+                    'style': raw.get('style'),
+                    'lead_style': raw.get('lead_style')
+                }]))
+                tick['send_bool'] = bool(sends.iloc[0])
+        
+        return DatabaseService.save_user_tick(tick, tick_id)
+
+    @staticmethod
+    def _tick_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+        """The export fields of a request, ignoring anything else"""
+        return {field: value for field, value in fields.items() if field in TICK_FIELDS}
@@ -0,0 +1,98 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Tuple
+import pandas as pd
+from app import app
+from app.services.data_processor import DataProcessor
+from app.services.database_service import DatabaseService
+from app.services.pyramid_builder import PyramidBuilder
+
+def process_file(path: str, csv_engine: str = 'c') -> Tuple[str, int, Dict[str, pd.DataFrame]]:
+    """Run the ingestion pipeline over one tick export, in a child process"""
+    username = os.path.splitext(os.path.basename(path))[0]
+    processor = DataProcessor(None, csv_engine=csv_engine)
+
+    with open(path, 'rb') as data:
+        raw_df = processor.parse_csv(data)
+    user_ticks = processor.process_raw_data(raw_df, username)
+
+    # No db session: pyramids are built without crowd-sourced predictions
+    sport_pyramid, trad_pyramid, boulder_pyramid = PyramidBuilder().build_all_pyramids(user_ticks, None)
+
+    return username, len(raw_df), {
+        'user_ticks': user_ticks,
+        'sport_pyramid': sport_pyramid,
+        'trad_pyramid': trad_pyramid,
+        'boulder_pyramid': boulder_pyramid
+    }
+
+def run_import(directory: str, pattern: str, workers: int, batch_size: int,
+               csv_engine: str = 'c', dry_run: bool = False) -> None:
+    """Process every export in a directory across a process pool and bulk load the results"""
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    if not paths:
+        print(f"No files matching {pattern} in {directory}")
+        return
+
+    print(f"Importing {len(paths)} files with {workers} workers")
+    start_time = time.time()
+    files_done = raw_rows = rows_written = buffered_rows = 0
+    pending = {}
+
+    with app.app_context(), ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_file, path, csv_engine): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                username, file_rows, tables = future.result()
+            except Exception as e:
+                print(f"Failed to process {path}: {str(e)}")
+                continue
+
+            files_done += 1
+            raw_rows += file_rows
+            if dry_run:
+                continue
+
+            # Re-importing a file replaces that user's data
+            pending[username] = tables
+            buffered_rows += sum(len(df) for df in tables.values())
+
+            if buffered_rows >= batch_size:
+                rows_written += DatabaseService.replace_users_data(pending, batch_size)
+                pending = {}
+                buffered_rows = 0
+
+            elapsed = time.time() - start_time
+            print(f"[{files_done}/{len(paths)}] {username}: {file_rows} ticks "
+                  f"({raw_rows / elapsed:.0f} rows/s)")
+
+        if pending:
+            rows_written += DatabaseService.replace_users_data(pending, batch_size)
+
+    elapsed = time.time() - start_time
+    print(f"Processed {files_done}/{len(paths)} files, {raw_rows} ticks in {elapsed:.2f}s "
+          f"({raw_rows / elapsed:.0f} rows/s)")
+    if not dry_run:
+        print(f"Wrote {rows_written} rows ({rows_written / elapsed:.0f} rows/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a directory of tick export CSVs")
+    parser.add_argument('directory', help="Directory containing tick export CSV files")
+    parser.add_argument('--pattern', default='*.csv',
+                        help="Glob for the export files; each file name becomes the username")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Number of worker processes")
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="Rows buffered and inserted per transaction")
+    parser.add_argument('--engine', choices=['c', 'pyarrow'], default='c',
+                        help="CSV parser engine (pyarrow must be installed separately)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Process the files without writing to the database (load testing)")
+    args = parser.parse_args()
+
+    run_import(args.directory, args.pattern, args.workers, args.batch_size,
+               csv_engine=args.engine, dry_run=args.dry_run)
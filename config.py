@@ -39,6 +39,27 @@ class Config:
     SESSION_TYPE = 'filesystem'
     PERMANENT_SESSION_LIFETIME = 1800  # 30 minutes instead of 1 hour
     
-    # Query monitoring
-    SQLALCHEMY_RECORD_QUERIES = True
+    # Tick export ingestion - rows parsed per chunk when streaming exports
+    TICK_EXPORT_CHUNK_SIZE = int(os.environ.get('TICK_EXPORT_CHUNK_SIZE', 500))
+    
+    # Background ingestion worker (see worker.py)
+    INGESTION_JOB_POLL_INTERVAL = float(os.environ.get('INGESTION_JOB_POLL_INTERVAL', 2))
+    INGESTION_JOB_MAX_ATTEMPTS = int(os.environ.get('INGESTION_JOB_MAX_ATTEMPTS', 3))
+    INGESTION_JOB_STALE_AFTER = int(os.environ.get('INGESTION_JOB_STALE_AFTER', 600))  # Seconds before a running job is presumed dead
+    INCREMENTAL_INGESTION = os.environ.get('INCREMENTAL_INGESTION', 'true').lower() == 'true'  # Only process changed export rows on refresh
+    PYRAMID_ENGINE = os.environ.get('PYRAMID_ENGINE', 'pandas')  # Rebuild stored pyramids in pandas or inside the database ('sql')
+    
+    # Local cache of downloaded tick exports (gzip blobs, least recently used evicted first)
+    EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', 'export_cache')
+    EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_MB', 512)) * 1024 * 1024
+
+    # On-disk store of ingestion pipeline stage outputs reused by reprocess.py (least recently used evicted first)
+    PIPELINE_STORE_DIR = os.environ.get('PIPELINE_STORE_DIR', 'pipeline_store')
+    PIPELINE_STORE_MAX_BYTES = int(os.environ.get('PIPELINE_STORE_MAX_MB', 1024)) * 1024 * 1024
+    # In-memory stage outputs kept by each reprocess.py worker (web and worker processes keep none)
+    PIPELINE_MEMO_MAX_BYTES = int(os.environ.get('PIPELINE_MEMO_MAX_MB', 256)) * 1024 * 1024
+    
+    # Query monitoring - recorded queries keep every statement's parameters until
+    # the app context ends (a whole worker job's inserts), so they are opt-in
+    SQLALCHEMY_RECORD_QUERIES = os.environ.get('SQLALCHEMY_RECORD_QUERIES', 'false').lower() == 'true'
     DATABASE_QUERY_TIMEOUT = 20  # Reduced from 110 seconds 
\ No newline at end of file
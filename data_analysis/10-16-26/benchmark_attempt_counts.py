@@ -0,0 +1,63 @@
+import time
+import numpy as np
+import pandas as pd
+from app.services.data_processor import DataProcessor
+from app.services.pyramid_builder import PyramidBuilder
+
+# Compares the per-row attempt counting PyramidBuilder.build_pyramid used to do
+# with the grouped aggregation that replaced it, on a 2,000-tick user
+
+USER_TICKS = 2000
+
+def legacy_num_attempts(df: pd.DataFrame, all_attempts_df: pd.DataFrame) -> pd.Series:
+    """The original calculate_num_attempts: one filter of all_attempts_df per pyramid row"""
+    def calculate_num_attempts(row):
+        route_entries = all_attempts_df[
+            (all_attempts_df['route_name'] == row['route_name']) &
+            (all_attempts_df['location'] == row['location'])
+        ]
+        if row['length_category'] == 'multipitch':
+            return len(route_entries)
+        else:
+            return route_entries['pitches'].sum()
+
+    return df.apply(calculate_num_attempts, axis=1)
+
+def grouped_num_attempts(df: pd.DataFrame, all_attempts_df: pd.DataFrame) -> np.ndarray:
+    """The aggregation build_pyramid now uses"""
+    attempts = all_attempts_df.groupby(['route_name', 'location'], observed=True)['pitches'].agg(['size', 'sum'])
+    route_keys = pd.MultiIndex.from_frame(df[['route_name', 'location']])
+    entry_counts = attempts['size'].reindex(route_keys, fill_value=0).to_numpy()
+    pitch_counts = attempts['sum'].reindex(route_keys, fill_value=0).to_numpy()
+    return np.where(df['length_category'] == 'multipitch', entry_counts, pitch_counts)
+
+# A real export, repeated so routes collect several ticks each
+processor = DataProcessor(None)
+with open('data_analysis/1-8-25/ticks-3.csv', 'rb') as f:
+    raw = processor.parse_csv(f)
+raw = pd.concat([raw] * (USER_TICKS // len(raw) + 1), ignore_index=True).head(USER_TICKS)
+ticks = processor.process_raw_data(raw, 'benchmark')
+print(f"User with {len(ticks)} ticks")
+
+# Count attempts for every sent route, not only the top four grades, to show the scaling
+for discipline in ['sport', 'trad', 'boulder']:
+    all_attempts_df = ticks[ticks['discipline'] == discipline]
+    sends = all_attempts_df[all_attempts_df['send_bool']].drop_duplicates(subset=['route_name', 'location'])
+    if sends.empty:
+        continue
+
+    start = time.perf_counter()
+    expected = legacy_num_attempts(sends, all_attempts_df)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = grouped_num_attempts(sends, all_attempts_df)
+    grouped_time = time.perf_counter() - start
+
+    assert (expected.to_numpy() == actual).all()
+    print(f"{discipline}: {len(sends)} routes over {len(all_attempts_df)} ticks, "
+          f"per-row {legacy_time:.3f}s, grouped {grouped_time:.4f}s ({legacy_time / grouped_time:.0f}x)")
+
+start = time.perf_counter()
+PyramidBuilder().build_all_pyramids(ticks, None)
+print(f"build_all_pyramids: {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,63 @@
+import itertools
+import time
+import pandas as pd
+from app.services.data_processor import DataProcessor
+from app.services.climb_classifier import ClimbClassifier, _signature_cache
+
+# Checks the vectorized classify_discipline and the signature-cached
+# classify_by_signature against the row-wise rules they replaced
+
+classifier = ClimbClassifier()
+
+def compare(df: pd.DataFrame, label: str) -> None:
+    start = time.time()
+    expected = classifier._classify_discipline_rowwise(df)
+    rowwise_time = time.time() - start
+
+    start = time.time()
+    actual = classifier.classify_discipline(df)
+    vectorized_time = time.time() - start
+
+    mismatches = df[expected.astype(object).fillna('None') != actual.astype(object).fillna('None')]
+    print(f"{label}: {len(df)} rows, row-wise {rowwise_time:.3f}s, vectorized {vectorized_time:.3f}s, "
+          f"{len(mismatches)} mismatches")
+    if len(mismatches):
+        print(mismatches.assign(expected=expected, actual=actual).head(20).to_string())
+    assert len(mismatches) == 0
+
+    expected_sends = classifier.classify_sends(df.assign(discipline=expected))
+    for run in ('cold', 'warm'):
+        if run == 'cold':
+            _signature_cache.clear()
+        start = time.time()
+        disciplines, sends = classifier.classify_by_signature(df)
+        signature_time = time.time() - start
+        mismatches = df[(expected.astype(object).fillna('None') != disciplines.astype(object).fillna('None'))
+                        | (expected_sends != sends)]
+        print(f"{label}: signature cache {run} {signature_time:.3f}s, {len(mismatches)} mismatches")
+        assert len(mismatches) == 0
+
+# Every combination of the inputs the rules look at
+route_types = [None, '', 'Sport', 'Trad', 'Boulder', 'TR', 'Alpine', 'Ice', 'Sport, TR', 'Trad, TR',
+               'Trad, Sport', 'Sport, Trad', 'Trad, Alpine', 'Alpine, Trad', 'Trad, Sport, TR',
+               'Sport, Boulder', 'Boulder, Alpine', ' Sport ', 'Sport,', 'TR, Alpine', 'Ice, Alpine']
+styles = [None, '', 'Lead', 'Follow', 'TR', 'Send', 'Attempt', 'Flash', 'Solo', 'gear', 'Bolts']
+lead_styles = [None, '', 'Redpoint', 'Onsight', 'Flash', 'Pinkpoint', 'Fell/Hung', 'Top Rope']
+notes = [None, '', 'placed gear', 'Gear', 'all bolts', 'Quickdraws', 'swung leads', 'TR after']
+binned_codes = [0, 12, 105, 204]
+
+grid = pd.DataFrame(
+    list(itertools.product(route_types, styles, lead_styles, notes, binned_codes)),
+    columns=['route_type', 'style', 'lead_style', 'notes', 'binned_code']
+)
+compare(grid, "Rule grid")
+
+# A real export, parsed the way ingestion parses it
+processor = DataProcessor(None)
+with open('data_analysis/1-8-25/ticks-3.csv', 'rb') as f:
+    ticks = processor.parse_csv(f)
+ticks['binned_code'] = processor.grade_processor.convert_grades_to_codes(ticks['route_grade'])
+compare(ticks, "ticks-3.csv")
+compare(pd.concat([ticks] * 50, ignore_index=True), "ticks-3.csv x50")
+
+print("\nVectorized and signature classification match the row-wise rules")
@@ -0,0 +1,254 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app import app
+import app.services.data_processor as data_processor
+from app.services.data_processor import DataProcessor
+from app.services.profile_fetcher import ProfileFetcher, HostRateLimiter, get_shared_fetcher
+
+# Checks ProfileFetcher, HostRateLimiter and DataProcessor.fetch_export /
+# process_profiles against a local HTTP stand-in for Mountain Project: retries
+# and backoff, per-host limits, pooled connections, per-URL errors, that a
+# download cut off mid-stream closes its spool file, and that a failed export
+# cache write is logged without failing the download.
+#
+#   python data_analysis/10-16-26/test_profile_fetcher.py
+
+SAMPLE_EXPORT = 'data_analysis/1-8-25/ticks-3.csv'
+
+class StandInServer(ThreadingHTTPServer):
+    """Serves scripted responses per path and records what it was asked"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.lock = threading.Lock()
+        # path -> list of (status, headers, body), served in turn; the last one repeats
+        self.scripts = {}
+        self.requests = {}
+        self.connections = set()
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def script(self, path: str, *responses) -> None:
+        self.scripts[path] = list(responses)
+
+    def next_response(self, path: str):
+        with self.lock:
+            count = self.requests.get(path, 0)
+            self.requests[path] = count + 1
+            responses = self.scripts.get(path, [(404, {}, b'not found')])
+            return responses[min(count, len(responses) - 1)]
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            status, headers, body = server.next_response(self.path)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if 'Content-Length' not in headers:
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            if 'Content-Length' in headers:
+                # A scripted length longer than the body: drop the connection mid-stream
+                self.close_connection = True
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+@contextmanager
+def stand_in_server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def make_fetcher() -> ProfileFetcher:
+    return ProfileFetcher(max_workers=8, per_host_limit=4, per_host_interval=0,
+                          retries=3, backoff_factor=0.05, timeout=(2, 5))
+
+def read(fetcher: ProfileFetcher, url: str) -> bytes:
+    with fetcher.stream(url) as response:
+        response.raise_for_status()
+        return response.content
+
+def check_retries_rate_limited_requests(server, fetcher):
+    server.script('/export', (429, {'Retry-After': '0'}, b''), (429, {'Retry-After': '0'}, b''), (200, {}, b'ok'))
+
+    assert read(fetcher, f'{server.base_url}/export') == b'ok'
+    assert server.requests['/export'] == 3
+
+def check_backs_off_exponentially_on_server_errors(server, fetcher):
+    server.script('/export', (500, {}, b''), (502, {}, b''), (503, {}, b''), (200, {}, b'ok'))
+
+    start = time.monotonic()
+    assert read(fetcher, f'{server.base_url}/export') == b'ok'
+    elapsed = time.monotonic() - start
+
+    assert server.requests['/export'] == 4
+    # No wait before the first retry, then backoff_factor * 2 and * 4
+    assert elapsed >= 0.05 * (2 + 4)
+
+def check_gives_up_after_the_configured_retries(server, fetcher):
+    server.script('/user/1/down/tick-export', (503, {}, b''))
+    processor = DataProcessor(None, fetcher=fetcher)
+
+    try:
+        processor.fetch_export(f'{server.base_url}/user/1/down')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("fetch_export did not fail")
+    assert server.requests['/user/1/down/tick-export'] == 4
+
+def check_closes_the_spool_when_a_download_is_cut_off(server, fetcher):
+    # More body promised than sent, so the stream breaks partway through
+    server.script('/user/1/reset/tick-export', (200, {'Content-Length': str(1024 * 1024)}, b'Date,Route\n' * 100))
+    spools = []
+
+    class RecordedSpool(data_processor.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spools.append(self)
+
+    original = data_processor.SpooledTemporaryFile
+    data_processor.SpooledTemporaryFile = RecordedSpool
+    try:
+        DataProcessor(None, fetcher=fetcher).fetch_export(f'{server.base_url}/user/1/reset')
+    except Exception:
+        pass
+    else:
+        raise AssertionError("fetch_export did not fail")
+    finally:
+        data_processor.SpooledTemporaryFile = original
+
+    assert len(spools) == 1 and spools[0].closed
+
+def check_logs_export_cache_failures(server, fetcher):
+    server.script('/user/1/full/tick-export', (200, {}, b'Date,Route\n'))
+    warnings = []
+
+    class FullCache:
+        def put(self, *args):
+            raise OSError("No space left on device")
+
+    with app.app_context():
+        original = app.logger.warning
+        app.logger.warning = warnings.append
+        try:
+            export = DataProcessor(None, fetcher=fetcher, export_cache=FullCache()).fetch_export(
+                f'{server.base_url}/user/1/full'
+            )
+        finally:
+            app.logger.warning = original
+
+    with export['content'] as content:
+        assert content.read() == b'Date,Route\n'
+    assert len(warnings) == 1 and 'No space left on device' in warnings[0]
+
+def check_caps_concurrent_requests_per_host(server, fetcher):
+    server.delay = 0.1
+    for i in range(8):
+        server.script(f'/export/{i}', (200, {}, b'ok'))
+    capped = ProfileFetcher(max_workers=8, per_host_limit=2, per_host_interval=0)
+    urls = [f'{server.base_url}/export/{i}' for i in range(8)]
+
+    results = list(capped.fetch_many(urls, lambda url: read(capped, url)))
+    capped.close()
+
+    assert sorted(url for url, _, _ in results) == sorted(urls)
+    assert all(error is None for _, _, error in results)
+    assert server.max_in_flight == 2
+
+def check_spaces_request_starts_per_host():
+    limiter = HostRateLimiter(max_concurrent=8, min_interval=0.05)
+    starts = []
+    for _ in range(4):
+        limiter.acquire('example.com')
+        starts.append(time.monotonic())
+        limiter.release('example.com')
+
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    assert min(gaps) >= 0.045
+
+def check_reports_errors_per_url(server, fetcher):
+    with open(SAMPLE_EXPORT, 'rb') as f:
+        server.script('/user/1/good/tick-export', (200, {}, f.read()))
+    server.script('/user/2/gone/tick-export', (404, {}, b''))
+    server.script('/user/3/broken/tick-export', (500, {}, b''))
+    server.script('/user/4/garbled/tick-export', (200, {}, b'not,a\ntick,export\n'))
+    urls = [f'{server.base_url}/user/{path}' for path in ('1/good', '2/gone', '3/broken', '4/garbled')]
+
+    results = DataProcessor(None, fetcher=fetcher).process_profiles(urls)
+
+    assert set(results) == set(urls)
+    sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks, username = results[urls[0]]
+    assert username == 'good'
+    assert len(user_ticks) > 0 and len(sport_pyramid) > 0
+    for url in urls[1:]:
+        assert isinstance(results[url], Exception)
+    # The failed download was retried, the missing one was not
+    assert server.requests['/user/3/broken/tick-export'] == 4
+    assert server.requests['/user/2/gone/tick-export'] == 1
+
+def check_reuses_pooled_connections(server, fetcher):
+    server.script('/export', (200, {}, b'ok'))
+
+    for _ in range(5):
+        assert read(fetcher, f'{server.base_url}/export') == b'ok'
+
+    assert server.requests['/export'] == 5
+    assert len(server.connections) == 1
+
+def check_processors_share_one_fetcher():
+    assert DataProcessor(None).fetcher is DataProcessor(None).fetcher is get_shared_fetcher()
+
+if __name__ == "__main__":
+    server_checks = [
+        check_retries_rate_limited_requests,
+        check_backs_off_exponentially_on_server_errors,
+        check_gives_up_after_the_configured_retries,
+        check_closes_the_spool_when_a_download_is_cut_off,
+        check_logs_export_cache_failures,
+        check_caps_concurrent_requests_per_host,
+        check_reports_errors_per_url,
+        check_reuses_pooled_connections
+    ]
+    for check in server_checks:
+        with stand_in_server() as server:
+            fetcher = make_fetcher()
+            try:
+                check(server, fetcher)
+            finally:
+                fetcher.close()
+        print(f"{check.__name__}: ok")
+
+    for check in (check_spaces_request_starts_per_host, check_processors_share_one_fetcher):
+        check()
+        print(f"{check.__name__}: ok")
+
+    print("\nProfileFetcher behaves as expected against the stand-in server")
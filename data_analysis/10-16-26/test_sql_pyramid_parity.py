@@ -0,0 +1,151 @@
+import random
+import time
+import pandas as pd
+from app import app, db
+from app.models import UserTicks
+from app.services.data_processor import DataProcessor
+from app.services.database_service import DatabaseService
+from app.services.pyramid_builder import PyramidBuilder, PYRAMID_DISCIPLINES, STORED_PYRAMIDS
+from app.services.route_attributes_service import RouteAttributesService, STYLE_VOTE_COLUMNS, CHARACTERISTIC_VOTE_COLUMNS, VOTE_COLUMNS
+from app.services.sql_pyramid_builder import SqlPyramidBuilder, PYRAMID_TABLES
+
+# Checks SqlPyramidBuilder against the pandas PyramidBuilder on the configured
+# database: the SELECT of every configured discipline, then the stored pyramids
+# and route_attributes votes written by INSERT ... SELECT, first for a user with
+# no pyramids and then over stored pyramids whose styles the user edited by hand
+# (both engines must predict with those votes still counted). Everything runs
+# in one transaction that is rolled back at the end, so the scratch user and
+# the votes seeded for its routes never persist.
+
+USERNAME = 'sql-pyramid-parity'
+EXPORT = 'data_analysis/1-8-25/ticks-3.csv'
+COMPARED = ['tick_id', 'route_name', 'location', 'tick_date', 'binned_code', 'num_attempts',
+            'route_style', 'route_characteristic']
+
+random.seed(7)
+
+def rows(df: pd.DataFrame) -> list:
+    """Comparable, order-free rows of a pyramid"""
+    if df.empty:
+        return []
+    df = df.assign(tick_date=pd.to_datetime(df['tick_date']).dt.date,
+                   num_attempts=df['num_attempts'].astype(int))
+    df = df[COMPARED].astype(object).where(df[COMPARED].notna(), None)
+    return sorted(df.itertuples(index=False, name=None), key=repr)
+
+def route_votes(route_keys: list) -> pd.DataFrame:
+    return (RouteAttributesService.get_route_attributes(route_keys, db.session)
+            .set_index(['route_name', 'location'])[VOTE_COLUMNS].sort_index())
+
+def stored_pyramids() -> dict:
+    """The scratch user's stored pyramid rows of each discipline"""
+    return {
+        discipline: pd.DataFrame(db.session.execute(
+            PYRAMID_TABLES[discipline].select().where(PYRAMID_TABLES[discipline].c.username == USERNAME)
+        ).mappings().all())
+        for discipline in STORED_PYRAMIDS
+    }
+
+def edit_styles() -> int:
+    """Hand-set style and characteristic on some stored pyramid rows, moving their votes as edits do"""
+    edited = 0
+    for discipline in STORED_PYRAMIDS:
+        table = PYRAMID_TABLES[discipline]
+        pyramid = stored_pyramids()[discipline]
+        if pyramid.empty:
+            continue
+        picked = pyramid.sample(frac=0.5, random_state=random.randint(0, 1000))
+        new_rows = picked.assign(route_style=[random.choice(list(STYLE_VOTE_COLUMNS)) for _ in range(len(picked))],
+                                 route_characteristic=[random.choice(list(CHARACTERISTIC_VOTE_COLUMNS))
+                                                       for _ in range(len(picked))])
+        for row in new_rows.itertuples():
+            db.session.execute(table.update().where(table.c.id == row.id).values(
+                route_style=row.route_style, route_characteristic=row.route_characteristic
+            ))
+        RouteAttributesService.apply_votes(added=new_rows, removed=picked)
+        edited += len(picked)
+    return edited
+
+def report(label: str, expected: list, actual: list) -> int:
+    missing = sorted(set(expected) - set(actual), key=repr)
+    extra = sorted(set(actual) - set(expected), key=repr)
+    print(f"{label}: {len(expected)} pandas rows, {len(actual)} SQL rows, "
+          f"{len(missing) + len(extra)} mismatches")
+    for row in missing[:5]:
+        print(f"  pandas only: {row}")
+    for row in extra[:5]:
+        print(f"  SQL only:    {row}")
+    return len(missing) + len(extra)
+
+with app.app_context():
+    dialect_name = db.session.get_bind().dialect.name
+    try:
+        processor = DataProcessor(db.session)
+        with open(EXPORT, 'rb') as f:
+            _, _, _, user_ticks = processor.process_export(f, USERNAME)
+        DatabaseService._batch_save_dataframe(user_ticks, 'user_ticks', commit=False)
+        db.session.flush()
+
+        # Seed votes, ties included, for half of the user's routes so both prediction sources are exercised
+        ticks = pd.DataFrame([t.as_dict() for t in UserTicks.query.filter_by(username=USERNAME).all()])
+        route_keys = sorted(set(ticks[['route_name', 'location']].dropna().itertuples(index=False, name=None)))
+        votes = []
+        for route_name, location in random.sample(route_keys, len(route_keys) // 2):
+            for _ in range(random.randint(1, 4)):
+                votes.append({'route_name': route_name, 'location': location,
+                              'route_style': random.choice([None, *STYLE_VOTE_COLUMNS]),
+                              'route_characteristic': random.choice([None, *CHARACTERISTIC_VOTE_COLUMNS])})
+        RouteAttributesService.apply_votes(added=pd.DataFrame(votes))
+        print(f"{len(ticks)} ticks over {len(route_keys)} routes on {dialect_name}, {len(votes)} votes seeded")
+
+        mismatches = 0
+        start = time.perf_counter()
+        expected = PyramidBuilder().build_pyramids(ticks, db_session=db.session)
+        pandas_time = time.perf_counter() - start
+        sql_time = 0.0
+        for discipline in PYRAMID_DISCIPLINES:
+            start = time.perf_counter()
+            actual = pd.DataFrame(db.session.execute(
+                SqlPyramidBuilder.pyramid_select(USERNAME, discipline, dialect_name)
+            ).mappings().all())
+            sql_time += time.perf_counter() - start
+            mismatches += report(f"{discipline} select", rows(expected[discipline]), rows(actual))
+        print(f"pandas build_pyramids {pandas_time:.3f}s, SQL selects {sql_time:.3f}s")
+
+        # Stored pyramids and the votes they add, starting from no stored pyramids
+        votes_before = route_votes(route_keys)
+        start = time.perf_counter()
+        SqlPyramidBuilder.rebuild_pyramids(USERNAME)
+        print(f"SQL rebuild_pyramids {time.perf_counter() - start:.3f}s")
+        stored = stored_pyramids()
+        for discipline in STORED_PYRAMIDS:
+            mismatches += report(f"{discipline} table", rows(expected[discipline]), rows(stored[discipline]))
+
+        added = RouteAttributesService.vote_deltas(pd.concat([expected[d] for d in STORED_PYRAMIDS]))
+        expected_votes = votes_before.add(added.set_index(['route_name', 'location']), fill_value=0)
+        actual_votes, expected_votes = route_votes(route_keys).align(expected_votes, fill_value=0)
+        vote_mismatches = int((actual_votes != expected_votes.astype(int)).any(axis=1).sum())
+        print(f"route_attributes: {vote_mismatches} routes with wrong vote counts")
+        mismatches += vote_mismatches
+
+        # Rebuild over pyramids carrying hand-edited styles, with each engine from the same state
+        print(f"{edit_styles()} pyramid rows edited by hand")
+        checkpoint = db.session.begin_nested()
+        DatabaseService.rebuild_pyramids(USERNAME, 'pandas', commit=False)
+        expected = stored_pyramids()
+        expected_votes = route_votes(route_keys)
+        checkpoint.rollback()
+        SqlPyramidBuilder.rebuild_pyramids(USERNAME)
+        stored = stored_pyramids()
+        for discipline in STORED_PYRAMIDS:
+            mismatches += report(f"{discipline} rebuild over edits", rows(expected[discipline]),
+                                 rows(stored[discipline]))
+        actual_votes, expected_votes = route_votes(route_keys).align(expected_votes, fill_value=0)
+        vote_mismatches = int((actual_votes != expected_votes).any(axis=1).sum())
+        print(f"route_attributes after rebuild over edits: {vote_mismatches} routes with wrong vote counts")
+        mismatches += vote_mismatches
+    finally:
+        db.session.rollback()
+
+    assert mismatches == 0
+    print("SQL and pandas pyramids match")
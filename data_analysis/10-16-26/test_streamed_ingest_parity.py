@@ -0,0 +1,99 @@
+import io
+import sys
+import tracemalloc
+from collections import Counter
+import pandas as pd
+from app import app, db
+from app.models import UserTicks
+from app.services.data_processor import DataProcessor
+from app.services.database_service import DatabaseService
+from app.services.pyramid_builder import STORED_PYRAMIDS
+from app.services.sql_pyramid_builder import PYRAMID_TABLES
+
+# Checks the streamed full ingestion (DataProcessor.stream_tick_chunks into
+# DatabaseService.replace_user_ticks_streaming) against processing the whole
+# export and storing it with save_calculated_data: the stored ticks, their
+# running max grades and tiers included, and the stored pyramids must match.
+# Also reports each path's peak Python memory for an export made of several
+# copies of the sample. Runs against the configured database under a scratch
+# user removed at the end.
+#
+#   python data_analysis/10-16-26/test_streamed_ingest_parity.py [copies] [chunk_size]
+
+USERNAME = 'streamed-ingest-check'
+EXPORT = 'data_analysis/1-8-25/ticks-3.csv'
+TICK_COLUMNS = [c.name for c in UserTicks.__table__.columns if c.name not in ('id', 'created_at')]
+PYRAMID_COLUMNS = ['route_name', 'location', 'tick_date', 'binned_code', 'num_attempts',
+                   'route_style', 'route_characteristic']
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+def rows(table, columns: list) -> list:
+    """Comparable rows of the scratch user in a table"""
+    df = pd.DataFrame(db.session.execute(
+        table.select().where(table.c.username == USERNAME)
+    ).mappings().all())
+    df = df[columns].astype(object).where(df[columns].notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+def stored() -> dict:
+    snapshot = {'user_ticks': rows(UserTicks.__table__, TICK_COLUMNS)}
+    for discipline in STORED_PYRAMIDS:
+        snapshot[discipline] = rows(PYRAMID_TABLES[discipline], PYRAMID_COLUMNS)
+    return snapshot
+
+def peak_mb(run) -> float:
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+with open(EXPORT, 'rb') as f:
+    header, *lines = f.read().splitlines(keepends=True)
+export = header + b''.join(lines * copies)
+
+with app.app_context():
+    try:
+        processor = DataProcessor(db.session)
+
+        def whole():
+            sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks = processor.process_export(
+                io.BytesIO(export), USERNAME
+            )
+            DatabaseService.save_calculated_data({
+                'sport_pyramid': sport_pyramid, 'trad_pyramid': trad_pyramid,
+                'boulder_pyramid': boulder_pyramid, 'user_ticks': user_ticks
+            })
+
+        def streamed():
+            DatabaseService.replace_user_ticks_streaming(
+                USERNAME, processor.stream_tick_chunks(io.BytesIO(export), USERNAME, chunk_size)
+            )
+
+        whole_mb = peak_mb(whole)
+        expected = stored()
+        streamed_mb = peak_mb(streamed)
+        actual = stored()
+        print(f"{len(expected['user_ticks'])} ticks ({copies} copies of the sample), chunks of {chunk_size}")
+        print(f"peak memory: whole export {whole_mb:.1f} MB, streamed {streamed_mb:.1f} MB")
+
+        mismatches = 0
+        for table, expected_rows in expected.items():
+            # Rows repeat across the copies, so compare them with their counts
+            missing = Counter(expected_rows) - Counter(actual[table])
+            extra = Counter(actual[table]) - Counter(expected_rows)
+            table_mismatches = sum(missing.values()) + sum(extra.values())
+            print(f"{table}: {len(expected_rows)} whole, {len(actual[table])} streamed, {table_mismatches} mismatches")
+            for row in list(missing)[:3]:
+                print(f"  whole only:    {row}")
+            for row in list(extra)[:3]:
+                print(f"  streamed only: {row}")
+            mismatches += table_mismatches
+    finally:
+        db.session.rollback()
+        DatabaseService.clear_user_data(USERNAME)
+
+    assert mismatches == 0
+    print("\nStreamed ingestion stores the same ticks and pyramids")
@@ -0,0 +1,95 @@
+import random
+import sys
+import pandas as pd
+from app import app, db
+from app.models import UserTicks, SportPyramid, TradPyramid, BoulderPyramid
+from app.services.data_processor import DataProcessor
+from app.services.database_service import DatabaseService
+from app.services.pyramid_builder import PyramidBuilder
+from app.services.route_attributes_service import RouteAttributesService, VOTE_COLUMNS
+
+# Randomized check of tick deletes (DatabaseService.delete_user_tick, which
+# updates the pyramids in place, and the batch delete_user_ticks) against a
+# full rebuild from the remaining ticks. Deletes favour sends at the top
+# binned code, which shift the pyramid band. After every step each pyramid
+# must equal PyramidBuilder's over the stored ticks, and the route_attributes
+# votes must equal the votes present before the run plus those of the current
+# pyramids. Runs against the configured database under a scratch user removed
+# at the end.
+#
+#   python data_analysis/10-16-26/test_tick_deletes_vs_rebuild.py [seed] [steps]
+
+USERNAME = 'tick-delete-check'
+EXPORT = 'data_analysis/1-8-25/ticks-3.csv'
+PYRAMID_MODELS = {'sport': SportPyramid, 'trad': TradPyramid, 'boulder': BoulderPyramid}
+
+seed = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+random.seed(seed)
+
+def pyramid_mismatches() -> int:
+    """Pyramids whose stored rows differ from PyramidBuilder over the stored ticks"""
+    ticks = pd.DataFrame([t.as_dict() for t in UserTicks.query.filter_by(username=USERNAME).all()])
+    mismatches = 0
+    for discipline, model in PYRAMID_MODELS.items():
+        pyramid = PyramidBuilder().build_pyramid(ticks, discipline, None) if not ticks.empty else ticks
+        expected = sorted((r.route_name, r.location, str(r.tick_date), r.binned_code, int(r.num_attempts))
+                          for r in pyramid.itertuples())
+        actual = sorted((r.route_name, r.location, str(r.tick_date), r.binned_code, r.num_attempts)
+                        for r in model.query.filter_by(username=USERNAME).all())
+        mismatches += expected != actual
+    return mismatches
+
+def route_votes(route_keys: list) -> pd.DataFrame:
+    return (RouteAttributesService.get_route_attributes(route_keys, db.session)
+            .set_index(['route_name', 'location'])[VOTE_COLUMNS])
+
+def vote_mismatches(route_keys: list, votes_before: pd.DataFrame) -> int:
+    """Routes whose vote counts are not the prior votes plus those of the user's pyramids"""
+    added = RouteAttributesService.vote_deltas(RouteAttributesService.get_user_votes(USERNAME))
+    expected = votes_before.add(added.set_index(['route_name', 'location']), fill_value=0)
+    actual, expected = route_votes(route_keys).align(expected, fill_value=0)
+    return int((actual != expected.astype(int)).any(axis=1).sum())
+
+with app.app_context():
+    try:
+        processor = DataProcessor(db.session)
+        with open(EXPORT, 'rb') as f:
+            sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks = processor.process_export(f, USERNAME)
+        route_keys = sorted(set(user_ticks[['route_name', 'location']].dropna().itertuples(index=False, name=None)))
+        votes_before = route_votes(route_keys)
+        DatabaseService.save_calculated_data({
+            'user_ticks': user_ticks,
+            'sport_pyramid': sport_pyramid,
+            'trad_pyramid': trad_pyramid,
+            'boulder_pyramid': boulder_pyramid
+        })
+
+        total = deleted = 0
+        for step in range(steps):
+            discipline = random.choice(list(PYRAMID_MODELS))
+            ticks = UserTicks.query.filter_by(username=USERNAME, discipline=discipline).all()
+            if not ticks:
+                continue
+            if random.random() < 0.2:
+                victims = random.sample(ticks, min(len(ticks), random.randint(2, 6)))
+                action = f"batch delete of {len(victims)} {discipline} ticks"
+                deleted += DatabaseService.delete_user_ticks(USERNAME, [t.id for t in victims])
+            else:
+                stored = PYRAMID_MODELS[discipline].query.filter_by(username=USERNAME).all()
+                top_code = max((r.binned_code for r in stored), default=None)
+                top_sends = [t for t in ticks if t.send_bool and t.binned_code == top_code]
+                victim = random.choice(top_sends if top_sends and random.random() < 0.6 else ticks)
+                action = f"delete of {victim.route_name} ({discipline}, code {victim.binned_code})"
+                deleted += DatabaseService.delete_user_tick(victim.id)
+
+            counts = (pyramid_mismatches(), vote_mismatches(route_keys, votes_before))
+            total += sum(counts)
+            if sum(counts):
+                print(f"step {step} {action}: {counts[0]} wrong pyramids, {counts[1]} routes with wrong votes")
+    finally:
+        db.session.rollback()
+        DatabaseService.clear_user_data(USERNAME)
+
+    print(f"seed {seed}: {deleted} ticks deleted over {steps} steps, {total} mismatches")
+    assert total == 0
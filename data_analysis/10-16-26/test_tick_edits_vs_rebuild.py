@@ -0,0 +1,134 @@
+import random
+import sys
+from datetime import timedelta
+import pandas as pd
+from app import app, db
+from app.models import UserTicks, SportPyramid, TradPyramid, BoulderPyramid
+from app.services.data_processor import DataProcessor, MAX_GRADE_COLUMNS, TICK_DATE_FORMAT
+from app.services.database_service import DatabaseService
+from app.services.pyramid_builder import PyramidBuilder
+from app.services.route_attributes_service import RouteAttributesService, VOTE_COLUMNS
+from app.services.tick_service import TickService
+
+# Randomized check of single-tick adds and edits (TickService, which runs
+# DatabaseService.save_user_tick) against a full rebuild from the stored ticks.
+# After every step the running max grades and tiers must equal what
+# DataProcessor.calculate_max_grades gives over all of the user's ticks, each
+# pyramid must equal PyramidBuilder's, and the route_attributes votes must
+# equal the votes present before the run plus those of the current pyramids.
+# Runs against the configured database under a scratch user removed at the end.
+#
+#   python data_analysis/10-16-26/test_tick_edits_vs_rebuild.py [seed] [steps]
+
+USERNAME = 'tick-edit-check'
+EXPORT = 'data_analysis/1-8-25/ticks-3.csv'
+PYRAMID_MODELS = {'sport': SportPyramid, 'trad': TradPyramid, 'boulder': BoulderPyramid}
+GRADES = ['5.9', '5.10a', '5.11c', '5.12a', '5.12d', '5.13a', 'V3', 'V5', 'V8', 'WI4']
+ROUTE_TYPES = ['Sport', 'Trad', 'Boulder', 'TR', 'Ice', None]
+
+seed = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+random.seed(seed)
+
+def stored_ticks() -> pd.DataFrame:
+    return pd.DataFrame([t.as_dict() for t in UserTicks.query.filter_by(username=USERNAME).all()])
+
+def running_max_mismatches(ticks: pd.DataFrame) -> int:
+    """Ticks whose stored max grades or tier differ from a full recompute"""
+    processor = DataProcessor(None)
+    expected = processor.calculate_max_grades(ticks[['id', 'tick_date', 'discipline', 'send_bool', 'binned_code']].copy())
+    expected['difficulty_category'] = processor.calculate_difficulty_category(expected)
+    columns = [*MAX_GRADE_COLUMNS.values(), 'difficulty_category']
+    expected = expected.set_index('id')[columns].sort_index()
+    actual = ticks.set_index('id')[columns].sort_index()
+    expected = expected.astype({column: int for column in MAX_GRADE_COLUMNS.values()})
+    return int((expected.astype(str) != actual.astype(str)).any(axis=1).sum())
+
+def pyramid_mismatches(ticks: pd.DataFrame) -> int:
+    """Pyramids whose stored rows differ from PyramidBuilder over the stored ticks"""
+    mismatches = 0
+    for discipline, model in PYRAMID_MODELS.items():
+        pyramid = PyramidBuilder().build_pyramid(ticks, discipline, None)
+        expected = sorted((r.route_name, r.location, str(r.tick_date), r.binned_code, int(r.num_attempts))
+                          for r in pyramid.itertuples())
+        actual = sorted((r.route_name, r.location, str(r.tick_date), r.binned_code, r.num_attempts)
+                        for r in model.query.filter_by(username=USERNAME).all())
+        mismatches += expected != actual
+    return mismatches
+
+def route_votes(route_keys: list) -> pd.DataFrame:
+    return (RouteAttributesService.get_route_attributes(route_keys, db.session)
+            .set_index(['route_name', 'location'])[VOTE_COLUMNS])
+
+def vote_mismatches(route_keys: list, votes_before: pd.DataFrame) -> int:
+    """Routes whose vote counts are not the prior votes plus those of the user's pyramids"""
+    added = RouteAttributesService.vote_deltas(RouteAttributesService.get_user_votes(USERNAME))
+    expected = votes_before.add(added.set_index(['route_name', 'location']), fill_value=0)
+    actual, expected = route_votes(route_keys).align(expected, fill_value=0)
+    return int((actual != expected.astype(int)).any(axis=1).sum())
+
+def random_date(ticks: pd.DataFrame) -> str:
+    # Half the time reuse a stored tick's day, so same-day ordering is exercised
+    if random.random() < 0.5:
+        day = pd.Timestamp(random.choice(ticks['tick_date'].tolist()))
+    else:
+        day = pd.Timestamp('2015-01-01') + timedelta(days=random.randint(0, 3500))
+    return day.strftime(TICK_DATE_FORMAT)
+
+with app.app_context():
+    try:
+        processor = DataProcessor(db.session)
+        with open(EXPORT, 'rb') as f:
+            sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks = processor.process_export(f, USERNAME)
+        route_keys = sorted(set(user_ticks[['route_name', 'location']].dropna().itertuples(index=False, name=None)))
+        votes_before = route_votes(route_keys)
+        DatabaseService.save_calculated_data({
+            'user_ticks': user_ticks,
+            'sport_pyramid': sport_pyramid,
+            'trad_pyramid': trad_pyramid,
+            'boulder_pyramid': boulder_pyramid
+        })
+
+        total = 0
+        for step in range(steps):
+            ticks = stored_ticks()
+            if random.random() < 0.4:
+                fields = {
+                    'tick_date': random_date(ticks),
+                    'route_name': random.choice(['New A', 'New B', *ticks['route_name'].sample(3).tolist()]),
+                    'route_grade': random.choice(GRADES),
+                    'route_type': random.choice(ROUTE_TYPES),
+                    'style': random.choice(['Lead', 'Send', 'Attempt', 'TR']),
+                    'lead_style': random.choice(['Redpoint', 'Onsight', 'Fell/Hung', None]),
+                    'pitches': 1,
+                    'location': 'Colorado > Boulder > Flatirons'
+                }
+                action = 'add'
+                TickService.add_tick(USERNAME, fields)
+            else:
+                tick_id = int(random.choice(ticks['id'].tolist()))
+                fields = random.choice([
+                    {'route_grade': random.choice(GRADES)},
+                    {'lead_style': random.choice(['Redpoint', 'Fell/Hung'])},
+                    {'tick_date': random_date(ticks)},
+                    {'route_type': random.choice(ROUTE_TYPES), 'style': 'Lead'}
+                ])
+                action = f'edit {tick_id}'
+                TickService.edit_tick(tick_id, fields)
+
+            ticks = stored_ticks()
+            # Routes of added ticks join the vote comparison
+            route_keys = sorted(set(route_keys) | set(
+                ticks[['route_name', 'location']].dropna().itertuples(index=False, name=None)
+            ))
+            counts = (running_max_mismatches(ticks), pyramid_mismatches(ticks), vote_mismatches(route_keys, votes_before))
+            total += sum(counts)
+            if sum(counts):
+                print(f"step {step} {action} {fields}: {counts[0]} ticks with wrong max grades or tier, "
+                      f"{counts[1]} wrong pyramids, {counts[2]} routes with wrong votes")
+    finally:
+        db.session.rollback()
+        DatabaseService.clear_user_data(USERNAME)
+
+    print(f"seed {seed}: {steps} adds and edits, {total} mismatches")
+    assert total == 0
@@ -0,0 +1,3 @@
+-- Top grade and grade band lookups when a deleted tick's pyramid is updated in place
+CREATE INDEX IF NOT EXISTS idx_user_ticks_discipline_code
+ON user_ticks(username, discipline, binned_code);
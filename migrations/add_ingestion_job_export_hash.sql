@@ -0,0 +1,2 @@
+-- Content hash of the export a job's attempt downloaded, so a retry reuses that exact export
+ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS export_hash VARCHAR(64);
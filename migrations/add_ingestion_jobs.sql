@@ -0,0 +1,17 @@
+-- Durable queue for background profile ingestion
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(255) NOT NULL,
+    profile_url VARCHAR(255) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker_id VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Workers claim the oldest queued job, so index the claim order
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status_created ON ingestion_jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_username ON ingestion_jobs(username);
@@ -0,0 +1,13 @@
+-- Keep only the oldest active job of each user so the unique index can be built
+UPDATE ingestion_jobs
+SET status = 'failed', error = 'Duplicate of an earlier active job', finished_at = now()
+WHERE status IN ('queued', 'running')
+AND id NOT IN (
+    SELECT min(id) FROM ingestion_jobs
+    WHERE status IN ('queued', 'running')
+    GROUP BY username
+);
+
+-- At most one queued or running job per user, so concurrent enqueues cannot duplicate work
+CREATE UNIQUE INDEX IF NOT EXISTS uq_ingestion_jobs_active_username
+ON ingestion_jobs(username) WHERE status IN ('queued', 'running');
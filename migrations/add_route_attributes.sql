@@ -0,0 +1,41 @@
+-- Crowd-sourced style/characteristic vote counts per route, kept in step with the pyramid tables
+CREATE TABLE IF NOT EXISTS route_attributes (
+    id SERIAL PRIMARY KEY,
+    route_name VARCHAR(255) NOT NULL,
+    location VARCHAR(255) NOT NULL,
+    slab_votes INTEGER NOT NULL DEFAULT 0,
+    vertical_votes INTEGER NOT NULL DEFAULT 0,
+    overhang_votes INTEGER NOT NULL DEFAULT 0,
+    roof_votes INTEGER NOT NULL DEFAULT 0,
+    power_votes INTEGER NOT NULL DEFAULT 0,
+    power_endurance_votes INTEGER NOT NULL DEFAULT 0,
+    endurance_votes INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT uq_route_attributes_route UNIQUE (route_name, location)
+);
+
+-- Backfill from the votes already stored in the pyramids; the app keeps the counts
+-- current from here on, so run this before deploying the code that maintains them
+INSERT INTO route_attributes (
+    route_name, location, slab_votes, vertical_votes, overhang_votes, roof_votes,
+    power_votes, power_endurance_votes, endurance_votes
+)
+SELECT
+    route_name,
+    location,
+    COUNT(*) FILTER (WHERE route_style = 'Slab'),
+    COUNT(*) FILTER (WHERE route_style = 'Vertical'),
+    COUNT(*) FILTER (WHERE route_style = 'Overhang'),
+    COUNT(*) FILTER (WHERE route_style = 'Roof'),
+    COUNT(*) FILTER (WHERE route_characteristic = 'Power'),
+    COUNT(*) FILTER (WHERE route_characteristic = 'Power Endurance'),
+    COUNT(*) FILTER (WHERE route_characteristic = 'Endurance')
+FROM (
+    SELECT route_name, location, route_style, route_characteristic FROM sport_pyramid
+    UNION ALL
+    SELECT route_name, location, route_style, route_characteristic FROM trad_pyramid
+    UNION ALL
+    SELECT route_name, location, route_style, route_characteristic FROM boulder_pyramid
+) AS votes
+WHERE route_name IS NOT NULL AND location IS NOT NULL
+GROUP BY route_name, location
+ON CONFLICT (route_name, location) DO NOTHING;
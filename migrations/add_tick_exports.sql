@@ -0,0 +1,10 @@
+-- Per-user validators for the last downloaded tick export
+CREATE TABLE IF NOT EXISTS tick_exports (
+    username VARCHAR(255) PRIMARY KEY,
+    profile_url VARCHAR(255),
+    content_hash VARCHAR(64),
+    etag VARCHAR(255),
+    last_modified VARCHAR(255),
+    refresh_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    fetched_at TIMESTAMP
+);
@@ -0,0 +1,5 @@
+-- Stable per-tick fingerprint used to diff refreshed exports against stored ticks
+ALTER TABLE user_ticks ADD COLUMN tick_fingerprint BIGINT;
+
+-- Existing rows stay NULL; their next refresh runs a full rebuild that fills them in
+CREATE INDEX IF NOT EXISTS idx_user_ticks_fingerprint ON user_ticks(username, tick_fingerprint);
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+from app import app, db
+from app.models import TickExport, UserTicks
+from app.services.data_processor import DataProcessor
+from app.services.database_service import DatabaseService, retry_on_db_error
+from app.services.export_cache import ExportCache
+from app.services.pipeline import SHARED_MEMO, StageStore
+from app.services.sql_pyramid_builder import SqlPyramidBuilder
+
+def _init_child() -> None:
+    """Drop connections inherited from the parent and enable the in-memory stage memo"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+    SHARED_MEMO.resize(app.config['PIPELINE_MEMO_MAX_BYTES'])
+
+def reprocess_user(username: str, profile_url: Optional[str], content_hash: Optional[str],
+                   fetch_missing: bool, pyramid_engine: str = 'pandas') -> Dict[str, Any]:
+    """Re-run the pipeline for one user from their cached export, in a child process.
+    
+    An export missing from the cache is downloaded again from the user's
+    recorded profile URL, unless fetch_missing is unset.
+    
+    With the 'sql' pyramid engine only the ticks are processed here; the
+    parent builds the pyramids in the database once the ticks are written.
+    Stage outputs are kept in the pipeline store, so a later run only
+    repeats the stages whose inputs or rules changed.
+    """
+    start_time = time.time()
+    export_cache = ExportCache(app.config['EXPORT_CACHE_DIR'], app.config['EXPORT_CACHE_MAX_BYTES'])
+
+    with app.app_context():
+        processor = DataProcessor(db.session, export_cache=export_cache, stage_store=stage_store())
+
+        source = 'cache'
+        export = export_cache.get(username, content_hash) if content_hash else export_cache.get(username)
+        if export is None:
+            # The cache only holds exports downloaded on this machine; otherwise download it again
+            if not fetch_missing:
+                raise LookupError("no cached export")
+            if not profile_url:
+                # Users ingested before exports were recorded have ticks but no TickExport row
+                raise LookupError("no cached export and no recorded profile URL; "
+                                  "re-submit the user's profile once to record it")
+            source = 'fetched'
+            export = processor.fetch_export(profile_url)
+
+        try:
+            if pyramid_engine == 'sql':
+                _, _, _, user_ticks = processor.process_export(
+                    export['content'], username, content_hash=export['content_hash'], with_pyramids=False
+                )
+                tables = {'user_ticks': user_ticks}
+            else:
+                sport_pyramid, trad_pyramid, boulder_pyramid, user_ticks = processor.process_export(
+                    export['content'], username, content_hash=export['content_hash']
+                )
+                tables = {
+                    'user_ticks': user_ticks,
+                    'sport_pyramid': sport_pyramid,
+                    'trad_pyramid': trad_pyramid,
+                    'boulder_pyramid': boulder_pyramid
+                }
+        finally:
+            export['content'].close()
+            db.session.remove()
+
+    return {
+        'tables': tables,
+        'source': source,
+        'export': {key: export[key] for key in ('content_hash', 'etag', 'last_modified')},
+        'seconds': time.time() - start_time
+    }
+
+def stage_store() -> StageStore:
+    """The on-disk store of pipeline stage outputs"""
+    return StageStore(app.config['PIPELINE_STORE_DIR'], app.config['PIPELINE_STORE_MAX_BYTES'])
+
+def pipeline_stages() -> List[str]:
+    """Names of the ingestion pipeline's stages, in run order"""
+    return [stage.name for stage in DataProcessor(None).pipeline.stages]
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """Read the checkpoint written by an earlier run"""
+    if not os.path.exists(path):
+        return {'completed': [], 'failed': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Atomically write the checkpoint"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def list_users(usernames: Optional[List[str]] = None) -> Dict[str, TickExport]:
+    """Every user with stored ticks or a recorded export, mapped to their export record"""
+    exports = {e.username: e for e in TickExport.query.all()}
+    users = set(exports) | {row[0] for row in db.session.query(UserTicks.username).distinct()}
+    if usernames:
+        users &= set(usernames)
+    return {username: exports.get(username) for username in sorted(users)}
+
+def flush(pending: Dict[str, Dict[str, Any]], checkpoint: Dict[str, Any],
+          checkpoint_path: str, batch_size: int, pyramid_engine: str = 'pandas') -> int:
+    """Write buffered users in one transaction, then record them as completed.
+    
+    Users are only recorded as completed once the transaction commits; a
+    failed write leaves every buffered user's stored data as it was and
+    records them as failed, so --resume retries them. Connection errors retry
+    the whole transaction, never a part of it.
+    """
+    @retry_on_db_error()
+    def write() -> int:
+        written = DatabaseService.replace_users_data(
+            {username: result['tables'] for username, result in pending.items()}, batch_size, commit=False
+        )
+        if pyramid_engine == 'sql':
+            # Pyramids are built from the ticks just written, without leaving the database
+            for username in pending:
+                SqlPyramidBuilder.rebuild_pyramids(username)
+        for username, result in pending.items():
+            if result['source'] == 'fetched':
+                DatabaseService.save_tick_export(username, result['profile_url'], **result['export'],
+                                                 commit=False)
+        db.session.commit()
+        return written
+
+    try:
+        written = write()
+    except Exception as e:
+        db.session.rollback()
+        for username in pending:
+            checkpoint['failed'][username] = f"write failed: {str(e)}"
+        save_checkpoint(checkpoint_path, checkpoint)
+        print(f"Failed to write {len(pending)} users ({str(e)})")
+        return 0
+
+    for username in pending:
+        checkpoint['completed'].append(username)
+        checkpoint['failed'].pop(username, None)
+    save_checkpoint(checkpoint_path, checkpoint)
+    return written
+
+def run_reprocess(workers: int, batch_size: int, checkpoint_path: str, resume: bool = False,
+                  fetch_missing: bool = True, usernames: Optional[List[str]] = None,
+                  pyramid_engine: str = 'pandas', from_stage: Optional[str] = None) -> None:
+    """Rebuild every user's ticks and pyramids from their raw exports across a process pool.
+
+    from_stage drops the stored outputs of that pipeline stage and every stage
+    downstream of it, so those re-run for every user while earlier stages are
+    read back from the pipeline store.
+    """
+    if from_stage:
+        stale = DataProcessor(None, stage_store=stage_store()).pipeline.invalidate(from_stage)
+        print(f"Re-running pipeline stages: {', '.join(stale)}")
+
+    checkpoint = load_checkpoint(checkpoint_path) if resume else {'completed': [], 'failed': {}}
+    done = set(checkpoint['completed'])
+
+    with app.app_context():
+        users = {username: export for username, export in list_users(usernames).items()
+                 if username not in done}
+    if not users:
+        print("Nothing to reprocess")
+        return
+
+    print(f"Reprocessing {len(users)} users with {workers} workers"
+          + (f" ({len(done)} already done)" if done else ""))
+    start_time = time.time()
+    finished = ticks = rows_written = buffered_rows = 0
+    pending = {}
+    timings = []
+
+    with app.app_context(), ProcessPoolExecutor(max_workers=workers, initializer=_init_child) as executor:
+        futures = {
+            executor.submit(
+                reprocess_user, username,
+                export.profile_url if export else None,
+                export.content_hash if export else None,
+                fetch_missing,
+                pyramid_engine
+            ): username
+            for username, export in users.items()
+        }
+        for future in as_completed(futures):
+            username = futures[future]
+            finished += 1
+            try:
+                result = future.result()
+            except Exception as e:
+                checkpoint['failed'][username] = str(e)
+                print(f"[{finished}/{len(users)}] {username}: failed ({str(e)})")
+                continue
+
+            user_ticks = len(result['tables']['user_ticks'])
+            ticks += user_ticks
+            timings.append((result['seconds'], username))
+            print(f"[{finished}/{len(users)}] {username}: {user_ticks} ticks in "
+                  f"{result['seconds']:.2f}s from {result['source']}")
+
+            export = users[username]
+            result['profile_url'] = export.profile_url if export else None
+            pending[username] = result
+            buffered_rows += sum(len(df) for df in result['tables'].values())
+            if buffered_rows >= batch_size:
+                rows_written += flush(pending, checkpoint, checkpoint_path, batch_size, pyramid_engine)
+                pending = {}
+                buffered_rows = 0
+
+        if pending:
+            rows_written += flush(pending, checkpoint, checkpoint_path, batch_size, pyramid_engine)
+        else:
+            save_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.time() - start_time
+    print(f"Reprocessed {finished - len(checkpoint['failed'])}/{len(users)} users, {ticks} ticks "
+          f"in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s, {rows_written} rows written)")
+    if timings:
+        slowest = ", ".join(f"{username} {seconds:.2f}s" for seconds, username in sorted(timings, reverse=True)[:5])
+        print(f"Slowest users: {slowest}")
+    if checkpoint['failed']:
+        print(f"{len(checkpoint['failed'])} users failed; rerun with --resume to retry them")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild every user's ticks and pyramids from their raw exports",
+        epilog="Exports are read from the local cache or downloaded again from the profile URL recorded "
+               "in tick_exports. Users whose ticks were stored before exports were recorded have no "
+               "tick_exports row and fail with 'no recorded profile URL'; their stored data is left "
+               "untouched. Re-submit their profiles once (or requeue them through the ingestion worker) "
+               "to record an export, then rerun with --resume."
+    )
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Number of worker processes")
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="Rows buffered and written per batch")
+    parser.add_argument('--checkpoint', default='reprocess_checkpoint.json',
+                        help="File recording the users already rebuilt")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip users completed by a previous run")
+    parser.add_argument('--cache-only', dest='fetch_missing', action='store_false',
+                        help="Skip users whose export is not in the local cache instead of downloading it")
+    parser.add_argument('--user', action='append', dest='usernames',
+                        help="Only reprocess this user (repeatable)")
+    parser.add_argument('--pyramid-engine', choices=['pandas', 'sql'], default=app.config['PYRAMID_ENGINE'],
+                        help="Build pyramids in the worker processes or inside the database")
+    parser.add_argument('--from-stage', choices=pipeline_stages(),
+                        help="Re-run this pipeline stage and everything downstream of it instead of "
+                             "reusing their stored outputs")
+    args = parser.parse_args()
+
+    run_reprocess(args.workers, args.batch_size, args.checkpoint, resume=args.resume,
+                  fetch_missing=args.fetch_missing, usernames=args.usernames,
+                  pyramid_engine=args.pyramid_engine, from_stage=args.from_stage)
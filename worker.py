@@ -0,0 +1,65 @@
+import argparse
+import os
+import socket
+import time
+from app import app, db
+from app.services.job_queue import JobQueue
+from app.services.ingestion_service import IngestionService
+from app.services.export_cache import ExportCache
+
+def run_worker(poll_interval: float, once: bool = False) -> None:
+    """Claim and run ingestion jobs until stopped (or the queue is empty with --once)"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    export_cache = ExportCache(app.config['EXPORT_CACHE_DIR'], app.config['EXPORT_CACHE_MAX_BYTES'])
+    app.logger.info(f"Ingestion worker {worker_id} started")
+
+    while True:
+        with app.app_context():
+            job = JobQueue.claim_next(worker_id)
+
+            if job is None:
+                # Nothing to do - recover jobs orphaned by dead workers, then wait
+                requeued, failed = JobQueue.requeue_stale(
+                    app.config['INGESTION_JOB_STALE_AFTER'],
+                    max_attempts=app.config['INGESTION_JOB_MAX_ATTEMPTS']
+                )
+                if failed:
+                    app.logger.error(f"Failed {failed} stale ingestion jobs that were out of attempts")
+                if requeued:
+                    app.logger.warning(f"Requeued {requeued} stale ingestion jobs")
+                    continue
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            app.logger.info(f"Worker {worker_id} claimed job {job.id} for {job.username} (attempt {job.attempts})")
+            start_time = time.time()
+            try:
+                changed = IngestionService.ingest_profile(
+                    job.profile_url,
+                    chunk_size=app.config['TICK_EXPORT_CHUNK_SIZE'],
+                    incremental=app.config['INCREMENTAL_INGESTION'],
+                    export_cache=export_cache,
+                    # Retries reuse the exact export an earlier attempt downloaded
+                    cached_hash=job.export_hash if job.attempts > 1 else None,
+                    pyramid_engine=app.config['PYRAMID_ENGINE'],
+                    on_fetched=lambda content_hash: JobQueue.record_export(job.id, content_hash)
+                )
+                JobQueue.complete(job.id)
+                outcome = "processed" if changed else "unchanged, skipped processing"
+                app.logger.info(f"Job {job.id} finished in {time.time() - start_time:.2f}s ({outcome})")
+            except Exception as e:
+                app.logger.error(f"Job {job.id} failed: {str(e)}")
+                db.session.rollback()
+                JobQueue.fail(job.id, str(e), max_attempts=app.config['INGESTION_JOB_MAX_ATTEMPTS'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the background profile ingestion worker")
+    parser.add_argument('--poll-interval', type=float, default=app.config['INGESTION_JOB_POLL_INTERVAL'],
+                        help="Seconds to wait between polls when the queue is empty")
+    parser.add_argument('--once', action='store_true',
+                        help="Exit once the queue is drained instead of polling forever")
+    args = parser.parse_args()
+
+    run_worker(args.poll_interval, once=args.once)